@@ -0,0 +1,4 @@
+import time
+
+# Taken when the package is first imported so startup timings can include import cost.
+IMPORT_STARTED = time.perf_counter()
@@ -3,7 +3,7 @@ from __future__ import annotations
 import os
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Iterable, List
+from typing import Iterable, Optional, Tuple
 
 from dotenv import load_dotenv
 
@@ -18,7 +18,57 @@ class Settings:
     qdrant_api_key: str
     project_root: Path
     port: int
-    cors_allow_origins: List[str]
+    cors_allow_origins: Tuple[str, ...]
+    embed_batch_size: int = 32
+    embed_batch_wait_ms: float = 5.0
+    qdrant_max_fanout: int = 4
+    retrieval_backend: str = "qdrant"
+    local_index_dir: Optional[Path] = None
+    local_index_dtype: str = "float16"
+    local_index_refresh_seconds: float = 3600.0
+    embed_cache_dir: Optional[Path] = None
+    embed_cache_memory_items: int = 4096
+    embed_cache_disk_items: int = 100_000
+    embed_cache_dtype: str = "float16"
+    embed_backend: str = "flag"
+    embed_onnx_path: Optional[Path] = None
+    embed_threads: int = 0
+    embed_max_length: int = 512
+    embed_sidecar_socket: Optional[Path] = None
+    job_store: str = "sqlite"
+    job_store_path: Optional[Path] = None
+    job_max_resident: int = 1000
+    job_max_resident_bytes: int = 256 * 1024 * 1024
+    job_result_ttl_seconds: float = 3600.0
+    llm_max_choices: int = 4
+    llm_max_concurrency: int = 32
+    context_template_tokens: int = 600
+    context_tone_tokens: int = 300
+    context_evidence_tokens: int = 800
+    ds_max_connections: int = 64
+    ds_max_keepalive: int = 32
+    ds_keepalive_expiry: float = 30.0
+    ds_http2: bool = True
+    ds_max_retries: int = 3
+    ds_backoff_base: float = 0.5
+    ds_backoff_max: float = 8.0
+    ds_request_deadline: float = 120.0
+    ds_breaker_threshold: int = 5
+    ds_breaker_reset_seconds: float = 30.0
+    job_concurrency_initial: int = 8
+    job_concurrency_min: int = 1
+    job_concurrency_max: int = 64
+    job_latency_target: float = 8.0
+    job_max_queue: int = 200
+    request_cache_ttl_seconds: float = 600.0
+    request_cache_max_entries: int = 1024
+    semantic_cache_max_entries: int = 5000
+    semantic_cache_threshold: float = 0.97
+    semantic_cache_persist: bool = True
+    output_compression: str = "none"
+    output_writer_threads: int = 4
+    output_retention_seconds: float = 0.0
+    output_compact_interval_seconds: float = 3600.0
 
 
 REQUIRED_VARS: Iterable[str] = (
@@ -51,13 +101,44 @@ def load_settings(dotenv_path: Path | None = None) -> Settings:
     if not cors_list:
         cors_list = ["*"]
 
-    try:
-        port = int(os.getenv("PORT", "7788"))
-    except ValueError as exc:
-        raise RuntimeError("PORT must be an integer") from exc
+    port = _env_int("PORT", 7788)
 
     project_root = Path(os.getenv("PROJECT_ROOT", ".")).resolve()
     models_path = Path(os.getenv("MODELS_PATH", "")).expanduser().resolve()
+    embed_cache_dir = Path(
+        os.getenv("EMBED_CACHE_DIR", str(project_root / "backend" / "data" / "embedding_cache"))
+    ).expanduser()
+
+    job_store = os.getenv("JOB_STORE", "sqlite")
+    if job_store not in ("memory", "sqlite"):
+        raise RuntimeError("JOB_STORE must be memory or sqlite")
+    job_store_path = Path(
+        os.getenv("JOB_STORE_PATH", str(project_root / "backend" / "data" / "jobs.sqlite3"))
+    ).expanduser()
+
+    embed_cache_dtype = os.getenv("EMBED_CACHE_DTYPE", "float16")
+    if embed_cache_dtype not in ("float16", "float32"):
+        raise RuntimeError("EMBED_CACHE_DTYPE must be float16 or float32")
+
+    embed_backend = os.getenv("EMBED_BACKEND", "flag").lower()
+    if embed_backend not in ("flag", "onnx"):
+        raise RuntimeError("EMBED_BACKEND must be flag or onnx")
+    embed_onnx_path = os.getenv("EMBED_ONNX_PATH")
+    embed_sidecar_socket = os.getenv("EMBED_SIDECAR_SOCKET")
+
+    retrieval_backend = os.getenv("RETRIEVAL_BACKEND", "qdrant").lower()
+    if retrieval_backend not in ("qdrant", "local"):
+        raise RuntimeError("RETRIEVAL_BACKEND must be qdrant or local")
+    local_index_dir = Path(
+        os.getenv("LOCAL_INDEX_DIR", str(project_root / "backend" / "data" / "local_index"))
+    ).expanduser()
+    local_index_dtype = os.getenv("LOCAL_INDEX_DTYPE", "float16")
+    if local_index_dtype not in ("float16", "float32"):
+        raise RuntimeError("LOCAL_INDEX_DTYPE must be float16 or float32")
+
+    output_compression = os.getenv("OUTPUT_COMPRESSION", "none").lower()
+    if output_compression not in ("none", "gzip", "zstd"):
+        raise RuntimeError("OUTPUT_COMPRESSION must be none, gzip or zstd")
 
     return Settings(
         ds_base_url=os.environ["DS_BASE_URL"].rstrip("/"),
@@ -68,5 +149,81 @@ def load_settings(dotenv_path: Path | None = None) -> Settings:
         qdrant_api_key=os.environ["QDRANT_API_KEY"],
         project_root=project_root,
         port=port,
-        cors_allow_origins=cors_list,
+        cors_allow_origins=tuple(cors_list),
+        embed_batch_size=max(1, _env_int("EMBED_BATCH_SIZE", 32)),
+        embed_batch_wait_ms=max(0.0, _env_float("EMBED_BATCH_WAIT_MS", 5.0)),
+        qdrant_max_fanout=max(1, _env_int("QDRANT_MAX_FANOUT", 4)),
+        retrieval_backend=retrieval_backend,
+        local_index_dir=local_index_dir,
+        local_index_dtype=local_index_dtype,
+        local_index_refresh_seconds=max(0.0, _env_float("LOCAL_INDEX_REFRESH_SECONDS", 3600.0)),
+        embed_cache_dir=embed_cache_dir,
+        embed_cache_memory_items=_env_int("EMBED_CACHE_MEMORY_ITEMS", 4096),
+        embed_cache_disk_items=_env_int("EMBED_CACHE_DISK_ITEMS", 100_000),
+        embed_cache_dtype=embed_cache_dtype,
+        embed_backend=embed_backend,
+        embed_onnx_path=Path(embed_onnx_path).expanduser() if embed_onnx_path else None,
+        embed_threads=max(0, _env_int("EMBED_THREADS", 0)),
+        embed_max_length=max(8, _env_int("EMBED_MAX_LENGTH", 512)),
+        embed_sidecar_socket=Path(embed_sidecar_socket).expanduser() if embed_sidecar_socket else None,
+        job_store=job_store,
+        job_store_path=job_store_path,
+        job_max_resident=max(0, _env_int("JOB_MAX_RESIDENT", 1000)),
+        job_max_resident_bytes=max(0, _env_int("JOB_MAX_RESIDENT_BYTES", 256 * 1024 * 1024)),
+        job_result_ttl_seconds=max(0.0, _env_float("JOB_RESULT_TTL_SECONDS", 3600.0)),
+        llm_max_choices=max(1, _env_int("LLM_MAX_CHOICES", 4)),
+        llm_max_concurrency=max(1, _env_int("LLM_MAX_CONCURRENCY", 32)),
+        context_template_tokens=max(1, _env_int("CONTEXT_TEMPLATE_TOKENS", 600)),
+        context_tone_tokens=max(1, _env_int("CONTEXT_TONE_TOKENS", 300)),
+        context_evidence_tokens=max(1, _env_int("CONTEXT_EVIDENCE_TOKENS", 800)),
+        ds_max_connections=max(1, _env_int("DS_MAX_CONNECTIONS", 64)),
+        ds_max_keepalive=max(0, _env_int("DS_MAX_KEEPALIVE", 32)),
+        ds_keepalive_expiry=max(0.0, _env_float("DS_KEEPALIVE_EXPIRY", 30.0)),
+        ds_http2=_env_bool("DS_HTTP2", True),
+        ds_max_retries=max(0, _env_int("DS_MAX_RETRIES", 3)),
+        ds_backoff_base=max(0.0, _env_float("DS_BACKOFF_BASE", 0.5)),
+        ds_backoff_max=max(0.0, _env_float("DS_BACKOFF_MAX", 8.0)),
+        ds_request_deadline=max(1.0, _env_float("DS_REQUEST_DEADLINE", 120.0)),
+        ds_breaker_threshold=max(0, _env_int("DS_BREAKER_THRESHOLD", 5)),
+        ds_breaker_reset_seconds=max(0.0, _env_float("DS_BREAKER_RESET_SECONDS", 30.0)),
+        job_concurrency_initial=max(1, _env_int("JOB_CONCURRENCY_INITIAL", 8)),
+        job_concurrency_min=max(1, _env_int("JOB_CONCURRENCY_MIN", 1)),
+        job_concurrency_max=max(1, _env_int("JOB_CONCURRENCY_MAX", 64)),
+        job_latency_target=max(0.1, _env_float("JOB_LATENCY_TARGET", 8.0)),
+        job_max_queue=max(0, _env_int("JOB_MAX_QUEUE", 200)),
+        request_cache_ttl_seconds=max(0.0, _env_float("REQUEST_CACHE_TTL_SECONDS", 600.0)),
+        request_cache_max_entries=max(0, _env_int("REQUEST_CACHE_MAX_ENTRIES", 1024)),
+        semantic_cache_max_entries=max(0, _env_int("SEMANTIC_CACHE_MAX_ENTRIES", 5000)),
+        semantic_cache_threshold=min(1.0, max(0.0, _env_float("SEMANTIC_CACHE_THRESHOLD", 0.97))),
+        semantic_cache_persist=_env_bool("SEMANTIC_CACHE_PERSIST", True),
+        output_compression=output_compression,
+        output_writer_threads=max(1, _env_int("OUTPUT_WRITER_THREADS", 4)),
+        output_retention_seconds=max(0.0, _env_float("OUTPUT_RETENTION_SECONDS", 0.0)),
+        output_compact_interval_seconds=max(0.0, _env_float("OUTPUT_COMPACT_INTERVAL_SECONDS", 3600.0)),
     )
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError as exc:
+        raise RuntimeError(f"{name} must be an integer") from exc
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError as exc:
+        raise RuntimeError(f"{name} must be a number") from exc
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    raw = os.getenv(name)
+    if raw is None or not raw.strip():
+        return default
+    value = raw.strip().lower()
+    if value in ("1", "true", "yes", "on"):
+        return True
+    if value in ("0", "false", "no", "off"):
+        return False
+    raise RuntimeError(f"{name} must be a boolean")
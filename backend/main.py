@@ -1,27 +1,57 @@
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
+import math
+import time
+import uuid
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional
 
-from fastapi import Depends, FastAPI, HTTPException
+import httpx
+import orjson
+from fastapi import Depends, FastAPI, HTTPException, Query, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
+from qdrant_client import AsyncQdrantClient
 
+from backend import IMPORT_STARTED
 from backend.config import Settings, load_settings
-from backend.services.ds_client import DSClient
-from backend.services.embedding import get_embedding_service
+from backend.models.job import JobStage, JobState
+from backend.services.admission import AdaptiveLimiter, AdmissionRejected
+from backend.services.artifacts import ArtifactWriter
+from backend.services.batches import BatchStore
+from backend.services.context import ContextAssembler
+from backend.services.ds_client import TITLES_PROMPT_VERSION, DSClient, delta_text
+from backend.services.embedding import EmbeddingProvider, LazyEmbeddingProvider, get_embedding_service
+from backend.services.embedding_batcher import EmbeddingBatcher
 from backend.services.job_manager import JobManager
-from backend.services.pipeline import PipelineRunner
+from backend.services.job_store import create_job_store
+from backend.services.llm_scheduler import LLMScheduler
+from backend.services.local_index import LocalIndexService
+from backend.services.metrics import REGISTRY
+from backend.services.pipeline import MAX_VARIANTS, PipelineRunner
 from backend.services.qdrant_client import QdrantService
+from backend.services.request_cache import RequestCache, request_key
+from backend.services.semantic_cache import SemanticCache
+from backend.services.startup import StartupTracker
+
+_IMPORT_SECONDS = time.perf_counter() - IMPORT_STARTED
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+SSE_KEEPALIVE_SECONDS = 15.0
+LONG_POLL_MAX_SECONDS = 60.0
+MAX_BATCH_ITEMS = 500
+
 
 class TitleRequest(BaseModel):
     keywords: List[str] = Field(..., min_items=1, max_items=8, description="关键词列表")
+    no_cache: bool = Field(False, description="跳过结果缓存与相同请求合并")
 
 
 class TitleResponse(BaseModel):
@@ -31,6 +61,36 @@ class TitleResponse(BaseModel):
 class PipelineStartRequest(BaseModel):
     title: str
     description: str | None = None
+    mode: Literal["staged", "fused"] = Field("staged", description="staged 为三段式逐步生成，fused 为单次调用合并生成")
+    variants: int = Field(2, ge=1, le=MAX_VARIANTS, description="生成的文案版本数（A、B、C…）")
+    priority: Literal["high", "normal", "low"] = Field("normal", description="排队优先级")
+    author: str | None = Field(None, max_length=64, description="提交的作者（租户），大模型调用按作者公平分配")
+    deadline_seconds: float | None = Field(None, gt=0, le=3600, description="任务截止时间（秒，自提交起计算）")
+    no_cache: bool = Field(False, description="跳过结果缓存与相同请求合并")
+
+
+class BatchItem(BaseModel):
+    title: str
+    description: str | None = None
+
+
+class BatchStartRequest(BaseModel):
+    items: List[BatchItem] = Field(..., min_items=1, max_items=MAX_BATCH_ITEMS, description="批量提交的标题与描述")
+    mode: Literal["staged", "fused"] = Field("staged", description="staged 为三段式逐步生成，fused 为单次调用合并生成")
+    variants: int = Field(2, ge=1, le=MAX_VARIANTS, description="每条生成的文案版本数")
+    priority: Literal["high", "normal", "low"] = Field("low", description="排队优先级，默认低于单条提交")
+    author: str | None = Field(None, max_length=64, description="提交的作者（租户），大模型调用按作者公平分配")
+    deadline_seconds: float | None = Field(None, gt=0, le=86400, description="每条任务的截止时间（秒，自提交起计算）")
+    no_cache: bool = Field(False, description="跳过结果缓存与相同请求合并")
+
+
+class BatchStatusResponse(BaseModel):
+    batch_id: str
+    created_at: str
+    total: int
+    finished: int
+    counts: Dict[str, int] = Field(..., description="各状态的任务数")
+    job_ids: List[str]
 
 
 class JobStatusResponse(BaseModel):
@@ -38,12 +98,18 @@ class JobStatusResponse(BaseModel):
     status: str
     message: str | None = None
     payload: Dict[str, Any]
+    version: int = 0
+    queue_position: int | None = None
+    estimated_wait_seconds: float | None = None
 
 
 class PipelineResultResponse(BaseModel):
     job_id: str
     title: str
+    mode: str = "staged"
     drafts: Dict[str, Any]
+    semantic_cache: Dict[str, Any] | None = Field(None, description="命中语义缓存时的来源任务与相似度")
+    timings: Dict[str, Any] | None = Field(None, description="排队等待、各阶段耗时与每次大模型调用的耗时和 token 数")
 
 
 class Author(BaseModel):
@@ -59,9 +125,24 @@ def get_settings() -> Settings:
     return load_settings()
 
 
-def create_app() -> FastAPI:
-    settings = get_settings()
+def create_app(
+    settings: Optional[Settings] = None,
+    *,
+    embedding_provider: Optional[EmbeddingProvider] = None,
+    llm_transport: Optional[httpx.AsyncBaseTransport] = None,
+    qdrant_client: Optional[AsyncQdrantClient] = None,
+) -> FastAPI:
+    """Build the app without loading models; ``register_lifecycle`` warms them up in the background.
+
+    The keyword arguments replace the embedding model, LLM gateway transport and Qdrant
+    client, e.g. with the local stand-ins of ``backend.tools.loadtest``.
+    """
+    created = time.perf_counter()
+    startup = StartupTracker(started=IMPORT_STARTED)
+    startup.record("import", _IMPORT_SECONDS)
+    settings = settings or get_settings()
     app = FastAPI(title="文案自动化后端")
+    app.state.startup = startup
     app.add_middleware(
         CORSMiddleware,
         allow_origins=settings.cors_allow_origins,
@@ -71,66 +152,370 @@ def create_app() -> FastAPI:
     )
 
     app.state.settings = settings
-    app.state.ds_client = DSClient(settings)
-    app.state.embedding = get_embedding_service(settings)
-    app.state.qdrant = QdrantService(settings)
+    app.state.ds_client = DSClient(settings, transport=llm_transport)
+    app.state.embedding = LazyEmbeddingProvider(
+        (lambda: embedding_provider) if embedding_provider is not None else (lambda: get_embedding_service(settings))
+    )
+    app.state.embedder = EmbeddingBatcher(
+        app.state.embedding,
+        max_batch_size=settings.embed_batch_size,
+        max_wait_ms=settings.embed_batch_wait_ms,
+    )
+    app.state.qdrant = QdrantService(settings, client=qdrant_client)
+    if settings.retrieval_backend == "local":
+        app.state.qdrant = LocalIndexService(
+            app.state.qdrant,
+            settings.local_index_dir or Path(settings.project_root) / "backend" / "data" / "local_index",
+            dtype=settings.local_index_dtype,
+            refresh_seconds=settings.local_index_refresh_seconds,
+        )
     output_dir = Path(settings.project_root) / "backend" / "outputs"
     output_dir.mkdir(parents=True, exist_ok=True)
-    pipeline_runner = PipelineRunner(app.state.ds_client, app.state.embedding, app.state.qdrant)
-    app.state.job_manager = JobManager(output_dir, pipeline_runner)
+    app.state.title_cache = RequestCache(
+        ttl=settings.request_cache_ttl_seconds,
+        max_entries=settings.request_cache_max_entries,
+    )
+    app.state.semantic_cache = None
+    if settings.semantic_cache_max_entries > 0:
+        app.state.semantic_cache = SemanticCache(
+            max_entries=settings.semantic_cache_max_entries,
+            threshold=settings.semantic_cache_threshold,
+            directory=output_dir.parent / "semantic_cache" if settings.semantic_cache_persist else None,
+        )
+    app.state.artifacts = ArtifactWriter(
+        output_dir,
+        compression=settings.output_compression,
+        max_workers=settings.output_writer_threads,
+    )
+    app.state.batches = BatchStore(output_dir / "batches")
+    app.state.llm_scheduler = LLMScheduler(settings.llm_max_concurrency)
+    app.state.pipeline_runner = pipeline_runner = PipelineRunner(
+        app.state.ds_client,
+        app.state.embedder,
+        app.state.qdrant,
+        max_choices=settings.llm_max_choices,
+        semantic_cache=app.state.semantic_cache,
+        scheduler=app.state.llm_scheduler,
+        context=ContextAssembler(
+            settings.context_template_tokens, settings.context_tone_tokens, settings.context_evidence_tokens
+        ),
+        # Batch jobs waiting for their prefetch never outnumber the queue, except for one
+        # oversized batch admitted into an empty queue.
+        max_prefetched=max(settings.job_max_queue, MAX_BATCH_ITEMS),
+    )
+    job_store = create_job_store(
+        settings.job_store,
+        settings.job_store_path or Path(settings.project_root) / "backend" / "data" / "jobs.sqlite3",
+    )
+    limiter = AdaptiveLimiter(
+        initial=settings.job_concurrency_initial,
+        minimum=settings.job_concurrency_min,
+        maximum=settings.job_concurrency_max,
+        latency_target=settings.job_latency_target,
+    )
+    app.state.ds_client.add_observer(limiter.observe)
+    app.state.job_manager = JobManager(
+        app.state.artifacts,
+        pipeline_runner,
+        store=job_store,
+        limiter=limiter,
+        max_queue=settings.job_max_queue,
+        max_resident_jobs=settings.job_max_resident,
+        max_resident_bytes=settings.job_max_resident_bytes,
+        result_ttl=settings.job_result_ttl_seconds,
+        dedupe_ttl=settings.request_cache_ttl_seconds,
+        dedupe_max_entries=settings.request_cache_max_entries,
+        on_finished=pipeline_runner.release,
+    )
 
     register_routes(app)
     register_lifecycle(app)
+    startup.record("create_app", time.perf_counter() - created)
 
     return app
 
 
-app = create_app()
-
-
 def register_lifecycle(app: FastAPI) -> None:
+    @app.on_event("startup")
+    async def _startup() -> None:
+        # Jobs may queue right away; they wait on the embedding model until warmup loads it.
+        app.state.job_manager.start()
+        app.state.warmup = asyncio.create_task(_warmup(app))
+        app.state.compactor = asyncio.create_task(_compact_outputs(app))
+
     @app.on_event("shutdown")
     async def _shutdown() -> None:
+        app.state.warmup.cancel()
+        app.state.compactor.cancel()
+        await asyncio.gather(app.state.warmup, app.state.compactor, return_exceptions=True)
+        await app.state.job_manager.stop()
+        app.state.artifacts.close()
         await app.state.ds_client.close()
         await app.state.qdrant.close()
+        await app.state.embedder.close()
+        if app.state.semantic_cache is not None:
+            await asyncio.to_thread(app.state.semantic_cache.close)
+
+
+async def _warmup(app: FastAPI) -> None:
+    startup: StartupTracker = app.state.startup
+    try:
+        with startup.phase("embedding_model"):
+            await asyncio.to_thread(app.state.embedding.load)
+        with startup.phase("embedding_first_batch"):
+            await app.state.embedder.embed_one("warmup")
+        with startup.phase("retrieval"):
+            await app.state.qdrant.start()
+    except asyncio.CancelledError:
+        raise
+    except Exception as exc:
+        logger.exception("Startup warmup failed")
+        startup.fail(exc)
+        return
+    startup.mark_ready()
+
+
+async def _compact_outputs(app: FastAPI) -> None:
+    """Periodic retention and re-encoding of ``backend/outputs``; off when the interval is 0."""
+    settings: Settings = app.state.settings
+    if settings.output_compact_interval_seconds <= 0:
+        return
+    while True:
+        try:
+            await app.state.artifacts.compact(settings.output_retention_seconds)
+        except Exception:
+            logger.exception("Output compaction failed")
+        await asyncio.sleep(settings.output_compact_interval_seconds)
 
 
 def register_routes(app: FastAPI) -> None:
+    @app.get("/healthz")
+    async def healthz() -> Dict[str, Any]:
+        return {"status": "ok", "uptime_seconds": app.state.startup.snapshot()["uptime_seconds"]}
+
+    @app.get("/readyz")
+    async def readyz() -> JSONResponse:
+        snapshot = app.state.startup.snapshot()
+        return JSONResponse(snapshot, status_code=200 if snapshot["ready"] else 503)
+
+    @app.get("/metrics")
+    async def metrics() -> PlainTextResponse:
+        return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
     @app.post("/api/p0/titles", response_model=TitleResponse)
     async def generate_titles(request: TitleRequest) -> TitleResponse:
-        result = await app.state.ds_client.generate_titles(request.keywords)
+        ds_client = app.state.ds_client
+        key = request_key("titles", TITLES_PROMPT_VERSION, ds_client.model, request.keywords)
+        result = await app.state.title_cache.get_or_compute(
+            key, lambda: ds_client.generate_titles(request.keywords), bypass=request.no_cache
+        )
         return TitleResponse(result=result)
 
+    @app.post("/api/p0/titles/stream")
+    async def stream_titles(request: TitleRequest) -> StreamingResponse:
+        async def _events() -> AsyncIterator[str]:
+            parts: List[str] = []
+            try:
+                async for chunk in app.state.ds_client.stream_titles(request.keywords):
+                    delta = delta_text(chunk)
+                    if delta:
+                        parts.append(delta)
+                        yield _sse_event("token", {"delta": delta})
+            except Exception as exc:
+                logger.exception("Title streaming failed")
+                yield _sse_event("error", {"message": str(exc)})
+                return
+            yield _sse_event("done", {"content": "".join(parts)})
+
+        return StreamingResponse(_events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
     @app.post("/api/pipeline/start", response_model=JobStatusResponse)
     async def start_pipeline(request: PipelineStartRequest) -> JobStatusResponse:
-        state = await app.state.job_manager.start_job(request.dict())
-        return JobStatusResponse(
-            job_id=state.job_id,
-            status=state.status,
-            message=state.message,
-            payload=state.payload,
-        )
+        if not app.state.ds_client.available:
+            raise HTTPException(
+                status_code=503,
+                detail="LLM gateway unavailable",
+                headers={"Retry-After": str(int(app.state.settings.ds_breaker_reset_seconds) or 1)},
+            )
+        payload = request.dict()
+        dedupe_key = None if request.no_cache else app.state.pipeline_runner.request_key(payload)
+        try:
+            state = await app.state.job_manager.start_job(payload, dedupe_key=dedupe_key)
+        except AdmissionRejected as exc:
+            raise HTTPException(
+                status_code=429,
+                detail={
+                    "message": str(exc),
+                    "queue_depth": exc.queue_depth,
+                    "estimated_wait_seconds": round(exc.retry_after, 1),
+                },
+                headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+            ) from exc
+        return await _status_response(app.state.job_manager, state)
 
     @app.get("/api/pipeline/status/{job_id}", response_model=JobStatusResponse)
-    async def get_status(job_id: str) -> JobStatusResponse:
-        state = app.state.job_manager.get_job(job_id)
+    async def get_status(
+        job_id: str,
+        wait: float = Query(0.0, ge=0.0, le=LONG_POLL_MAX_SECONDS, description="长轮询等待秒数"),
+        since: int | None = Query(None, description="上次收到的状态版本号"),
+    ) -> JobStatusResponse:
+        state = await app.state.job_manager.get_job(job_id)
         if not state:
             raise HTTPException(status_code=404, detail="Job not found")
-        return JobStatusResponse(
-            job_id=state.job_id,
-            status=state.status,
-            message=state.message,
-            payload=state.payload,
-        )
+        if wait > 0:
+            state = await app.state.job_manager.wait_for_change(state, since, wait)
+        return await _status_response(app.state.job_manager, state)
+
+    @app.delete("/api/pipeline/{job_id}", response_model=JobStatusResponse)
+    async def cancel_pipeline(job_id: str, response: Response) -> JobStatusResponse:
+        state = await app.state.job_manager.get_job(job_id)
+        if not state:
+            raise HTTPException(status_code=404, detail="Job not found")
+        if state.finished:
+            raise HTTPException(status_code=409, detail="Job already finished")
+        state = await app.state.job_manager.cancel_job(job_id) or state
+        if not state.finished:
+            response.status_code = 202
+        return await _status_response(app.state.job_manager, state)
+
+    @app.get("/api/pipeline/stream/{job_id}")
+    async def stream_pipeline(job_id: str) -> StreamingResponse:
+        state = await app.state.job_manager.get_job(job_id)
+        if not state:
+            raise HTTPException(status_code=404, detail="Job not found")
+        async def _events() -> AsyncIterator[str]:
+            async for event in app.state.job_manager.events(state, keepalive=SSE_KEEPALIVE_SECONDS):
+                yield ": keepalive\n\n" if event is None else _sse_event(event.event, event.data)
+
+        return StreamingResponse(_events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+    @app.websocket("/api/pipeline/ws/{job_id}")
+    async def pipeline_socket(websocket: WebSocket, job_id: str) -> None:
+        state = await app.state.job_manager.get_job(job_id)
+        if not state:
+            await websocket.close(code=4404)
+            return
+        await websocket.accept()
+        try:
+            async for event in app.state.job_manager.events(state, keepalive=SSE_KEEPALIVE_SECONDS):
+                if event is None:
+                    await websocket.send_json({"event": "keepalive"})
+                else:
+                    await websocket.send_json({"event": event.event, "data": event.data})
+        except WebSocketDisconnect:
+            return
+        await websocket.close()
 
     @app.get("/api/pipeline/result/{job_id}", response_model=PipelineResultResponse)
-    async def get_result(job_id: str) -> PipelineResultResponse:
-        state = app.state.job_manager.get_job(job_id)
+    async def get_result(job_id: str) -> Response:
+        state = await app.state.job_manager.get_job(job_id)
         if not state:
             raise HTTPException(status_code=404, detail="Job not found")
-        if not state.result:
+        result = await asyncio.to_thread(app.state.job_manager.get_result, state)
+        if not result:
             raise HTTPException(status_code=409, detail="Job not finished")
-        return PipelineResultResponse(**state.result)
+        # The stored result already has the response shape; encode it once with orjson
+        # instead of validating and re-serializing large drafts through the model.
+        return Response(orjson.dumps(result), media_type="application/json")
+
+    @app.post("/api/pipeline/batch", response_model=BatchStatusResponse)
+    async def start_batch(request: BatchStartRequest) -> BatchStatusResponse:
+        if not app.state.ds_client.available:
+            raise HTTPException(
+                status_code=503,
+                detail="LLM gateway unavailable",
+                headers={"Retry-After": str(int(app.state.settings.ds_breaker_reset_seconds) or 1)},
+            )
+        batch_id = str(uuid.uuid4())
+        shared = request.dict(exclude={"items"})
+        payloads = [
+            {**shared, **item.dict(), "batch_id": batch_id, "batch_index": index}
+            for index, item in enumerate(request.items)
+        ]
+        runner: PipelineRunner = app.state.pipeline_runner
+        dedupe_keys = [None if request.no_cache else runner.request_key(payload) for payload in payloads]
+        # Embed and retrieve for the whole batch before its jobs can be dispatched.
+        await runner.prefetch_batch(batch_id, payloads)
+        try:
+            states = await app.state.job_manager.start_batch(payloads, dedupe_keys)
+        except AdmissionRejected as exc:
+            runner.discard_prefetched(batch_id)
+            raise HTTPException(
+                status_code=429,
+                detail={
+                    "message": str(exc),
+                    "queue_depth": exc.queue_depth,
+                    "estimated_wait_seconds": round(exc.retry_after, 1),
+                },
+                headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+            ) from exc
+        # Items that reused an existing job will never pick up their prefetched retrieval.
+        reused = [
+            index
+            for index, state in enumerate(states)
+            if (state.payload.get("batch_id"), state.payload.get("batch_index")) != (batch_id, index)
+        ]
+        runner.discard_prefetched(batch_id, reused)
+        manifest = app.state.batches.save(
+            batch_id, [state.job_id for state in states], [item.title for item in request.items]
+        )
+        return await _batch_response(app.state.job_manager, manifest)
+
+    @app.get("/api/pipeline/batch/{batch_id}", response_model=BatchStatusResponse)
+    async def get_batch(batch_id: str) -> BatchStatusResponse:
+        manifest = app.state.batches.load(batch_id)
+        if manifest is None:
+            raise HTTPException(status_code=404, detail="Batch not found")
+        return await _batch_response(app.state.job_manager, manifest)
+
+    @app.get("/api/pipeline/batch/{batch_id}/results")
+    async def download_batch(batch_id: str) -> StreamingResponse:
+        """One JSON line per item in submission order; unfinished items carry only their status."""
+        manifest = app.state.batches.load(batch_id)
+        if manifest is None:
+            raise HTTPException(status_code=404, detail="Batch not found")
+        job_manager: JobManager = app.state.job_manager
+
+        async def _lines() -> AsyncIterator[bytes]:
+            for index, item in enumerate(manifest["items"]):
+                line: Dict[str, Any] = {"index": index, **item, "status": "MISSING"}
+                state = await job_manager.get_job(item["job_id"])
+                if state is not None:
+                    line["status"] = state.status.value
+                    if state.status == JobStage.DONE:
+                        line["result"] = await asyncio.to_thread(job_manager.get_result, state)
+                    elif state.message:
+                        line["message"] = state.message
+                yield orjson.dumps(line) + b"\n"
+
+        headers = {"Content-Disposition": f'attachment; filename="batch-{batch_id}.jsonl"'}
+        return StreamingResponse(_lines(), media_type="application/x-ndjson", headers=headers)
+
+    @app.get("/api/retrieval/stats")
+    async def retrieval_stats() -> Dict[str, Any]:
+        return app.state.qdrant.stats()
+
+    @app.get("/api/embedding/stats")
+    async def embedding_stats() -> Dict[str, Any]:
+        semantic_cache = app.state.semantic_cache
+        return {
+            "batcher": app.state.embedder.stats(),
+            # A sidecar provider answers with a blocking socket round trip.
+            "cache": await asyncio.to_thread(app.state.embedder.cache_stats),
+            "semantic_cache": semantic_cache.stats() if semantic_cache is not None else None,
+        }
+
+    @app.get("/api/llm/stats")
+    async def llm_stats() -> Dict[str, Any]:
+        return {
+            **app.state.ds_client.stats(),
+            "title_cache": app.state.title_cache.stats(),
+            "scheduler": app.state.llm_scheduler.stats(),
+        }
+
+    @app.get("/api/jobs/stats")
+    async def job_stats() -> Dict[str, Any]:
+        return {**await app.state.job_manager.stats(), "artifacts": app.state.artifacts.stats()}
 
     @app.get("/api/authors", response_model=AuthorsResponse)
     async def list_authors() -> AuthorsResponse:
@@ -146,6 +531,39 @@ def register_routes(app: FastAPI) -> None:
         return AuthorsResponse(authors=authors)
 
 
+async def _status_response(job_manager: JobManager, state: JobState) -> JobStatusResponse:
+    return JobStatusResponse(
+        job_id=state.job_id,
+        status=state.status,
+        message=state.message,
+        payload=state.payload,
+        version=state.version,
+        **await job_manager.queue_estimate(state),
+    )
+
+
+async def _batch_response(job_manager: JobManager, manifest: Dict[str, Any]) -> BatchStatusResponse:
+    counts: Dict[str, int] = {}
+    finished = 0
+    for item in manifest["items"]:
+        state = await job_manager.get_job(item["job_id"])
+        status = state.status.value if state is not None else "MISSING"
+        counts[status] = counts.get(status, 0) + 1
+        finished += 1 if state is None or state.finished else 0
+    return BatchStatusResponse(
+        batch_id=manifest["batch_id"],
+        created_at=manifest["created_at"],
+        total=len(manifest["items"]),
+        finished=finished,
+        counts=counts,
+        job_ids=[item["job_id"] for item in manifest["items"]],
+    )
+
+
+def _sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
 def _read_authors(settings: Settings) -> List[Author]:
     path = Path(settings.project_root) / "backend" / "data" / "authors.json"
     if not path.exists():
@@ -161,3 +579,13 @@ def _write_authors(settings: Settings, authors: List[Author]) -> None:
     tmp_path = path.with_suffix(".tmp")
     tmp_path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
     tmp_path.replace(path)
+
+
+def __getattr__(name: str) -> Any:
+    # ``backend.main:app`` is built on first access, not on import, so tools and
+    # tests can import ``create_app`` without opening the job store or creating
+    # data directories. ``uvicorn --factory backend.main:create_app`` skips this.
+    if name == "app":
+        globals()["app"] = application = create_app()
+        return application
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,9 +1,10 @@
 from __future__ import annotations
 
+import asyncio
 import enum
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, List, Optional
 
 
 class JobStage(str, enum.Enum):
@@ -15,6 +16,18 @@ class JobStage(str, enum.Enum):
     WRITING = "WRITING"
     DONE = "DONE"
     ERROR = "ERROR"
+    CANCELLED = "CANCELLED"
+    TIMEOUT = "TIMEOUT"
+
+
+TERMINAL_STAGES = frozenset({JobStage.DONE, JobStage.ERROR, JobStage.CANCELLED, JobStage.TIMEOUT})
+SUBSCRIBER_QUEUE_SIZE = 256
+
+
+@dataclass
+class JobEvent:
+    event: str
+    data: Dict[str, Any]
 
 
 @dataclass
@@ -26,6 +39,15 @@ class JobState:
     updated_at: datetime = field(default_factory=datetime.utcnow)
     payload: Dict[str, Any] = field(default_factory=dict)
     result: Optional[Dict[str, Any]] = None
+    version: int = 0
+    priority: int = 1
+    _subscribers: List["asyncio.Queue[JobEvent]"] = field(default_factory=list, init=False, repr=False)
+    _changed: Optional[asyncio.Event] = field(default=None, init=False, repr=False)
+    _observers: List[Callable[["JobState"], None]] = field(default_factory=list, init=False, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in TERMINAL_STAGES
 
     def update(self, status: JobStage, message: Optional[str] = None, **payload: Any) -> None:
         self.status = status
@@ -33,6 +55,13 @@ class JobState:
         if payload:
             self.payload.update(payload)
         self.updated_at = datetime.utcnow()
+        self.version += 1
+        for observer in self._observers:
+            observer(self)
+        self.publish("stage", self.snapshot())
+        if self._changed is not None:
+            self._changed.set()
+            self._changed = None
 
     def set_result(self, result: Dict[str, Any]) -> None:
         self.result = result
@@ -40,3 +69,50 @@ class JobState:
 
     def set_error(self, message: str) -> None:
         self.update(JobStage.ERROR, message=message)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "status": self.status.value,
+            "message": self.message,
+            "payload": dict(self.payload),
+            "version": self.version,
+        }
+
+    def observe(self, callback: Callable[["JobState"], None]) -> None:
+        """Register a callback run synchronously after every ``update``."""
+        self._observers.append(callback)
+
+    async def wait_for_change(self, since: int, timeout: float) -> bool:
+        """Block until ``version`` moves past ``since``; return False on timeout."""
+        if self.version != since:
+            return True
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        changed = self._changed
+        try:
+            await asyncio.wait_for(changed.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def subscribe(self) -> "asyncio.Queue[JobEvent]":
+        queue: asyncio.Queue[JobEvent] = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.append(queue)
+        return queue
+
+    def unsubscribe(self, queue: "asyncio.Queue[JobEvent]") -> None:
+        if queue in self._subscribers:
+            self._subscribers.remove(queue)
+
+    def publish(self, event: str, data: Dict[str, Any]) -> None:
+        """Fan out without awaiting; a full subscriber queue drops its oldest event.
+
+        Stage events carry a full snapshot, so a lagging consumer only loses
+        intermediate progress and still receives the terminal stage.
+        """
+        job_event = JobEvent(event=event, data=data)
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(job_event)
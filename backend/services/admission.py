@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+PRIORITY_CLASSES: Dict[str, int] = {"high": 0, "normal": 1, "low": 2}
+
+
+class AdmissionRejected(RuntimeError):
+    """The job queue is full; carries the numbers a client needs to back off."""
+
+    def __init__(self, queue_depth: int, retry_after: float) -> None:
+        super().__init__(f"Job queue is full ({queue_depth} waiting)")
+        self.queue_depth = queue_depth
+        self.retry_after = retry_after
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit fed by observed LLM gateway latency and errors.
+
+    Every healthy sample adds ``1 / limit`` (about +1 per window of ``limit`` calls); a
+    sample over ``latency_target`` or an error multiplies the limit by ``backoff``, at
+    most once per ``cooldown`` seconds so one burst of failures is one decrease.
+    """
+
+    def __init__(
+        self,
+        initial: int = 8,
+        minimum: int = 1,
+        maximum: int = 64,
+        latency_target: float = 8.0,
+        backoff: float = 0.7,
+        cooldown: float = 2.0,
+    ) -> None:
+        self._minimum = max(1, minimum)
+        self._maximum = max(self._minimum, maximum)
+        self._limit = float(min(max(initial, self._minimum), self._maximum))
+        self._latency_target = latency_target
+        self._backoff = backoff
+        self._cooldown = cooldown
+        self._last_decrease = 0.0
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future[None]] = deque()
+        self._latency_ewma: Optional[float] = None
+        self._samples = 0
+        self._errors = 0
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    async def acquire(self) -> None:
+        while self._in_flight >= self.limit:
+            waiter: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        self._in_flight += 1
+
+    def release(self) -> None:
+        self._in_flight -= 1
+        self._wake()
+
+    def observe(self, latency: float, ok: bool) -> None:
+        self._samples += 1
+        self._latency_ewma = latency if self._latency_ewma is None else 0.8 * self._latency_ewma + 0.2 * latency
+        if ok and latency <= self._latency_target:
+            self._limit = min(self._maximum, self._limit + 1.0 / self._limit)
+            self._wake()
+            return
+        if not ok:
+            self._errors += 1
+        now = time.monotonic()
+        if now - self._last_decrease >= self._cooldown:
+            self._last_decrease = now
+            self._limit = max(self._minimum, self._limit * self._backoff)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "in_flight": self._in_flight,
+            "min_limit": self._minimum,
+            "max_limit": self._maximum,
+            "latency_ewma_seconds": self._latency_ewma,
+            "latency_target_seconds": self._latency_target,
+            "samples": self._samples,
+            "errors": self._errors,
+        }
+
+    def _wake(self) -> None:
+        free = self.limit - self._in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+
+class WaitTracker:
+    """Running queue-wait and run-time figures used for metrics and wait estimates."""
+
+    def __init__(self) -> None:
+        self.last_wait = 0.0
+        self.max_wait = 0.0
+        self.total_wait = 0.0
+        self.started = 0
+        self._run_time_ewma: Optional[float] = None
+
+    def record_wait(self, seconds: float) -> None:
+        self.last_wait = seconds
+        self.max_wait = max(self.max_wait, seconds)
+        self.total_wait += seconds
+        self.started += 1
+
+    def record_run(self, seconds: float) -> None:
+        self._run_time_ewma = seconds if self._run_time_ewma is None else 0.8 * self._run_time_ewma + 0.2 * seconds
+
+    def estimate_wait(self, position: int, limit: int) -> float:
+        """Jobs ahead drain ``limit`` at a time, each wave taking about one mean run time."""
+        run_time = self._run_time_ewma if self._run_time_ewma is not None else 30.0
+        return math.ceil(max(0, position) / max(1, limit)) * run_time
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "last_wait_seconds": self.last_wait,
+            "max_wait_seconds": self.max_wait,
+            "mean_wait_seconds": self.total_wait / self.started if self.started else 0.0,
+            "mean_run_seconds": self._run_time_ewma,
+        }
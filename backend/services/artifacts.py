@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import asyncio
+import gzip
+import logging
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIONS = ("none", "gzip", "zstd")
+_SUFFIXES = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+RESULT_NAME = "result.json"
+# Uncompressed first: it is what older outputs and ``compression="none"`` produce.
+_RESULT_CANDIDATES = tuple((RESULT_NAME + suffix, compression) for compression, suffix in _SUFFIXES.items())
+
+
+class ArtifactWriter:
+    """Job artifacts under ``<directory>/<job_id>/``: ``final_<flow>.md`` drafts and the result.
+
+    Results are serialized with orjson (compact, no indentation) and optionally stored
+    as ``result.json.gz`` or ``result.json.zst``; readers accept every variant, so the
+    setting can change without rewriting old outputs. Serialization and file I/O run
+    on a bounded thread pool, never on the event loop. Writes go to a temporary file
+    first and are renamed into place.
+    """
+
+    def __init__(self, directory: Path, compression: str = "none", max_workers: int = 4) -> None:
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"compression must be one of {COMPRESSIONS}")
+        if compression == "zstd":
+            _zstd()  # fail at startup rather than on the first job
+        self._directory = directory
+        self._compression = compression
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="artifacts")
+        self._written = 0
+        self._bytes_written = 0
+        self._compacted = 0
+        self._removed = 0
+
+    @property
+    def directory(self) -> Path:
+        return self._directory
+
+    async def write_job(self, job_id: str, drafts: Dict[str, Any], result: Dict[str, Any]) -> None:
+        """Write every flow's final draft and the result document."""
+        await self._run(self._write_job, job_id, drafts, result)
+
+    async def read_result(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self._run(self.load_result, job_id)
+
+    def load_result(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Blocking read for synchronous callers (``JobManager.get_job``)."""
+        directory = self._directory / job_id
+        for name, compression in _RESULT_CANDIDATES:
+            path = directory / name
+            if path.exists():
+                return orjson.loads(_decompress(path.read_bytes(), compression))
+        return None
+
+    async def compact(self, retention_seconds: float = 0.0) -> Dict[str, int]:
+        """Delete job outputs untouched for ``retention_seconds`` (0 keeps them) and re-encode
+        results not in the current format, e.g. pretty-printed ``result.json`` from older versions."""
+        return await self._run(self._compact, retention_seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "compression": self._compression,
+            "written": self._written,
+            "bytes_written": self._bytes_written,
+            "compacted": self._compacted,
+            "removed": self._removed,
+        }
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    async def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _write_job(self, job_id: str, drafts: Dict[str, Any], result: Dict[str, Any]) -> None:
+        directory = self._directory / job_id
+        directory.mkdir(parents=True, exist_ok=True)
+        for flow_name, flow in drafts.items():
+            _atomic_write(directory / f"final_{flow_name}.md", flow["final"].encode("utf-8"))
+        self._write_result(directory, orjson.dumps(result))
+        self._written += 1
+
+    def _write_result(self, directory: Path, encoded: bytes) -> None:
+        data = _compress(encoded, self._compression)
+        target = directory / (RESULT_NAME + _SUFFIXES[self._compression])
+        _atomic_write(target, data)
+        self._bytes_written += len(data)
+        # Drop the result in any other format so readers never see a stale variant.
+        for name, _ in _RESULT_CANDIDATES:
+            if name != target.name:
+                (directory / name).unlink(missing_ok=True)
+
+    def _compact(self, retention_seconds: float) -> Dict[str, int]:
+        removed = compacted = 0
+        if not self._directory.exists():
+            return {"removed": 0, "compacted": 0}
+        expire_before = time.time() - retention_seconds
+        for directory in self._directory.iterdir():
+            if not directory.is_dir() or directory.name.startswith("."):
+                continue
+            try:
+                if directory.name == "batches":
+                    removed += self._expire_files(directory, expire_before) if retention_seconds > 0 else 0
+                    continue
+                newest = max((path.stat().st_mtime for path in directory.iterdir()), default=0.0)
+                if retention_seconds > 0 and newest < expire_before:
+                    shutil.rmtree(directory, ignore_errors=True)
+                    removed += 1
+                elif self._recode(directory):
+                    compacted += 1
+            except FileNotFoundError:
+                continue  # removed concurrently, e.g. by another worker's compaction
+        self._removed += removed
+        self._compacted += compacted
+        if removed or compacted:
+            logger.info("Compacted job outputs", extra={"removed": removed, "compacted": compacted})
+        return {"removed": removed, "compacted": compacted}
+
+    def _recode(self, directory: Path) -> bool:
+        """Re-encode the result unless it is already in the current format.
+
+        The format is told from the file name, plus the first bytes of an uncompressed
+        ``result.json`` (older versions pretty-printed it); only results that are
+        re-encoded are read in full, so repeated passes stay cheap.
+        """
+        current = RESULT_NAME + _SUFFIXES[self._compression]
+        for name, compression in _RESULT_CANDIDATES:
+            path = directory / name
+            if not path.exists():
+                continue
+            if name == current and not (compression == "none" and _pretty_printed(path)):
+                return False
+            raw = _decompress(path.read_bytes(), compression)
+            self._write_result(directory, orjson.dumps(orjson.loads(raw)))
+            return True
+        return False
+
+    @staticmethod
+    def _expire_files(directory: Path, expire_before: float) -> int:
+        removed = 0
+        for path in directory.iterdir():
+            if path.is_file() and path.stat().st_mtime < expire_before:
+                path.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    # Per-process temp name: several workers may compact the same directory.
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_bytes(data)
+    tmp_path.replace(path)
+
+
+def _pretty_printed(path: Path) -> bool:
+    with path.open("rb") as handle:
+        return b"\n" in handle.read(2)
+
+
+def _compress(data: bytes, compression: str) -> bytes:
+    if compression == "gzip":
+        return gzip.compress(data, compresslevel=6)
+    if compression == "zstd":
+        return _zstd().ZstdCompressor(level=3).compress(data)
+    return data
+
+
+def _decompress(data: bytes, compression: str) -> bytes:
+    if compression == "gzip":
+        return gzip.decompress(data)
+    if compression == "zstd":
+        return _zstd().ZstdDecompressor().decompress(data)
+    return data
+
+
+def _zstd() -> Any:
+    try:
+        import zstandard
+    except ImportError as exc:  # pragma: no cover - optional dependency
+        raise RuntimeError("OUTPUT_COMPRESSION=zstd requires the zstandard package to be installed") from exc
+    return zstandard
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import json
+import logging
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BatchStore:
+    """Batch manifests (ordered job ids and titles) as JSON files next to the job outputs.
+
+    Jobs themselves live in the job store; the manifest only groups them, so any worker
+    sharing the output directory can report on and export a batch.
+    """
+
+    def __init__(self, directory: Path) -> None:
+        self._directory = directory
+
+    def save(self, batch_id: str, job_ids: List[str], titles: List[str]) -> Dict[str, Any]:
+        manifest = {
+            "batch_id": batch_id,
+            "created_at": datetime.utcnow().isoformat(),
+            "items": [{"job_id": job_id, "title": title} for job_id, title in zip(job_ids, titles)],
+        }
+        self._directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(batch_id)
+        tmp_path = path.with_suffix(".json.tmp")
+        tmp_path.write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+        tmp_path.replace(path)
+        logger.info("Batch created", extra={"batch_id": batch_id, "items": len(job_ids)})
+        return manifest
+
+    def load(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            uuid.UUID(batch_id)
+        except ValueError:
+            return None
+        path = self._path(batch_id)
+        if not path.exists():
+            return None
+        return json.loads(path.read_text(encoding="utf-8"))
+
+    def _path(self, batch_id: str) -> Path:
+        return self._directory / f"{batch_id}.json"
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import logging
+import math
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+_CJK = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]")
+_SPACE = re.compile(r"\s")
+# Sentence ends, Chinese and Western, kept with the sentence they close.
+_SENTENCE = re.compile(r"[^。！？；!?;\n]*(?:[。！？；!?;\n]+|$)")
+# Tokens per non-CJK, non-space character; one token per CJK character. Both err on the
+# high side of common BPE vocabularies, so an estimate within budget is within budget.
+_OTHER_TOKEN_RATIO = 0.3
+# Relevance given up per budget's worth of original text (capped) and per split part:
+# among similarly scored candidates, concise passages and document openings win.
+LENGTH_PENALTY = 0.05
+PART_PENALTY = 0.02
+MAX_PARTS = 8
+
+
+def estimate_tokens(text: str) -> int:
+    """Fast local token estimate for prompt budgeting; no tokenizer download needed."""
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    other = len(text) - cjk - len(_SPACE.findall(text))
+    return cjk + math.ceil(other * _OTHER_TOKEN_RATIO)
+
+
+def trim_to_tokens(text: str, budget: int) -> str:
+    """Longest prefix within ``budget`` tokens, cut back to a sentence end when one is close."""
+    if estimate_tokens(text) <= budget:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(text[:middle]) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    prefix = text[:low]
+    boundary = max(prefix.rfind(mark) for mark in "。！？；!?;\n")
+    if boundary >= low * 0.7:
+        prefix = prefix[: boundary + 1]
+    return prefix.rstrip()
+
+
+def split_to_tokens(text: str, budget: int) -> List[str]:
+    """Consecutive passages of whole sentences, each within ``budget`` tokens."""
+    parts: List[str] = []
+    current = ""
+    for sentence in _SENTENCE.findall(text):
+        if not sentence:
+            continue
+        if estimate_tokens(current + sentence) <= budget:
+            current += sentence
+            continue
+        if current.strip():
+            parts.append(current.strip())
+        current = sentence
+        while estimate_tokens(current) > budget:
+            head = trim_to_tokens(current, budget) or current[:1]
+            parts.append(head.strip())
+            current = current[len(head) :].lstrip()
+        if len(parts) >= MAX_PARTS:
+            return parts[:MAX_PARTS]
+    if current.strip():
+        parts.append(current.strip())
+    return parts[:MAX_PARTS]
+
+
+@dataclass(frozen=True)
+class Section:
+    field: str
+    budget: int
+    split: bool = False
+
+
+@dataclass
+class _Passage:
+    payload: Dict[str, Any]
+    utility: float
+    order: Tuple[int, int]
+
+
+class ContextAssembler:
+    """Fit retrieved payloads into per-section token budgets and pick one per flow.
+
+    Templates and tone guidelines are trimmed (splitting would break their structure);
+    evidence is split into sentence-aligned passages so every part of a long document
+    can be used. Candidates are ranked by retrieval score less a small penalty for
+    length and for later parts, and flows take them in rank order, cycling when there
+    are fewer candidates than flows.
+    """
+
+    def __init__(self, template_tokens: int = 600, tone_tokens: int = 300, evidence_tokens: int = 800) -> None:
+        self._sections: Dict[str, Section] = {
+            "template": Section("content", max(1, template_tokens)),
+            "tone": Section("guideline", max(1, tone_tokens)),
+            "evidence": Section("content", max(1, evidence_tokens), split=True),
+        }
+
+    @property
+    def budgets(self) -> Dict[str, int]:
+        return {name: section.budget for name, section in self._sections.items()}
+
+    def pick(self, section: str, payloads: List[Dict[str, Any]], count: int) -> List[Dict[str, Any]]:
+        """``count`` payloads for ``section``, best first, text within the section budget."""
+        rule = self._sections[section]
+        passages = self._passages(rule, payloads)
+        if not passages:
+            return [{rule.field: "", "tokens": 0} for _ in range(count)]
+        return [passages[index % len(passages)].payload for index in range(count)]
+
+    def _passages(self, rule: Section, payloads: List[Dict[str, Any]]) -> List[_Passage]:
+        passages: List[_Passage] = []
+        for position, payload in enumerate(payloads):
+            text = str(payload.get(rule.field) or "")
+            if not text.strip():
+                continue
+            score = float(payload.get("score") or 0.0)
+            tokens = estimate_tokens(text)
+            if tokens <= rule.budget:
+                pieces = [text]
+            elif rule.split:
+                pieces = split_to_tokens(text, rule.budget)
+            else:
+                pieces = [trim_to_tokens(text, rule.budget)]
+            for part, piece in enumerate(pieces):
+                piece_tokens = estimate_tokens(piece)
+                # A trimmed piece is charged for the text it dropped, a split part for itself.
+                charged = tokens if len(pieces) == 1 else piece_tokens
+                utility = score - LENGTH_PENALTY * min(charged / rule.budget, 4.0) - PART_PENALTY * part
+                selected = {**payload, rule.field: piece, "tokens": piece_tokens}
+                if len(pieces) > 1:
+                    selected["part"] = part
+                elif piece_tokens < tokens:
+                    selected["truncated"] = True
+                passages.append(_Passage(selected, utility, (position, part)))
+        passages.sort(key=lambda passage: (-passage.utility, passage.order))
+        return passages
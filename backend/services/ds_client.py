@@ -1,20 +1,49 @@
 from __future__ import annotations
 
+import asyncio
+import json
 import logging
-from typing import Any, Dict, Iterable, List
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
 
 import httpx
 
 from backend.config import Settings
+from backend.services.metrics import LLM_ATTEMPT_SECONDS, LLM_RETRIES, LLM_TOKENS
+from backend.services.resilience import (
+    CircuitBreaker,
+    RetryPolicy,
+    counts_as_outage,
+    is_retryable,
+    retry_after_seconds,
+)
+
+T = TypeVar("T")
 
 logger = logging.getLogger(__name__)
 
 
+# Bump whenever the title prompt changes so cached title results are not reused.
+TITLES_PROMPT_VERSION = 1
+
+
 class DSClient:
     """Client wrapper for the downstream LLM service."""
 
-    def __init__(self, settings: Settings) -> None:
+    _TITLE_PARAMS: Dict[str, Any] = {
+        "temperature": 0.7,
+        "max_tokens": 800,
+        "response_format": {"type": "json_object"},
+    }
+
+    def __init__(self, settings: Settings, transport: Optional[httpx.AsyncBaseTransport] = None) -> None:
         self._settings = settings
+        self._retry = RetryPolicy(
+            max_retries=settings.ds_max_retries,
+            backoff_base=settings.ds_backoff_base,
+            backoff_max=settings.ds_backoff_max,
+        )
+        self._breaker = CircuitBreaker(settings.ds_breaker_threshold, settings.ds_breaker_reset_seconds)
+        self._deadline = settings.ds_request_deadline
         self._client = httpx.AsyncClient(
             base_url=settings.ds_base_url,
             headers={
@@ -22,38 +51,213 @@ class DSClient:
                 "Content-Type": "application/json",
             },
             timeout=httpx.Timeout(60.0, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=settings.ds_max_connections,
+                max_keepalive_connections=settings.ds_max_keepalive,
+                keepalive_expiry=settings.ds_keepalive_expiry,
+            ),
+            http2=_http2_enabled(settings.ds_http2),
+            transport=transport,
         )
+        self._requests = 0
+        self._retries = 0
+        self._failures = 0
+        self._observers: List[Callable[[float, bool], None]] = []
+        self._prompt_tokens = 0
+        self._completion_tokens = 0
+
+    @property
+    def model(self) -> str:
+        return self._settings.ds_model
+
+    @property
+    def available(self) -> bool:
+        """False while the circuit breaker is open and calls would fail fast."""
+        return self._breaker.state != "open"
+
+    def add_observer(self, callback: Callable[[float, bool], None]) -> None:
+        """Register ``callback(latency_seconds, ok)``, run after every gateway attempt.
+
+        For streaming calls the latency is the time to the first chunk.
+        """
+        self._observers.append(callback)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self._requests,
+            "retries": self._retries,
+            "failures": self._failures,
+            "prompt_tokens": self._prompt_tokens,
+            "completion_tokens": self._completion_tokens,
+            "breaker_state": self._breaker.state,
+        }
 
     async def close(self) -> None:
         await self._client.aclose()
 
-    async def chat_completion(self, messages: Iterable[Dict[str, Any]], **params: Any) -> Dict[str, Any]:
+    async def chat_completion(
+        self,
+        messages: Iterable[Dict[str, Any]],
+        deadline: Optional[float] = None,
+        **params: Any,
+    ) -> Dict[str, Any]:
+        """Non-streaming completion, retried on 429/5xx/transport errors until ``deadline`` seconds."""
         payload = {
             "model": self._settings.ds_model,
             "messages": list(messages),
             **params,
         }
         logger.info("Calling DS chat completion", extra={"model": self._settings.ds_model})
-        response = await self._client.post("/chat/completions", json=payload)
-        response.raise_for_status()
-        return response.json()
+
+        async def _post() -> Dict[str, Any]:
+            response = await self._client.post("/chat/completions", json=payload)
+            response.raise_for_status()
+            body = response.json()
+            self.record_usage(body.get("usage"))
+            return body
+
+        return await self._with_retries(_post, deadline)
+
+    async def stream_chat_completion(
+        self,
+        messages: Iterable[Dict[str, Any]],
+        deadline: Optional[float] = None,
+        **params: Any,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Yield the decoded SSE chunks of a ``stream=True`` chat completion.
+
+        Failures are retried only until the first chunk has been yielded; after that the
+        caller has seen partial output and the error is raised.
+        """
+        payload = {
+            "model": self._settings.ds_model,
+            "messages": list(messages),
+            "stream_options": {"include_usage": True},
+            **params,
+            "stream": True,
+        }
+        logger.info("Streaming DS chat completion", extra={"model": self._settings.ds_model})
+        loop = asyncio.get_running_loop()
+        deadline_at = loop.time() + (deadline or self._deadline)
+        attempt = 0
+        while True:
+            self._breaker.check()
+            self._requests += 1
+            attempt_started = loop.time()
+            started = False
+            try:
+                request = self._client.build_request("POST", "/chat/completions", json=payload)
+                # The deadline bounds the wait for headers and for every line, so a gateway
+                # that stalls mid-stream fails at the deadline, not at the read timeout.
+                async with asyncio.timeout_at(deadline_at):
+                    response = await self._client.send(request, stream=True)
+                try:
+                    response.raise_for_status()
+                    lines = response.aiter_lines()
+                    while (line := await _next_line(lines, deadline_at)) is not None:
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[len("data:") :].strip()
+                        if data == "[DONE]":
+                            break
+                        if data:
+                            if not started:
+                                started = True
+                                self._notify(loop.time() - attempt_started, None)
+                            chunk = json.loads(data)
+                            self.record_usage(chunk.get("usage"))
+                            yield chunk
+                finally:
+                    await response.aclose()
+            except Exception as exc:
+                if not started:
+                    self._notify(loop.time() - attempt_started, exc)
+                delay = self._on_failure(exc, attempt, deadline_at - loop.time(), retry=not started)
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                self._breaker.abandon()
+                raise
+            self._breaker.record_success()
+            return
+
+    async def _with_retries(self, call: Callable[[], Awaitable[T]], deadline: Optional[float]) -> T:
+        loop = asyncio.get_running_loop()
+        deadline_at = loop.time() + (deadline or self._deadline)
+        attempt = 0
+        while True:
+            self._breaker.check()
+            self._requests += 1
+            started = loop.time()
+            try:
+                result = await asyncio.wait_for(call(), timeout=max(0.0, deadline_at - loop.time()))
+            except Exception as exc:
+                self._notify(loop.time() - started, exc)
+                delay = self._on_failure(exc, attempt, deadline_at - loop.time())
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                self._breaker.abandon()
+                raise
+            self._notify(loop.time() - started, None)
+            self._breaker.record_success()
+            return result
+
+    def record_usage(self, usage: Optional[Dict[str, Any]]) -> None:
+        if not usage:
+            return
+        prompt_tokens = int(usage.get("prompt_tokens") or 0)
+        completion_tokens = int(usage.get("completion_tokens") or 0)
+        self._prompt_tokens += prompt_tokens
+        self._completion_tokens += completion_tokens
+        LLM_TOKENS.inc(prompt_tokens, kind="prompt")
+        LLM_TOKENS.inc(completion_tokens, kind="completion")
+
+    def _notify(self, latency: float, exc: Optional[Exception]) -> None:
+        ok = exc is None or not (counts_as_outage(exc) or is_retryable(exc))
+        LLM_ATTEMPT_SECONDS.observe(latency, outcome="ok" if ok else "error")
+        for observer in self._observers:
+            observer(latency, ok)
+
+    def _on_failure(self, exc: Exception, attempt: int, remaining: float, retry: bool = True) -> float:
+        """Record a failed attempt and return the backoff delay, or re-raise if it is final."""
+        if counts_as_outage(exc):
+            self._breaker.record_failure()
+        else:
+            # Throttling and client errors say nothing about gateway health.
+            self._breaker.abandon()
+        delay = self._retry.backoff(attempt, retry_after_seconds(exc))
+        if not retry or not is_retryable(exc) or attempt >= self._retry.max_retries or delay >= remaining:
+            self._failures += 1
+            raise exc
+        self._retries += 1
+        LLM_RETRIES.inc()
+        logger.warning(
+            "Retrying DS chat completion",
+            extra={"attempt": attempt + 1, "delay": round(delay, 3), "error": repr(exc)},
+        )
+        return delay
 
     async def generate_titles(self, keywords: List[str]) -> Dict[str, Any]:
-        user_prompt = self._build_titles_prompt(keywords)
-        messages = [
+        logger.info("Generating P0 titles", extra={"keywords": keywords})
+        return await self.chat_completion(self._build_titles_messages(keywords), **self._TITLE_PARAMS)
+
+    async def stream_titles(self, keywords: List[str]) -> AsyncIterator[Dict[str, Any]]:
+        logger.info("Streaming P0 titles", extra={"keywords": keywords})
+        async for chunk in self.stream_chat_completion(self._build_titles_messages(keywords), **self._TITLE_PARAMS):
+            yield chunk
+
+    @classmethod
+    def _build_titles_messages(cls, keywords: List[str]) -> List[Dict[str, Any]]:
+        return [
             {
                 "role": "system",
                 "content": "你是资深中文标题编辑，注意精炼有冲击力，只返回JSON，不要解释。",
             },
-            {"role": "user", "content": user_prompt},
+            {"role": "user", "content": cls._build_titles_prompt(keywords)},
         ]
-        logger.info("Generating P0 titles", extra={"keywords": keywords})
-        return await self.chat_completion(
-            messages,
-            temperature=0.7,
-            max_tokens=800,
-            response_format={"type": "json_object"},
-        )
 
     @staticmethod
     def _build_titles_prompt(keywords: List[str]) -> str:
@@ -70,3 +274,37 @@ class DSClient:
             "}\n"
             "要求：所有标题必须为中文，28 字以内，避免重复或带有解释性文字。"
         )
+
+
+def delta_text(chunk: Dict[str, Any], index: int = 0) -> str:
+    """Return the content delta of choice ``index`` in a streamed completion chunk."""
+    for choice in chunk.get("choices") or []:
+        if choice.get("index", 0) == index:
+            return (choice.get("delta") or {}).get("content") or ""
+    return ""
+
+
+def choice_deltas(chunk: Dict[str, Any]) -> Iterator[Tuple[int, str]]:
+    """Yield ``(choice index, content delta)`` for every choice in a streamed chunk."""
+    for choice in chunk.get("choices") or []:
+        yield choice.get("index", 0), (choice.get("delta") or {}).get("content") or ""
+
+
+async def _next_line(lines: AsyncIterator[str], deadline_at: float) -> Optional[str]:
+    """Next line of a streamed response, ``None`` at its end; ``TimeoutError`` past ``deadline_at``."""
+    try:
+        async with asyncio.timeout_at(deadline_at):
+            return await anext(lines)
+    except StopAsyncIteration:
+        return None
+
+
+def _http2_enabled(requested: bool) -> bool:
+    if not requested:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.warning("h2 is not installed, DSClient falls back to HTTP/1.1")
+        return False
+    return True
@@ -1,17 +1,27 @@
 from __future__ import annotations
 
 import logging
+import threading
 from functools import lru_cache
-from typing import Iterable, List
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional, Protocol
 
 import numpy as np
-from FlagEmbedding import BGEM3FlagModel
 
 from backend.config import Settings
 
+if TYPE_CHECKING:
+    from FlagEmbedding import BGEM3FlagModel
+
 logger = logging.getLogger(__name__)
 
 
+class EmbeddingProvider(Protocol):
+    @property
+    def dimension(self) -> int: ...
+
+    def embed(self, texts: Iterable[str]) -> List[List[float]]: ...
+
+
 class EmbeddingService:
     def __init__(self, settings: Settings) -> None:
         self._settings = settings
@@ -20,36 +30,114 @@ class EmbeddingService:
         logger.info("Loaded BGE-M3 model", extra={"dimension": self._dimension})
 
     def _load_model(self) -> BGEM3FlagModel:
-        logger.info("Loading BGE-M3 model", extra={"path": str(self._settings.models_path)})
+        import torch
+        from FlagEmbedding import BGEM3FlagModel
+
+        if self._settings.embed_threads > 0:
+            torch.set_num_threads(self._settings.embed_threads)
+        # FP16 only pays off on GPU; on CPU it is slower than FP32.
+        use_fp16 = torch.cuda.is_available()
+        logger.info(
+            "Loading BGE-M3 model",
+            extra={"path": str(self._settings.models_path), "fp16": use_fp16, "threads": torch.get_num_threads()},
+        )
         return BGEM3FlagModel(
             str(self._settings.models_path),
-            use_fp16=True,
+            use_fp16=use_fp16,
         )
 
     def _probe_dimension(self) -> int:
-        vectors = self.embed(["probe"], ensure_min_batch=False)
+        vectors = self.embed(["probe"])
         return len(vectors[0]) if vectors else 0
 
     @property
     def dimension(self) -> int:
         return self._dimension
 
-    def embed(self, texts: Iterable[str], ensure_min_batch: bool = True) -> List[List[float]]:
+    def embed(self, texts: Iterable[str]) -> List[List[float]]:
         texts_list = list(texts)
         if not texts_list:
             return []
-        original_len = len(texts_list)
-        batch_size = original_len
-        if ensure_min_batch and original_len < 8:
-            padding = [texts_list[-1]] * (8 - original_len)
-            texts_list.extend(padding)
-            batch_size = 8
-        encode_batch_size = max(8, len(texts_list)) if ensure_min_batch else max(1, batch_size)
-        embeddings = self._model.encode(texts_list, batch_size=encode_batch_size)
-        embeddings = embeddings[:original_len]
+        output = self._model.encode(
+            texts_list,
+            batch_size=len(texts_list),
+            max_length=self._settings.embed_max_length,
+        )
+        embeddings = output["dense_vecs"] if isinstance(output, dict) else output
         return [np.asarray(vec, dtype=np.float32).tolist() for vec in embeddings]
 
 
-@lru_cache(maxsize=1)
-def get_embedding_service(settings: Settings) -> EmbeddingService:
+class LazyEmbeddingProvider:
+    """Builds the wrapped provider on ``load()`` (startup warmup) or on first use."""
+
+    def __init__(self, factory: Callable[[], EmbeddingProvider]) -> None:
+        self._factory = factory
+        self._provider: Optional[EmbeddingProvider] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._provider is not None
+
+    def load(self) -> EmbeddingProvider:
+        if self._provider is None:
+            with self._lock:
+                if self._provider is None:
+                    self._provider = self._factory()
+        return self._provider
+
+    @property
+    def dimension(self) -> int:
+        return self.load().dimension
+
+    def embed(self, texts: Iterable[str]) -> List[List[float]]:
+        return self.load().embed(texts)
+
+    def stats(self) -> Optional[Dict[str, Any]]:
+        stats = getattr(self._provider, "stats", None)
+        return stats() if callable(stats) else None
+
+    def close(self) -> None:
+        close = getattr(self._provider, "close", None)
+        if callable(close):
+            close()
+
+
+def embedding_model_id(settings: Settings) -> str:
+    """Identifies whose vectors these are; backends differ slightly (e.g. int8 ONNX)."""
+    if settings.embed_backend == "flag":
+        return str(settings.models_path)
+    return f"{settings.models_path}#{settings.embed_backend}"
+
+
+def create_embedding_provider(settings: Settings) -> EmbeddingProvider:
+    """Uncached model for ``settings.embed_backend``: ``flag`` (PyTorch) or ``onnx``."""
+    if settings.embed_backend == "onnx":
+        from backend.services.embedding_onnx import OnnxEmbeddingService
+
+        return OnnxEmbeddingService(settings)
     return EmbeddingService(settings)
+
+
+@lru_cache(maxsize=1)
+def get_embedding_service(settings: Settings) -> EmbeddingProvider:
+    from backend.services.embedding_cache import CachedEmbeddingService, DiskVectorStore, EmbeddingCache
+
+    if settings.embed_sidecar_socket is not None:
+        from backend.services.embedding_sidecar import SidecarEmbeddingClient
+
+        # The sidecar owns the model and the cache; workers only hold a socket pool.
+        return SidecarEmbeddingClient(settings.embed_sidecar_socket)
+    service = create_embedding_provider(settings)
+    if settings.embed_cache_memory_items <= 0 and settings.embed_cache_disk_items <= 0:
+        return service
+    disk_store = None
+    if settings.embed_cache_disk_items > 0:
+        disk_store = DiskVectorStore(
+            settings.embed_cache_dir or settings.project_root / "backend" / "data" / "embedding_cache",
+            dimension=service.dimension,
+            capacity=settings.embed_cache_disk_items,
+            dtype=settings.embed_cache_dtype,
+        )
+    cache = EmbeddingCache(embedding_model_id(settings), settings.embed_cache_memory_items, disk_store)
+    return CachedEmbeddingService(service, cache)
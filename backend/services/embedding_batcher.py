@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+from backend.services.embedding import EmbeddingProvider
+
+logger = logging.getLogger(__name__)
+
+_Pending = Tuple[str, "asyncio.Future[List[float]]"]
+
+
+class EmbeddingBatcher:
+    """Async front-end that micro-batches embed requests onto a dedicated model thread."""
+
+    def __init__(
+        self,
+        service: EmbeddingProvider,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+    ) -> None:
+        self._service = service
+        self._max_batch_size = max(1, max_batch_size)
+        self._max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding")
+        self._pending: Deque[_Pending] = deque()
+        self._has_pending: Optional[asyncio.Event] = None
+        self._batch_full: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task[None]] = None
+        self._batches = 0
+        self._items = 0
+        self._full_batches = 0
+
+    @property
+    def dimension(self) -> int:
+        return self._service.dimension
+
+    async def embed(self, texts: Iterable[str]) -> List[List[float]]:
+        texts_list = list(texts)
+        if not texts_list:
+            return []
+        self._ensure_worker()
+        loop = asyncio.get_running_loop()
+        futures: List[asyncio.Future[List[float]]] = []
+        for text in texts_list:
+            future: asyncio.Future[List[float]] = loop.create_future()
+            self._pending.append((text, future))
+            futures.append(future)
+        self._has_pending.set()
+        if len(self._pending) >= self._max_batch_size:
+            self._batch_full.set()
+        return list(await asyncio.gather(*futures))
+
+    async def embed_one(self, text: str) -> List[float]:
+        vectors = await self.embed([text])
+        return vectors[0]
+
+    def stats(self) -> Dict[str, Any]:
+        capacity = self._batches * self._max_batch_size
+        return {
+            "max_batch_size": self._max_batch_size,
+            "max_wait_ms": self._max_wait * 1000.0,
+            "batches": self._batches,
+            "items": self._items,
+            "full_batches": self._full_batches,
+            "pending": len(self._pending),
+            "mean_batch_size": self._items / self._batches if self._batches else 0.0,
+            "fill_ratio": self._items / capacity if capacity else 0.0,
+        }
+
+    def cache_stats(self) -> Dict[str, Any] | None:
+        stats = getattr(self._service, "stats", None)
+        return stats() if callable(stats) else None
+
+    async def close(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        while self._pending:
+            _, future = self._pending.popleft()
+            if not future.done():
+                future.set_exception(RuntimeError("Embedding batcher closed"))
+        close = getattr(self._service, "close", None)
+        if callable(close):
+            await asyncio.get_running_loop().run_in_executor(self._executor, close)
+        self._executor.shutdown(wait=False)
+
+    def _ensure_worker(self) -> None:
+        if self._worker is not None and not self._worker.done():
+            return
+        self._has_pending = asyncio.Event()
+        self._batch_full = asyncio.Event()
+        self._worker = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._has_pending.wait()
+            if len(self._pending) < self._max_batch_size and self._max_wait > 0:
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), timeout=self._max_wait)
+                except asyncio.TimeoutError:
+                    pass
+            batch = self._take_batch()
+            if not batch:
+                continue
+            texts = [text for text, _ in batch]
+            try:
+                vectors = await loop.run_in_executor(self._executor, self._service.embed, texts)
+            except Exception as exc:
+                logger.exception("Embedding batch failed", extra={"size": len(batch)})
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+            self._record(len(batch))
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+
+    def _take_batch(self) -> List[_Pending]:
+        batch: List[_Pending] = []
+        while self._pending and len(batch) < self._max_batch_size:
+            item = self._pending.popleft()
+            if not item[1].cancelled():
+                batch.append(item)
+        if len(self._pending) < self._max_batch_size:
+            self._batch_full.clear()
+        if not self._pending:
+            self._has_pending.clear()
+        return batch
+
+    def _record(self, size: int) -> None:
+        self._batches += 1
+        self._items += size
+        if size >= self._max_batch_size:
+            self._full_batches += 1
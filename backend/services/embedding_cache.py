@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from backend.services.embedding import EmbeddingProvider
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+_KEY_BYTES = 32
+_FLUSH_EVERY = 256
+
+
+def normalize_text(text: str) -> str:
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def cache_key(model_path: str, text: str) -> bytes:
+    digest = hashlib.sha256()
+    digest.update(model_path.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(normalize_text(text).encode("utf-8"))
+    return digest.digest()
+
+
+class DiskVectorStore:
+    """Fixed-capacity vector store backed by memory-mapped .npy files.
+
+    ``keys.npy`` is the index (one sha256 digest per slot), ``vectors.npy`` holds the
+    vectors and ``ticks.npy`` the last access time used for LRU eviction.
+
+    Several worker processes may share one directory: every access holds an exclusive
+    ``flock`` on ``lock``, and the per-process ``key -> slot`` map is only a hint that
+    is checked against ``keys.npy`` before a vector is returned.
+    """
+
+    def __init__(self, directory: Path, dimension: int, capacity: int, dtype: str = "float16") -> None:
+        self._directory = directory
+        self._dimension = dimension
+        self._capacity = capacity
+        self._dtype = np.dtype(dtype)
+        directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._lock_file = (directory / "lock").open("a+b")
+        with self._locked():
+            self._open()
+            occupied = self._keys.any(axis=1)
+        self._slots: Dict[bytes, int] = {}
+        for slot in np.flatnonzero(occupied):
+            self._slots[self._keys[slot].tobytes()] = int(slot)
+        # Lowest slot last, so pop() fills the files front to back.
+        self._free: List[int] = np.flatnonzero(~occupied)[::-1].tolist()
+        self._dirty = 0
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def get(self, key: bytes) -> Optional[List[float]]:
+        with self._locked():
+            slot = self._slots.get(key)
+            if slot is None:
+                return None
+            if self._keys[slot].tobytes() != key:
+                # Evicted and reused by another process since this one indexed it.
+                del self._slots[key]
+                return None
+            self._touch(slot)
+            return self._vectors[slot].astype(np.float32).tolist()
+
+    def put(self, key: bytes, vector: List[float]) -> None:
+        with self._locked():
+            slot = self._slots.get(key)
+            if slot is None or self._keys[slot].tobytes() != key:
+                slot = self._free_slot()
+            # Key cleared, vector, then key: a crash in between leaves an unindexed slot,
+            # never a key pointing at another key's vector.
+            self._keys[slot] = 0
+            self._vectors[slot] = np.asarray(vector, dtype=self._dtype)
+            self._keys[slot] = np.frombuffer(key, dtype=np.uint8)
+            self._slots[key] = slot
+            self._touch(slot)
+            self._dirty += 1
+            if self._dirty >= _FLUSH_EVERY:
+                self._flush()
+
+    def flush(self) -> None:
+        with self._locked():
+            self._flush()
+
+    def _flush(self) -> None:
+        for array in (self._vectors, self._keys, self._ticks):
+            array.flush()
+        self._dirty = 0
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        with self._lock:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _open(self) -> None:
+        meta_path = self._directory / "meta.json"
+        meta = {"dimension": self._dimension, "capacity": self._capacity, "dtype": self._dtype.name}
+        paths = {name: self._directory / f"{name}.npy" for name in ("vectors", "keys", "ticks")}
+        reuse = meta_path.exists() and all(path.exists() for path in paths.values())
+        if reuse and json.loads(meta_path.read_text(encoding="utf-8")) != meta:
+            logger.info("Embedding cache layout changed, resetting", extra={"path": str(self._directory)})
+            reuse = False
+        if reuse:
+            self._vectors = np.load(paths["vectors"], mmap_mode="r+")
+            self._keys = np.load(paths["keys"], mmap_mode="r+")
+            self._ticks = np.load(paths["ticks"], mmap_mode="r+")
+            return
+        open_memmap = np.lib.format.open_memmap
+        self._vectors = open_memmap(
+            paths["vectors"], mode="w+", dtype=self._dtype, shape=(self._capacity, self._dimension)
+        )
+        self._keys = open_memmap(paths["keys"], mode="w+", dtype=np.uint8, shape=(self._capacity, _KEY_BYTES))
+        self._ticks = open_memmap(paths["ticks"], mode="w+", dtype=np.uint64, shape=(self._capacity,))
+        meta_path.write_text(json.dumps(meta), encoding="utf-8")
+
+    def _free_slot(self) -> int:
+        while self._free:
+            slot = self._free.pop()
+            if not self._keys[slot].any():
+                return slot
+            self._slots[self._keys[slot].tobytes()] = slot  # filled by another process
+        slot = int(np.argmin(self._ticks))
+        self._slots.pop(self._keys[slot].tobytes(), None)
+        return slot
+
+    def _touch(self, slot: int) -> None:
+        # Wall-clock nanoseconds, so ticks written by different processes compare.
+        self._ticks[slot] = time.time_ns()
+
+
+class EmbeddingCache:
+    """Content-addressed embedding cache with an in-memory LRU tier over a disk tier."""
+
+    def __init__(
+        self,
+        model_path: str,
+        memory_items: int,
+        disk_store: Optional[DiskVectorStore] = None,
+    ) -> None:
+        self._model_path = model_path
+        self._memory_items = memory_items
+        self._memory: "OrderedDict[bytes, List[float]]" = OrderedDict()
+        self._disk = disk_store
+        self._lock = threading.Lock()
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+
+    def key(self, text: str) -> bytes:
+        return cache_key(self._model_path, text)
+
+    def get(self, key: bytes) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self._memory_hits += 1
+                return vector
+            if self._disk is not None:
+                vector = self._disk.get(key)
+                if vector is not None:
+                    self._disk_hits += 1
+                    self._remember(key, vector)
+                    return vector
+            self._misses += 1
+            return None
+
+    def put(self, key: bytes, vector: List[float]) -> None:
+        with self._lock:
+            self._remember(key, vector)
+            if self._disk is not None:
+                self._disk.put(key, vector)
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._disk is not None:
+                self._disk.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._memory_hits + self._disk_hits + self._misses
+        hits = self._memory_hits + self._disk_hits
+        return {
+            "memory_items": len(self._memory),
+            "disk_items": len(self._disk) if self._disk is not None else 0,
+            "memory_hits": self._memory_hits,
+            "disk_hits": self._disk_hits,
+            "misses": self._misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+        }
+
+    def _remember(self, key: bytes, vector: List[float]) -> None:
+        if self._memory_items <= 0:
+            return
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._memory_items:
+            self._memory.popitem(last=False)
+
+
+class CachedEmbeddingService:
+    """Wraps an embedding provider and only encodes texts missing from the cache."""
+
+    def __init__(self, service: EmbeddingProvider, cache: EmbeddingCache) -> None:
+        self._service = service
+        self._cache = cache
+
+    @property
+    def dimension(self) -> int:
+        return self._service.dimension
+
+    def embed(self, texts: Iterable[str]) -> List[List[float]]:
+        texts_list = list(texts)
+        keys = [self._cache.key(text) for text in texts_list]
+        vectors: List[Optional[List[float]]] = [self._cache.get(key) for key in keys]
+        missing: Dict[bytes, str] = {}
+        for key, text, vector in zip(keys, texts_list, vectors):
+            if vector is None:
+                missing.setdefault(key, text)
+        if missing:
+            computed = dict(zip(missing, self._service.embed(missing.values())))
+            for key, vector in computed.items():
+                self._cache.put(key, vector)
+            vectors = [vector if vector is not None else computed[key] for key, vector in zip(keys, vectors)]
+        return vectors  # type: ignore[return-value]
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
+
+    def close(self) -> None:
+        self._cache.flush()
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+from typing import Any, Dict, Iterable, List
+
+import numpy as np
+
+from backend.config import Settings
+
+logger = logging.getLogger(__name__)
+
+
+class OnnxEmbeddingService:
+    """BGE-M3 dense embeddings through ONNX Runtime on CPU.
+
+    Expects an exported encoder (optionally int8-quantized with
+    ``python -m backend.tools.embedding_bench quantize``) whose first output is
+    either ``last_hidden_state`` or the pooled dense vector. The dense head of
+    BGE-M3 is the normalized CLS token, so both give the same vectors as
+    ``BGEM3FlagModel`` up to quantization error.
+    """
+
+    def __init__(self, settings: Settings) -> None:
+        try:
+            import onnxruntime as ort
+            from transformers import AutoTokenizer
+        except ImportError as exc:  # pragma: no cover - optional dependency
+            raise RuntimeError("EMBED_BACKEND=onnx requires onnxruntime and transformers to be installed") from exc
+
+        self._settings = settings
+        model_path = settings.embed_onnx_path or Path(settings.models_path) / "onnx" / "model_quantized.onnx"
+        if not model_path.exists():
+            raise RuntimeError(f"ONNX embedding model not found: {model_path}")
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if settings.embed_threads > 0:
+            options.intra_op_num_threads = settings.embed_threads
+            options.inter_op_num_threads = 1
+        logger.info("Loading ONNX embedding model", extra={"path": str(model_path), "threads": settings.embed_threads})
+        self._session = ort.InferenceSession(str(model_path), options, providers=["CPUExecutionProvider"])
+        self._input_names = {item.name for item in self._session.get_inputs()}
+        self._tokenizer = AutoTokenizer.from_pretrained(str(settings.models_path))
+        self._dimension = len(self.embed(["probe"])[0])
+        logger.info("Loaded ONNX embedding model", extra={"dimension": self._dimension})
+
+    @property
+    def dimension(self) -> int:
+        return self._dimension
+
+    def embed(self, texts: Iterable[str]) -> List[List[float]]:
+        texts_list = list(texts)
+        if not texts_list:
+            return []
+        encoded = self._tokenizer(
+            texts_list,
+            padding=True,
+            truncation=True,
+            max_length=self._settings.embed_max_length,
+            return_tensors="np",
+        )
+        feeds: Dict[str, Any] = {
+            name: encoded[name].astype(np.int64)
+            for name in ("input_ids", "attention_mask", "token_type_ids")
+            if name in self._input_names and name in encoded
+        }
+        output = self._session.run(None, feeds)[0]
+        dense = output[:, 0] if output.ndim == 3 else output
+        norms = np.linalg.norm(dense, axis=1, keepdims=True)
+        dense = dense / np.where(norms > 0, norms, 1.0)
+        return [np.asarray(vec, dtype=np.float32).tolist() for vec in dense]
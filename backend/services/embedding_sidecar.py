@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import queue
+import socket
+import struct
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from backend.services.embedding_batcher import EmbeddingBatcher
+
+logger = logging.getLogger(__name__)
+
+# Frames are ``<op or status: u8><payload length: u32>`` followed by the payload, little-endian.
+# EMBED payload: ``<count: u32>`` then ``<length: u32><utf-8 bytes>`` per text; the reply is
+# ``<count: u32><dimension: u32>`` followed by ``count * dimension`` float32 values.
+# INFO has no payload and replies with a JSON object (dimension and server stats).
+OP_EMBED = 1
+OP_INFO = 2
+STATUS_OK = 0
+STATUS_ERROR = 1
+_HEADER = struct.Struct("<BI")
+_U32 = struct.Struct("<I")
+_COUNTS = struct.Struct("<II")
+MAX_FRAME_BYTES = 64 * 1024 * 1024
+
+
+def encode_texts(texts: List[str]) -> bytes:
+    parts = [_U32.pack(len(texts))]
+    for text in texts:
+        data = text.encode("utf-8")
+        parts.append(_U32.pack(len(data)))
+        parts.append(data)
+    return b"".join(parts)
+
+
+def decode_texts(payload: bytes) -> List[str]:
+    (count,) = _U32.unpack_from(payload, 0)
+    offset = _U32.size
+    texts: List[str] = []
+    for _ in range(count):
+        (length,) = _U32.unpack_from(payload, offset)
+        offset += _U32.size
+        texts.append(payload[offset : offset + length].decode("utf-8"))
+        offset += length
+    return texts
+
+
+def encode_vectors(vectors: List[List[float]]) -> bytes:
+    matrix = np.asarray(vectors, dtype="<f4")
+    count, dimension = matrix.shape if matrix.ndim == 2 else (0, 0)
+    return _COUNTS.pack(count, dimension) + matrix.tobytes()
+
+
+def decode_vectors(payload: bytes) -> List[List[float]]:
+    count, dimension = _COUNTS.unpack_from(payload, 0)
+    matrix = np.frombuffer(payload, dtype="<f4", offset=_COUNTS.size, count=count * dimension)
+    return matrix.reshape(count, dimension).tolist()
+
+
+class EmbeddingSidecarServer:
+    """Owns the embedding model and serves workers over a Unix domain socket.
+
+    Requests from every connection go through one ``EmbeddingBatcher``, so texts from
+    different workers are encoded together.
+    """
+
+    def __init__(self, batcher: EmbeddingBatcher, socket_path: Path) -> None:
+        self._batcher = batcher
+        self._socket_path = socket_path
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections = 0
+        self._requests = 0
+
+    async def start(self) -> None:
+        self._socket_path.parent.mkdir(parents=True, exist_ok=True)
+        if self._socket_path.exists():
+            self._socket_path.unlink()
+        self._server = await asyncio.start_unix_server(self._handle, path=str(self._socket_path))
+        os.chmod(self._socket_path, 0o660)
+        logger.info("Embedding sidecar listening", extra={"socket": str(self._socket_path)})
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        await self._batcher.close()
+        if self._socket_path.exists():
+            self._socket_path.unlink()
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "dimension": self._batcher.dimension,
+            "connections": self._connections,
+            "requests": self._requests,
+            "batcher": self._batcher.stats(),
+            "cache": self._batcher.cache_stats(),
+        }
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._connections += 1
+        try:
+            while True:
+                try:
+                    op, length = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+                    if length > MAX_FRAME_BYTES:
+                        return
+                    payload = await reader.readexactly(length) if length else b""
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                self._requests += 1
+                status, reply = await self._dispatch(op, payload)
+                writer.write(_HEADER.pack(status, len(reply)) + reply)
+                try:
+                    await writer.drain()
+                except ConnectionError:
+                    return
+        finally:
+            self._connections -= 1
+            writer.close()
+
+    async def _dispatch(self, op: int, payload: bytes) -> Tuple[int, bytes]:
+        try:
+            if op == OP_EMBED:
+                return STATUS_OK, encode_vectors(await self._batcher.embed(decode_texts(payload)))
+            if op == OP_INFO:
+                return STATUS_OK, json.dumps(self.info()).encode("utf-8")
+            raise ValueError(f"Unknown op {op}")
+        except Exception as exc:
+            logger.exception("Embedding sidecar request failed", extra={"op": op})
+            return STATUS_ERROR, str(exc).encode("utf-8")
+
+
+class SidecarEmbeddingClient:
+    """``EmbeddingProvider`` backed by an ``EmbeddingSidecarServer``.
+
+    Blocking sockets from a small pool, since providers are called from the
+    batcher's model thread; a broken connection is replaced and the call retried once.
+    """
+
+    def __init__(self, socket_path: Path, timeout: float = 60.0, pool_size: int = 4) -> None:
+        self._socket_path = socket_path
+        self._timeout = timeout
+        self._idle: "queue.LifoQueue[socket.socket]" = queue.LifoQueue(maxsize=max(1, pool_size))
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._reconnects = 0
+        self._dimension = int(self._info()["dimension"])
+        logger.info("Using embedding sidecar", extra={"socket": str(socket_path), "dimension": self._dimension})
+
+    @property
+    def dimension(self) -> int:
+        return self._dimension
+
+    def embed(self, texts: Iterable[str]) -> List[List[float]]:
+        texts_list = list(texts)
+        if not texts_list:
+            return []
+        return decode_vectors(self._call(OP_EMBED, encode_texts(texts_list)))
+
+    def stats(self) -> Dict[str, Any]:
+        """Client counters plus the sidecar's live stats; blocks on a socket round trip."""
+        info = self._info()
+        return {
+            "sidecar": str(self._socket_path),
+            "client_requests": self._requests,
+            "client_reconnects": self._reconnects,
+            "sidecar_batcher": info.get("batcher"),
+            **(info.get("cache") or {}),
+        }
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def _info(self) -> Dict[str, Any]:
+        return json.loads(self._call(OP_INFO, b"").decode("utf-8"))
+
+    def _call(self, op: int, payload: bytes) -> bytes:
+        with self._lock:
+            self._requests += 1
+        try:
+            status, reply = self._exchange(op, payload)
+        except OSError:
+            # Pooled connections may predate a sidecar restart; drop them and retry once.
+            with self._lock:
+                self._reconnects += 1
+            self.close()
+            status, reply = self._exchange(op, payload)
+        if status != STATUS_OK:
+            raise RuntimeError(f"Embedding sidecar error: {reply.decode('utf-8', 'replace')}")
+        return reply
+
+    def _exchange(self, op: int, payload: bytes) -> Tuple[int, bytes]:
+        conn = self._acquire()
+        try:
+            conn.sendall(_HEADER.pack(op, len(payload)) + payload)
+            status, length = _HEADER.unpack(_recv_exactly(conn, _HEADER.size))
+            if length > MAX_FRAME_BYTES:
+                raise ConnectionError(f"Oversized sidecar reply ({length} bytes)")
+            reply = _recv_exactly(conn, length)
+        except BaseException:
+            conn.close()
+            raise
+        self._release(conn)
+        return status, reply
+
+    def _acquire(self) -> socket.socket:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            conn.settimeout(self._timeout)
+            conn.connect(str(self._socket_path))
+            return conn
+
+    def _release(self, conn: socket.socket) -> None:
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+
+def _recv_exactly(conn: socket.socket, size: int) -> bytes:
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = conn.recv_into(view[received:])
+        if count == 0:
+            raise ConnectionError("Embedding sidecar closed the connection")
+        received += count
+    return bytes(buffer)
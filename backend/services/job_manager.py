@@ -1,73 +1,516 @@
 from __future__ import annotations
 
 import asyncio
-import json
 import logging
+import os
+import socket
+import time
 import uuid
-from pathlib import Path
-from typing import Any, Dict, List, Optional
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
 
-from backend.models.job import JobState
+import orjson
+
+from backend.models.job import TERMINAL_STAGES, JobEvent, JobStage, JobState
+from backend.services.admission import PRIORITY_CLASSES, AdaptiveLimiter, AdmissionRejected, WaitTracker
+from backend.services.artifacts import ArtifactWriter
+from backend.services.job_store import JobStore, MemoryJobStore
+from backend.services.metrics import JOB_QUEUE_WAIT_SECONDS, JOB_RUN_SECONDS, JOBS_ADMITTED, JOBS_REJECTED
 
 logger = logging.getLogger(__name__)
 
+# Unknown job ids remembered after a full miss (memory, store and outputs), so repeated
+# polls for them do not hit the disk; ids are random uuids, so a miss rarely turns into a hit.
+MISSING_TTL_SECONDS = 30.0
+MAX_MISSING = 4096
+
 
 class JobManager:
     def __init__(
         self,
-        output_dir: Path,
+        artifacts: ArtifactWriter,
         runner,
         max_concurrency: int = 8,
+        store: Optional[JobStore] = None,
+        poll_interval: float = 0.5,
+        stale_after: float = 600.0,
+        max_resident_jobs: int = 1000,
+        max_resident_bytes: int = 256 * 1024 * 1024,
+        result_ttl: float = 3600.0,
+        limiter: Optional[AdaptiveLimiter] = None,
+        max_queue: int = 200,
+        dedupe_ttl: float = 600.0,
+        dedupe_max_entries: int = 1024,
+        on_finished: Optional[Callable[[Dict[str, Any]], None]] = None,
     ) -> None:
-        self._output_dir = output_dir
+        self._artifacts = artifacts
         self._runner = runner
-        self._jobs: Dict[str, JobState] = {}
-        self._semaphore = asyncio.Semaphore(max_concurrency)
-        self._lock = asyncio.Lock()
+        self._store: JobStore = store if store is not None else MemoryJobStore()
+        self._running: Dict[str, JobState] = {}
+        self._limiter = limiter if limiter is not None else AdaptiveLimiter(initial=max_concurrency)
+        self._max_queue = max_queue
+        self._waits = WaitTracker()
+        self._rejected = 0
+        self._poll_interval = poll_interval
+        self._stale_after = timedelta(seconds=stale_after)
+        self._worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._wakeup = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task[None]] = None
+        self._watcher: Optional[asyncio.Task[None]] = None
+        self._tasks: Dict[str, asyncio.Task[None]] = {}
+        self._cancelling: Set[str] = set()
+        self._max_resident_jobs = max_resident_jobs
+        self._max_resident_bytes = max_resident_bytes
+        self._result_ttl = result_ttl
+        # Finished jobs held in memory by a live store: job_id -> (finished_at, approx bytes).
+        self._resident: "OrderedDict[str, Tuple[float, int]]" = OrderedDict()
+        self._resident_bytes = 0
+        self._evicted = 0
+        # Request key -> job_id, so repeats join a running job or reuse a recent result.
+        self._dedupe: "OrderedDict[str, str]" = OrderedDict()
+        self._dedupe_ttl = dedupe_ttl
+        self._dedupe_max_entries = dedupe_max_entries
+        self._coalesced = 0
+        self._cache_hits = 0
+        self._missing: "OrderedDict[str, float]" = OrderedDict()
+        # Called with the payload of each job that ends here, run or cancelled while queued.
+        self._on_finished = on_finished
+
+    async def list_jobs(self) -> List[JobState]:
+        return [self._running.get(state.job_id, state) for state in await self._store.list()]
+
+    async def get_job(self, job_id: str) -> Optional[JobState]:
+        state = self._running.get(job_id)
+        if state is not None:
+            return state
+        missed_at = self._missing.get(job_id)
+        if missed_at is not None:
+            if time.monotonic() - missed_at < MISSING_TTL_SECONDS:
+                return None
+            del self._missing[job_id]
+        state = await self._store.load(job_id) or await self._recover_from_outputs(job_id)
+        if state is None:
+            self._missing[job_id] = time.monotonic()
+            while len(self._missing) > MAX_MISSING:
+                self._missing.popitem(last=False)
+        return state
+
+    def get_result(self, state: JobState) -> Optional[Dict[str, Any]]:
+        """Return the job's result, reading ``result.json`` when it is not held in memory."""
+        if state.result is None and state.status == JobStage.DONE:
+            state.result = self._artifacts.load_result(state.job_id)
+        return state.result
+
+    async def wait_for_change(self, state: JobState, since: Optional[int], timeout: float) -> JobState:
+        """Long-poll helper: return once the job moves past ``since`` or ``timeout`` elapses."""
+        if since is None:
+            since = state.version
+        if state.finished:
+            return state
+        if self._is_live(state):
+            await state.wait_for_change(since, timeout)
+            return state
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            live = self._running.get(state.job_id)
+            if live is not None:
+                await live.wait_for_change(since, max(0.0, deadline - loop.time()))
+                return live
+            current = await self.get_job(state.job_id) or state
+            if current.version != since or current.finished or loop.time() >= deadline:
+                return current
+            await asyncio.sleep(min(self._poll_interval, max(0.0, deadline - loop.time())))
+
+    async def events(self, state: JobState, keepalive: float) -> AsyncIterator[Optional[JobEvent]]:
+        """Yield the job's snapshot, then its events until it finishes; ``None`` is a keepalive tick."""
+        feed = self._push_events(state, keepalive) if self._is_live(state) else self._poll_events(state, keepalive)
+        async for event in feed:
+            yield event
+
+    @property
+    def limiter(self) -> AdaptiveLimiter:
+        return self._limiter
+
+    async def queue_estimate(self, state: JobState) -> Dict[str, Any]:
+        """Queue position and expected wait for a job that has not been claimed yet."""
+        if state.status != JobStage.CREATED:
+            return {"queue_position": None, "estimated_wait_seconds": None}
+        position = await self._store.queue_position(state)
+        return {
+            "queue_position": position,
+            "estimated_wait_seconds": round(self._waits.estimate_wait(position, self._limiter.limit), 1),
+        }
 
-    def list_jobs(self) -> List[JobState]:
-        return list(self._jobs.values())
+    async def stats(self) -> Dict[str, Any]:
+        return {
+            "retention": self.retention_stats(),
+            "admission": await self.admission_stats(),
+            "dedupe": self.dedupe_stats(),
+        }
 
-    def get_job(self, job_id: str) -> Optional[JobState]:
-        return self._jobs.get(job_id)
+    def dedupe_stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._dedupe),
+            "coalesced": self._coalesced,
+            "cache_hits": self._cache_hits,
+            "ttl_seconds": self._dedupe_ttl,
+            "max_entries": self._dedupe_max_entries,
+        }
 
-    async def start_job(self, payload: Dict[str, Any]) -> JobState:
+    async def admission_stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": await self._store.count_queued(),
+            "max_queue": self._max_queue,
+            "rejected": self._rejected,
+            **self._waits.stats(),
+            **self._limiter.stats(),
+        }
+
+    def retention_stats(self) -> Dict[str, Any]:
+        self._enforce_retention()
+        return {
+            "resident_jobs": len(self._resident),
+            "resident_bytes": self._resident_bytes,
+            "running_jobs": len(self._running),
+            "evicted_jobs": self._evicted,
+            "max_resident_jobs": self._max_resident_jobs,
+            "max_resident_bytes": self._max_resident_bytes,
+            "result_ttl_seconds": self._result_ttl,
+        }
+
+    async def start_job(self, payload: Dict[str, Any], dedupe_key: Optional[str] = None) -> JobState:
+        """Queue a job; raises ``AdmissionRejected`` when the queue is already full.
+
+        With ``dedupe_key`` an identical request that is still queued or running, or
+        that finished successfully within the dedupe TTL, is returned instead.
+        """
+        if dedupe_key is not None:
+            existing = await self._find_duplicate(dedupe_key)
+            if existing is not None:
+                return existing
+        await self._admit(1)
+        state = await self._create(payload, dedupe_key)
+        self.start()
+        self._wakeup.set()
+        return state
+
+    async def start_batch(
+        self, payloads: List[Dict[str, Any]], dedupe_keys: Optional[List[Optional[str]]] = None
+    ) -> List[JobState]:
+        """Queue one job per payload, all or none; returns states in payload order.
+
+        The new jobs must fit under ``max_queue`` together, except that a batch larger
+        than the whole queue is still admitted when nothing else is queued. Items that
+        duplicate an existing job (see ``start_job``) or an earlier item reuse that job
+        and take no queue slot.
+        """
+        keys = dedupe_keys or [None] * len(payloads)
+        existing: Dict[str, JobState] = {}
+        new_keys: Set[str] = set()
+        fresh = 0
+        for key in keys:
+            if key is None:
+                fresh += 1
+            elif key not in existing and key not in new_keys:
+                duplicate = await self._find_duplicate(key)
+                if duplicate is not None:
+                    existing[key] = duplicate
+                else:
+                    new_keys.add(key)
+                    fresh += 1
+        await self._admit(fresh, allow_oversized=True)
+        states: List[JobState] = []
+        for payload, key in zip(payloads, keys):
+            if key is not None and key in existing:
+                states.append(existing[key])
+                continue
+            state = await self._create(payload, key)
+            if key is not None:
+                existing[key] = state
+            states.append(state)
+        self.start()
+        self._wakeup.set()
+        return states
+
+    async def _admit(self, count: int, allow_oversized: bool = False) -> None:
+        depth = await self._store.count_queued()
+        if depth + count <= self._max_queue or (allow_oversized and depth == 0) or count == 0:
+            return
+        self._rejected += 1
+        JOBS_REJECTED.inc()
+        raise AdmissionRejected(depth, self._waits.estimate_wait(depth, self._limiter.limit))
+
+    async def _create(self, payload: Dict[str, Any], dedupe_key: Optional[str]) -> JobState:
         job_id = str(uuid.uuid4())
-        state = JobState(job_id=job_id, payload=payload)
-        async with self._lock:
-            self._jobs[job_id] = state
-        asyncio.create_task(self._execute(job_id, payload))
+        priority = PRIORITY_CLASSES.get(payload.get("priority") or "normal", PRIORITY_CLASSES["normal"])
+        state = JobState(job_id=job_id, payload=payload, priority=priority)
+        self._enforce_retention()
+        await self._store.create(state)
+        self._missing.pop(job_id, None)
+        JOBS_ADMITTED.inc()
+        if dedupe_key is not None and self._dedupe_max_entries > 0:
+            self._dedupe[dedupe_key] = job_id
+            self._dedupe.move_to_end(dedupe_key)
+            while len(self._dedupe) > self._dedupe_max_entries:
+                self._dedupe.popitem(last=False)
+        return state
+
+    async def _find_duplicate(self, key: str) -> Optional[JobState]:
+        job_id = self._dedupe.get(key)
+        if job_id is None:
+            return None
+        state = await self.get_job(job_id)
+        if state is not None and not state.finished:
+            self._coalesced += 1
+        elif (
+            state is not None
+            and state.status == JobStage.DONE
+            and (datetime.utcnow() - state.updated_at).total_seconds() < self._dedupe_ttl
+        ):
+            self._cache_hits += 1
+        else:
+            del self._dedupe[key]
+            return None
+        self._dedupe.move_to_end(key)
+        logger.info("Reusing identical job", extra={"job_id": job_id, "status": state.status.value})
         return state
 
-    async def _execute(self, job_id: str, payload: Dict[str, Any]) -> None:
-        state = self._jobs[job_id]
+    async def cancel_job(self, job_id: str) -> Optional[JobState]:
+        """Cancel a queued or running job and free its concurrency slot right away.
+
+        Jobs running on another worker are flagged in the store; their owner cancels
+        them on its next watch tick, so the returned state may still be running.
+        """
+        state = await self.get_job(job_id)
+        if state is None or state.finished:
+            return state
+        task = self._tasks.get(job_id)
+        if task is not None:
+            self._cancelling.add(job_id)
+            task.cancel()
+            await asyncio.wait({task})
+        elif await self._store.cancel_queued(job_id):
+            self._finished(state.payload)
+        else:
+            await self._store.request_cancel(job_id)
+        return await self.get_job(job_id)
+
+    def start(self) -> None:
+        """Start this worker's dispatcher, which claims queued jobs from the store."""
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        if not self._store.live and (self._watcher is None or self._watcher.done()):
+            self._watcher = asyncio.create_task(self._watch_running())
+
+    async def stop(self) -> None:
+        tasks = [task for task in (self._dispatcher, self._watcher, *self._tasks.values()) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._dispatcher = None
+        self._watcher = None
+        await self._store.close()
+
+    async def _watch_running(self) -> None:
+        """Heartbeat this worker's running jobs in the store and cancel those flagged there.
+
+        Runs beside the dispatcher, which blocks while every slot is busy: that is
+        exactly when long jobs need their heartbeat to keep them from looking stale.
+        """
+        loop = asyncio.get_running_loop()
+        next_heartbeat = loop.time()
+        while True:
+            await asyncio.sleep(self._poll_interval)
+            if self._running and loop.time() >= next_heartbeat:
+                try:
+                    await self._store.heartbeat(self._worker_id, list(self._running))
+                except Exception:
+                    logger.exception("Failed to heartbeat running jobs")
+                next_heartbeat = loop.time() + self._stale_after.total_seconds() / 10
+            try:
+                job_ids = await self._store.cancel_requests(self._worker_id)
+            except Exception:
+                logger.exception("Failed to read cancel requests")
+                continue
+            for job_id in job_ids:
+                task = self._tasks.get(job_id)
+                if task is not None and job_id not in self._cancelling:
+                    self._cancelling.add(job_id)
+                    task.cancel()
+
+    async def _dispatch(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_stale_check = loop.time()
+        while True:
+            await self._limiter.acquire()
+            self._wakeup.clear()
+            try:
+                state = await self._store.claim(self._worker_id)
+            except Exception:
+                logger.exception("Failed to claim job")
+                state = None
+            if state is None:
+                self._limiter.release()
+                self._enforce_retention()
+                if loop.time() >= next_stale_check:
+                    try:
+                        await self._store.requeue_stale(self._stale_after, self._worker_id)
+                    except Exception:
+                        logger.exception("Failed to requeue stale jobs")
+                    next_stale_check = loop.time() + self._stale_after.total_seconds() / 10
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self._poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            waited = max(0.0, (datetime.utcnow() - state.created_at).total_seconds())
+            self._waits.record_wait(waited)
+            JOB_QUEUE_WAIT_SECONDS.observe(waited)
+            self._tasks[state.job_id] = asyncio.create_task(self._execute(state))
+
+    async def _execute(self, state: JobState) -> None:
+        job_id = state.job_id
+        self._running[job_id] = state
+        state.observe(self._store.save)
+        started = time.monotonic()
+        deadline = state.payload.get("deadline_seconds")
+        remaining = None
+        if deadline:
+            remaining = max(0.0, float(deadline) - (datetime.utcnow() - state.created_at).total_seconds())
+        scope = asyncio.timeout(remaining)
         try:
-            async with self._semaphore:
-                logger.info("Job started", extra={"job_id": job_id})
-                result = await self._runner(job_id, state, payload, self._output_dir)
-                state.set_result(result)
+            logger.info("Job started", extra={"job_id": job_id, "worker_id": self._worker_id})
+            async with scope:
+                result = await self._runner(job_id, state, dict(state.payload), self._artifacts)
+            state.set_result(result)
+        except asyncio.CancelledError:
+            if job_id not in self._cancelling:
+                raise
+            logger.info("Job cancelled", extra={"job_id": job_id})
+            state.update(JobStage.CANCELLED, message="Job cancelled")
+        except TimeoutError as exc:
+            if not scope.expired():
+                logger.exception("Job failed", extra={"job_id": job_id})
+                state.set_error(str(exc) or "Timed out")
+            else:
+                logger.info("Job deadline exceeded", extra={"job_id": job_id, "deadline": deadline})
+                state.update(JobStage.TIMEOUT, message="Job deadline exceeded")
         except Exception as exc:  # pragma: no cover - runtime safety
             logger.exception("Job failed", extra={"job_id": job_id})
             state.set_error(str(exc))
+        finally:
+            self._waits.record_run(time.monotonic() - started)
+            JOB_RUN_SECONDS.observe(time.monotonic() - started, status=state.status.value)
+            self._running.pop(job_id, None)
+            self._tasks.pop(job_id, None)
+            self._cancelling.discard(job_id)
+            self._limiter.release()
+            self._finished(state.payload)
+            if self._store.live:
+                self._track_finished(state)
+
+    def _finished(self, payload: Dict[str, Any]) -> None:
+        if self._on_finished is not None:
+            try:
+                self._on_finished(payload)
+            except Exception:  # pragma: no cover - runtime safety
+                logger.exception("Job finish hook failed")
+
+    def _track_finished(self, state: JobState) -> None:
+        size = _approx_size(state.payload) + _approx_size(state.result)
+        self._resident[state.job_id] = (time.monotonic(), size)
+        self._resident_bytes += size
+        self._enforce_retention()
+
+    def _enforce_retention(self) -> None:
+        """Evict finished jobs, oldest first, past TTL or over the job/byte budget.
+
+        Evicted DONE jobs are served again from ``result.json`` by ``get_job``.
+        """
+        expire_before = time.monotonic() - self._result_ttl
+        while self._resident:
+            job_id, (finished_at, size) = next(iter(self._resident.items()))
+            over_budget = (
+                len(self._resident) > self._max_resident_jobs or self._resident_bytes > self._max_resident_bytes
+            )
+            if not over_budget and finished_at >= expire_before:
+                break
+            self._resident.popitem(last=False)
+            self._resident_bytes -= size
+            self._store.evict(job_id)
+            self._evicted += 1
+
+    def _is_live(self, state: JobState) -> bool:
+        return self._store.live or self._running.get(state.job_id) is state
+
+    async def _push_events(
+        self, state: JobState, keepalive: float, seen: int = -1
+    ) -> AsyncIterator[Optional[JobEvent]]:
+        """Event feed for a live state; stage events up to version ``seen`` were already sent."""
+        queue = state.subscribe()
+        try:
+            if state.version > seen:
+                seen = state.version
+                yield JobEvent(event="stage", data=state.snapshot())
+            if state.finished:
+                return
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if event.event == "stage":
+                    if event.data["version"] <= seen:
+                        continue
+                    seen = event.data["version"]
+                yield event
+                if event.event == "stage" and JobStage(event.data["status"]) in TERMINAL_STAGES:
+                    return
+        finally:
+            state.unsubscribe(queue)
+
+    async def _poll_events(self, state: JobState, keepalive: float) -> AsyncIterator[Optional[JobEvent]]:
+        """Event feed for jobs not running here: stage snapshots read from the store.
+
+        A job still queued may be claimed by this worker; the feed then switches to
+        the pushed events, so token deltas reach clients that subscribed early.
+        """
+        yield JobEvent(event="stage", data=state.snapshot())
+        loop = asyncio.get_running_loop()
+        quiet_until = loop.time() + keepalive
+        while not state.finished:
+            live = self._running.get(state.job_id)
+            if live is not None:
+                async for event in self._push_events(live, keepalive, seen=state.version):
+                    yield event
+                return
+            await asyncio.sleep(self._poll_interval)
+            current = self._running.get(state.job_id) or await self.get_job(state.job_id) or state
+            if current.version != state.version:
+                state = current
+                quiet_until = loop.time() + keepalive
+                yield JobEvent(event="stage", data=state.snapshot())
+            elif loop.time() >= quiet_until:
+                quiet_until = loop.time() + keepalive
+                yield None
+
+    async def _recover_from_outputs(self, job_id: str) -> Optional[JobState]:
+        try:
+            uuid.UUID(job_id)
+        except ValueError:
+            return None  # not a job id; never turn it into a path
+        result = await self._artifacts.read_result(job_id)
+        if result is None:
+            return None
+        state = JobState(job_id=job_id, status=JobStage.DONE, payload={"title": result.get("title")})
+        state.result = result
+        return state
+
 
-    def ensure_output_dir(self, job_id: str) -> Path:
-        path = self._output_dir / job_id
-        path.mkdir(parents=True, exist_ok=True)
-        return path
-
-    @staticmethod
-    def write_text_file(path: Path, content: str) -> None:
-        tmp_path = path.with_suffix(path.suffix + ".tmp")
-        tmp_path.write_text(content, encoding="utf-8")
-        tmp_path.replace(path)
-
-    def write_result_files(self, job_id: str, final_a: str, final_b: str) -> None:
-        directory = self.ensure_output_dir(job_id)
-        self.write_text_file(directory / "final_A.md", final_a)
-        self.write_text_file(directory / "final_B.md", final_b)
-
-    def write_json(self, job_id: str, filename: str, data: Dict[str, Any]) -> None:
-        directory = self.ensure_output_dir(job_id)
-        tmp_path = directory / f"{filename}.json.tmp"
-        tmp_path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
-        tmp_path.replace(directory / f"{filename}.json")
+def _approx_size(data: Optional[Dict[str, Any]]) -> int:
+    if not data:
+        return 0
+    return len(orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS))
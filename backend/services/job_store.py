@@ -0,0 +1,341 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import sqlite3
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional, Protocol, Tuple
+
+from backend.models.job import TERMINAL_STAGES, JobStage, JobState
+
+logger = logging.getLogger(__name__)
+
+
+class JobStore(Protocol):
+    """Persistence for job state shared by every worker process.
+
+    ``live`` is True when ``load`` hands back the same objects the running job
+    mutates, so subscribers get pushed updates instead of polling the store.
+    ``save`` is a ``JobState`` observer called on the event loop, so it must not
+    block; every other method that can touch disk is a coroutine.
+    """
+
+    live: bool
+
+    async def create(self, state: JobState) -> None: ...
+
+    def save(self, state: JobState) -> None: ...
+
+    async def load(self, job_id: str) -> Optional[JobState]: ...
+
+    async def list(self) -> List[JobState]: ...
+
+    async def claim(self, worker_id: str) -> Optional[JobState]: ...
+
+    async def count_queued(self) -> int: ...
+
+    async def queue_position(self, state: JobState) -> int: ...
+
+    async def cancel_queued(self, job_id: str) -> bool: ...
+
+    async def request_cancel(self, job_id: str) -> None: ...
+
+    async def cancel_requests(self, worker_id: str) -> List[str]: ...
+
+    async def heartbeat(self, worker_id: str, job_ids: List[str]) -> None: ...
+
+    async def requeue_stale(self, older_than: timedelta, worker_id: str) -> int: ...
+
+    def evict(self, job_id: str) -> None: ...
+
+    async def close(self) -> None: ...
+
+
+class MemoryJobStore:
+    """Process-local store; only suitable for a single uvicorn worker."""
+
+    live = True
+
+    def __init__(self) -> None:
+        self._jobs: Dict[str, JobState] = {}
+        self._queues: Dict[int, Deque[str]] = {}
+
+    async def create(self, state: JobState) -> None:
+        self._jobs[state.job_id] = state
+        self._queues.setdefault(state.priority, deque()).append(state.job_id)
+
+    def save(self, state: JobState) -> None:
+        self._jobs[state.job_id] = state
+
+    async def load(self, job_id: str) -> Optional[JobState]:
+        return self._jobs.get(job_id)
+
+    async def list(self) -> List[JobState]:
+        return list(self._jobs.values())
+
+    async def claim(self, worker_id: str) -> Optional[JobState]:
+        for priority in sorted(self._queues):
+            queue = self._queues[priority]
+            while queue:
+                state = self._jobs.get(queue.popleft())
+                if state is not None and state.status == JobStage.CREATED:
+                    return state
+        return None
+
+    async def count_queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    async def queue_position(self, state: JobState) -> int:
+        ahead = sum(len(queue) for priority, queue in self._queues.items() if priority < state.priority)
+        queue = self._queues.get(state.priority, deque())
+        try:
+            return ahead + queue.index(state.job_id)
+        except ValueError:
+            return 0
+
+    async def cancel_queued(self, job_id: str) -> bool:
+        state = self._jobs.get(job_id)
+        queue = self._queues.get(state.priority) if state is not None else None
+        if state is None or queue is None or job_id not in queue:
+            return False
+        queue.remove(job_id)
+        state.update(JobStage.CANCELLED, message="Job cancelled")
+        return True
+
+    async def request_cancel(self, job_id: str) -> None:
+        """Running jobs always belong to this process; JobManager cancels their task."""
+
+    async def cancel_requests(self, worker_id: str) -> List[str]:
+        return []
+
+    async def heartbeat(self, worker_id: str, job_ids: List[str]) -> None:
+        """Jobs never outlive the process that runs them; there is nothing to keep alive."""
+
+    async def requeue_stale(self, older_than: timedelta, worker_id: str) -> int:
+        return 0
+
+    def evict(self, job_id: str) -> None:
+        self._jobs.pop(job_id, None)
+
+    async def close(self) -> None:
+        self._jobs.clear()
+        self._queues.clear()
+
+
+class SQLiteJobStore:
+    """SQLite (WAL) store that lets several local worker processes share jobs.
+
+    Every statement runs on one dedicated thread, in submission order, so a busy
+    database lock held by another worker stalls that thread and never the event
+    loop. ``save`` serializes the row on the caller's thread and queues the write
+    without waiting for it; later reads are queued behind it and see it.
+    """
+
+    live = False
+
+    def __init__(self, path: Path, busy_timeout: float = 5.0) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(
+            str(path), isolation_level=None, check_same_thread=False, timeout=busy_timeout
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-store")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                message TEXT,
+                payload TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                version INTEGER NOT NULL DEFAULT 0,
+                worker_id TEXT,
+                priority INTEGER NOT NULL DEFAULT 1,
+                cancel_requested INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_priority_queue ON jobs (status, priority, created_at)")
+
+    async def create(self, state: JobState) -> None:
+        await self._run(
+            self._conn.execute,
+            "INSERT INTO jobs (job_id, status, message, payload, created_at, updated_at, version, priority)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                state.job_id,
+                state.status.value,
+                state.message,
+                _dumps(state.payload),
+                state.created_at.isoformat(),
+                state.updated_at.isoformat(),
+                state.version,
+                state.priority,
+            ),
+        )
+
+    def save(self, state: JobState) -> None:
+        future = self._executor.submit(
+            self._conn.execute,
+            "UPDATE jobs SET status = ?, message = ?, payload = ?, updated_at = ?, version = ? WHERE job_id = ?",
+            (
+                state.status.value,
+                state.message,
+                _dumps(state.payload),
+                state.updated_at.isoformat(),
+                state.version,
+                state.job_id,
+            ),
+        )
+        future.add_done_callback(_log_save_failure)
+
+    async def load(self, job_id: str) -> Optional[JobState]:
+        row = await self._run(self._fetchone, "SELECT * FROM jobs WHERE job_id = ?", (job_id,))
+        return _from_row(row) if row else None
+
+    async def list(self) -> List[JobState]:
+        rows = await self._run(self._fetchall, "SELECT * FROM jobs ORDER BY created_at", ())
+        return [_from_row(row) for row in rows]
+
+    async def claim(self, worker_id: str) -> Optional[JobState]:
+        row = await self._run(self._claim, worker_id)
+        return _from_row(row) if row else None
+
+    async def count_queued(self) -> int:
+        row = await self._run(
+            self._fetchone,
+            "SELECT COUNT(*) FROM jobs WHERE status = ? AND worker_id IS NULL",
+            (JobStage.CREATED.value,),
+        )
+        return int(row[0])
+
+    async def queue_position(self, state: JobState) -> int:
+        row = await self._run(
+            self._fetchone,
+            "SELECT COUNT(*) FROM jobs WHERE status = ? AND worker_id IS NULL"
+            " AND (priority < ? OR (priority = ? AND created_at < ?))",
+            (JobStage.CREATED.value, state.priority, state.priority, state.created_at.isoformat()),
+        )
+        return int(row[0])
+
+    async def cancel_queued(self, job_id: str) -> bool:
+        cursor = await self._run(
+            self._conn.execute,
+            "UPDATE jobs SET status = ?, message = ?, updated_at = ?, version = version + 1"
+            " WHERE job_id = ? AND status = ? AND worker_id IS NULL",
+            (JobStage.CANCELLED.value, "Job cancelled", datetime.utcnow().isoformat(), job_id, JobStage.CREATED.value),
+        )
+        return cursor.rowcount == 1
+
+    async def request_cancel(self, job_id: str) -> None:
+        await self._run(self._conn.execute, "UPDATE jobs SET cancel_requested = 1 WHERE job_id = ?", (job_id,))
+
+    async def cancel_requests(self, worker_id: str) -> List[str]:
+        terminal = [stage.value for stage in TERMINAL_STAGES]
+        rows = await self._run(
+            self._fetchall,
+            "SELECT job_id FROM jobs WHERE worker_id = ? AND cancel_requested = 1"
+            f" AND status NOT IN ({', '.join('?' * len(terminal))})",
+            (worker_id, *terminal),
+        )
+        return [row["job_id"] for row in rows]
+
+    async def heartbeat(self, worker_id: str, job_ids: List[str]) -> None:
+        """Mark ``job_ids`` as still running on ``worker_id`` by refreshing ``updated_at``."""
+        if not job_ids:
+            return
+        await self._run(
+            self._conn.execute,
+            f"UPDATE jobs SET updated_at = ? WHERE worker_id = ? AND job_id IN ({', '.join('?' * len(job_ids))})",
+            (datetime.utcnow().isoformat(), worker_id, *job_ids),
+        )
+
+    async def requeue_stale(self, older_than: timedelta, worker_id: str) -> int:
+        """Hand jobs whose worker stopped heartbeating them back to the queue.
+
+        Jobs owned by ``worker_id`` (the caller) are never requeued: the caller is
+        alive, so they are running, however long their current stage takes.
+        """
+        cutoff = (datetime.utcnow() - older_than).isoformat()
+        terminal = [stage.value for stage in TERMINAL_STAGES]
+        cursor = await self._run(
+            self._conn.execute,
+            "UPDATE jobs SET status = ?, worker_id = NULL, version = version + 1"
+            " WHERE worker_id IS NOT NULL AND worker_id != ? AND updated_at < ?"
+            f" AND status NOT IN ({', '.join('?' * len(terminal))})",
+            (JobStage.CREATED.value, worker_id, cutoff, *terminal),
+        )
+        if cursor.rowcount:
+            logger.warning("Requeued stale jobs", extra={"count": cursor.rowcount})
+        return cursor.rowcount
+
+    def evict(self, job_id: str) -> None:
+        """Rows live on disk; nothing is held in memory to release."""
+
+    async def close(self) -> None:
+        """Finish queued writes, then close the connection."""
+        await asyncio.to_thread(self._executor.shutdown, wait=True)
+        self._conn.close()
+
+    async def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _fetchone(self, sql: str, params: Tuple[Any, ...]) -> Optional[sqlite3.Row]:
+        return self._conn.execute(sql, params).fetchone()
+
+    def _fetchall(self, sql: str, params: Tuple[Any, ...]) -> List[sqlite3.Row]:
+        return self._conn.execute(sql, params).fetchall()
+
+    def _claim(self, worker_id: str) -> Optional[sqlite3.Row]:
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._conn.execute(
+                "SELECT * FROM jobs WHERE status = ? AND worker_id IS NULL ORDER BY priority, created_at LIMIT 1",
+                (JobStage.CREATED.value,),
+            ).fetchone()
+            if row is not None:
+                self._conn.execute("UPDATE jobs SET worker_id = ? WHERE job_id = ?", (worker_id, row["job_id"]))
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        return row
+
+
+def create_job_store(backend: str, path: Path) -> JobStore:
+    if backend == "memory":
+        return MemoryJobStore()
+    if backend == "sqlite":
+        return SQLiteJobStore(path)
+    raise RuntimeError(f"Unknown job store backend: {backend}")
+
+
+def _log_save_failure(future: "Future[Any]") -> None:
+    exc = future.exception()
+    if exc is not None:
+        logger.error("Failed to save job state", exc_info=exc)
+
+
+def _dumps(data: Dict[str, Any]) -> str:
+    return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def _from_row(row: sqlite3.Row) -> JobState:
+    return JobState(
+        job_id=row["job_id"],
+        status=JobStage(row["status"]),
+        message=row["message"],
+        created_at=datetime.fromisoformat(row["created_at"]),
+        updated_at=datetime.fromisoformat(row["updated_at"]),
+        payload=json.loads(row["payload"]),
+        version=row["version"],
+        priority=row["priority"],
+    )
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from backend.services.metrics import LLM_QUEUE_WAIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Later stages first: a job's P4 call finishes it, a P2 call starts new work.
+STAGE_RANKS: Dict[str, int] = {"P2": 0, "P2-P4": 0, "P3": 1, "P4": 2}
+
+
+@dataclass(order=True)
+class _Waiter:
+    sort_key: Tuple[int, float, int]
+    future: "asyncio.Future[None]" = field(compare=False)
+    priority: int = field(compare=False)
+    tenant: str = field(compare=False)
+
+
+class LLMScheduler:
+    """Global admission for LLM stage calls under one concurrency budget.
+
+    Waiting calls are ordered by the job's priority class first (``high``/``normal``/
+    ``low``, batches default to ``low``), strictly. Within a class, tenants (authors)
+    take turns by start-time fair queuing: the tenant that has been granted the fewest
+    calls goes next, and a tenant that was idle re-enters at the current minimum rather
+    than with banked credit. Within a tenant, later stages and then older jobs go
+    first, so in-flight jobs finish before new ones start. A tenant's usage is dropped
+    once it has nothing queued or in flight; it comes back at the current virtual time.
+    """
+
+    def __init__(self, max_concurrency: int = 32) -> None:
+        self._limit = max(1, max_concurrency)
+        self._in_flight = 0
+        # priority class -> tenant -> heap of waiters
+        self._queues: Dict[int, Dict[str, List[_Waiter]]] = {}
+        self._usage: Dict[str, float] = {}
+        self._active: Dict[str, int] = {}  # tenant -> calls in flight
+        # Usage at which the latest call was granted; new and returning tenants start here.
+        self._floor = 0.0
+        self._seq = itertools.count()
+        self._granted = 0
+        self._waits: Dict[str, List[float]] = {}  # stage -> [count, total seconds, max seconds]
+
+    @asynccontextmanager
+    async def slot(
+        self, stage: str, created_at: datetime, priority: int = 1, tenant: str = ""
+    ) -> AsyncIterator[float]:
+        """Hold one call slot; yields the seconds spent waiting for it."""
+        waited = await self._acquire(stage, created_at, priority, tenant)
+        try:
+            yield waited
+        finally:
+            self._release(tenant)
+
+    def stats(self) -> Dict[str, Any]:
+        waiting: Dict[str, int] = {}
+        for priority, tenants in self._queues.items():
+            waiting[str(priority)] = sum(len(queue) for queue in tenants.values())
+        return {
+            "max_concurrency": self._limit,
+            "in_flight": self._in_flight,
+            "granted": self._granted,
+            "tenants": len(self._usage),
+            "waiting_by_priority": waiting,
+            "queue_wait_by_stage": {
+                stage: {
+                    "count": int(count),
+                    "mean_seconds": round(total / count, 4) if count else 0.0,
+                    "max_seconds": round(peak, 4),
+                }
+                for stage, (count, total, peak) in sorted(self._waits.items())
+            },
+        }
+
+    async def _acquire(self, stage: str, created_at: datetime, priority: int, tenant: str) -> float:
+        started = time.perf_counter()
+        if self._in_flight < self._limit and not any(self._queues.values()):
+            self._grant(tenant)
+        else:
+            future: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+            sort_key = (-STAGE_RANKS.get(stage, 0), created_at.timestamp(), next(self._seq))
+            waiter = _Waiter(sort_key, future, priority, tenant)
+            self._enqueue(waiter)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    self._release(tenant)  # granted just as the caller was cancelled
+                else:
+                    self._discard(waiter)
+                    self._prune(tenant)
+                raise
+        waited = time.perf_counter() - started
+        record = self._waits.setdefault(stage, [0, 0.0, 0.0])
+        record[0] += 1
+        record[1] += waited
+        record[2] = max(record[2], waited)
+        LLM_QUEUE_WAIT_SECONDS.observe(waited, stage=stage)
+        return waited
+
+    def _enqueue(self, waiter: _Waiter) -> None:
+        tenants = self._queues.setdefault(waiter.priority, {})
+        if waiter.tenant not in tenants:
+            queued = [self._usage.get(name, 0.0) for name in tenants]
+            start = min(queued) if queued else self._floor
+            self._usage[waiter.tenant] = max(self._usage.get(waiter.tenant, 0.0), start)
+        heapq.heappush(tenants.setdefault(waiter.tenant, []), waiter)
+
+    def _discard(self, waiter: _Waiter) -> None:
+        tenants = self._queues.get(waiter.priority, {})
+        queue = tenants.get(waiter.tenant)
+        if queue is None or waiter not in queue:
+            return
+        queue.remove(waiter)
+        heapq.heapify(queue)
+        if not queue:
+            del tenants[waiter.tenant]
+        if not tenants:
+            self._queues.pop(waiter.priority, None)
+
+    def _grant(self, tenant: str) -> None:
+        self._in_flight += 1
+        self._granted += 1
+        self._active[tenant] = self._active.get(tenant, 0) + 1
+        start = max(self._usage.get(tenant, 0.0), self._floor)
+        self._floor = start
+        self._usage[tenant] = start + 1.0
+
+    def _release(self, tenant: str) -> None:
+        self._in_flight -= 1
+        active = self._active.get(tenant, 0) - 1
+        if active > 0:
+            self._active[tenant] = active
+        else:
+            self._active.pop(tenant, None)
+            self._prune(tenant)
+        while self._in_flight < self._limit:
+            waiter = self._next()
+            if waiter is None:
+                return
+            if waiter.future.done():
+                # Cancelled while queued; its task has not run ``_discard`` yet.
+                self._prune(waiter.tenant)
+                continue
+            waiter.future.set_result(None)
+            self._grant(waiter.tenant)
+
+    def _prune(self, tenant: str) -> None:
+        if tenant in self._active or any(tenant in tenants for tenants in self._queues.values()):
+            return
+        self._usage.pop(tenant, None)
+
+    def _next(self) -> Optional[_Waiter]:
+        for priority in sorted(self._queues):
+            tenants = self._queues[priority]
+            tenant = min(tenants, key=lambda name: (self._usage.get(name, 0.0), tenants[name][0].sort_key))
+            waiter = heapq.heappop(tenants[tenant])
+            if not tenants[tenant]:
+                del tenants[tenant]
+            if not tenants:
+                del self._queues[priority]
+            return waiter
+        return None
@@ -0,0 +1,279 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import shutil
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from qdrant_client.http.models import Record, ScoredPoint
+
+from backend.services.qdrant_client import COLLECTION_RULES, CollectionRule, QdrantService, RetrievalResult
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_DISTANCES = ("Cosine", "Dot", "Euclid")
+_KEEP_GENERATIONS = 2
+
+
+@dataclass
+class _Collection:
+    distance: str
+    vectors: np.ndarray
+    squared_norms: Optional[np.ndarray]
+    ids: List[Any]
+    payloads: List[Dict[str, Any]]
+
+
+class LocalIndexService:
+    """Serves the ``COLLECTION_RULES`` searches from a local snapshot instead of Qdrant.
+
+    A snapshot is a generation directory holding one ``<collection>.npy`` matrix
+    (memory-mapped, so worker processes share the page cache) and one
+    ``<collection>.json`` with point ids and payloads per collection; ``CURRENT``
+    names the live generation. Snapshots older than ``refresh_seconds`` are rebuilt
+    from Qdrant in the background. A collection missing from the snapshot falls back
+    to the remote search, so a stale or partial snapshot never fails a job.
+    """
+
+    def __init__(
+        self,
+        remote: QdrantService,
+        directory: Path,
+        dtype: str = "float16",
+        refresh_seconds: float = 3600.0,
+    ) -> None:
+        self._remote = remote
+        self._directory = directory
+        self._dtype = np.dtype(dtype)
+        self._refresh_seconds = refresh_seconds
+        self._collections: Dict[str, _Collection] = {}
+        self._generation: Optional[str] = None
+        self._created_at: Optional[datetime] = None
+        self._refresher: Optional[asyncio.Task[None]] = None
+        self._lock = asyncio.Lock()
+        self._local_searches = 0
+        self._remote_searches = 0
+        self._refresh_failures = 0
+
+    async def start(self) -> None:
+        self._reload()
+        await self._refresh_if_stale()
+        if self._refresh_seconds > 0 and self._refresher is None:
+            self._refresher = asyncio.create_task(self._refresh_loop())
+
+    async def close(self) -> None:
+        if self._refresher is not None:
+            self._refresher.cancel()
+            await asyncio.gather(self._refresher, return_exceptions=True)
+            self._refresher = None
+        await self._remote.close()
+
+    async def search(
+        self,
+        collection: str,
+        vector: List[float],
+        limit: int,
+        payload_fields: Sequence[str] = (),
+    ) -> RetrievalResult:
+        index = self._collections.get(collection)
+        if index is None:
+            self._remote_searches += 1
+            return await self._remote.search(collection, vector, limit, payload_fields)
+        self._local_searches += 1
+        started = time.perf_counter()
+        points = _top_k(index, vector, limit, payload_fields)
+        return RetrievalResult(collection=collection, points=points, latency_ms=(time.perf_counter() - started) * 1000.0)
+
+    async def retrieve_all(self, vector: List[float]) -> Dict[str, RetrievalResult]:
+        async def _one(collection: str, rule: CollectionRule) -> RetrievalResult:
+            return await self.search(collection, vector, rule.limit, rule.payload_fields)
+
+        results = await asyncio.gather(*(_one(collection, rule) for collection, rule in COLLECTION_RULES.items()))
+        return {result.collection: result for result in results}
+
+    async def search_batch(
+        self,
+        collection: str,
+        vectors: Sequence[List[float]],
+        limit: int,
+        payload_fields: Sequence[str] = (),
+    ) -> List[RetrievalResult]:
+        index = self._collections.get(collection)
+        if index is None:
+            self._remote_searches += len(vectors)
+            return await self._remote.search_batch(collection, vectors, limit, payload_fields)
+        self._local_searches += len(vectors)
+        results: List[RetrievalResult] = []
+        for vector in vectors:
+            started = time.perf_counter()
+            points = _top_k(index, vector, limit, payload_fields)
+            latency_ms = (time.perf_counter() - started) * 1000.0
+            results.append(RetrievalResult(collection=collection, points=points, latency_ms=latency_ms))
+        return results
+
+    async def retrieve_batch(self, vectors: Sequence[List[float]]) -> List[Dict[str, RetrievalResult]]:
+        async def _one(collection: str, rule: CollectionRule) -> List[RetrievalResult]:
+            return await self.search_batch(collection, vectors, rule.limit, rule.payload_fields)
+
+        per_collection = await asyncio.gather(
+            *(_one(collection, rule) for collection, rule in COLLECTION_RULES.items())
+        )
+        return [{results[index].collection: results[index] for results in per_collection} for index in range(len(vectors))]
+
+    async def refresh(self) -> None:
+        """Export every collection from Qdrant into a new generation and switch to it."""
+        async with self._lock:
+            exported: Dict[str, Any] = {}
+            for collection in COLLECTION_RULES:
+                try:
+                    exported[collection] = await self._remote.export_collection(collection)
+                except Exception as exc:
+                    logger.warning(
+                        "Could not export collection for the local index",
+                        extra={"collection": collection, "error": str(exc)},
+                    )
+            if not exported:
+                raise RuntimeError("No collection could be exported from Qdrant")
+            generation = await asyncio.to_thread(self._write_generation, exported)
+            self._load_current()
+            logger.info("Local index refreshed", extra={"generation": generation, "collections": list(exported)})
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "local",
+            "generation": self._generation,
+            "created_at": self._created_at.isoformat() if self._created_at else None,
+            "collections": {name: len(index.ids) for name, index in self._collections.items()},
+            "local_searches": self._local_searches,
+            "remote_searches": self._remote_searches,
+            "refresh_failures": self._refresh_failures,
+        }
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(max(1.0, min(self._refresh_seconds, 60.0)))
+            # Another worker may have written a newer generation; pick it up before deciding to export.
+            self._reload()
+            await self._refresh_if_stale()
+
+    def _reload(self) -> None:
+        """Load the CURRENT generation, keeping the loaded one if it cannot be read."""
+        try:
+            self._load_current()
+        except Exception as exc:
+            self._refresh_failures += 1
+            logger.warning("Local index generation unreadable", extra={"error": str(exc)})
+
+    async def _refresh_if_stale(self) -> None:
+        age = (datetime.utcnow() - self._created_at).total_seconds() if self._created_at else None
+        if age is not None and (self._refresh_seconds <= 0 or age < self._refresh_seconds):
+            return
+        try:
+            await self.refresh()
+        except Exception as exc:
+            self._refresh_failures += 1
+            logger.warning("Local index refresh failed", extra={"error": str(exc)})
+
+    def _load_current(self) -> None:
+        current = self._directory / "CURRENT"
+        if not current.exists():
+            return
+        generation = current.read_text(encoding="utf-8").strip()
+        if generation == self._generation:
+            return
+        directory = self._directory / generation
+        manifest = json.loads((directory / "manifest.json").read_text(encoding="utf-8"))
+        collections: Dict[str, _Collection] = {}
+        for name, meta in manifest["collections"].items():
+            vectors = np.load(directory / f"{name}.npy", mmap_mode="r")
+            points = json.loads((directory / f"{name}.json").read_text(encoding="utf-8"))
+            squared_norms = None
+            if meta["distance"] == "Euclid":
+                squared_norms = np.einsum("ij,ij->i", vectors, vectors, dtype=np.float32)
+            collections[name] = _Collection(
+                distance=meta["distance"],
+                vectors=vectors,
+                squared_norms=squared_norms,
+                ids=[point["id"] for point in points],
+                payloads=[point["payload"] for point in points],
+            )
+        self._collections = collections
+        self._generation = generation
+        self._created_at = datetime.fromisoformat(manifest["created_at"])
+
+    def _write_generation(self, exported: Dict[str, Any]) -> str:
+        created_at = datetime.utcnow()
+        generation = created_at.strftime("%Y%m%dT%H%M%S%f")
+        directory = self._directory / generation
+        directory.mkdir(parents=True, exist_ok=True)
+        manifest: Dict[str, Any] = {"created_at": created_at.isoformat(), "dtype": self._dtype.name, "collections": {}}
+        for name, (distance, records) in exported.items():
+            if distance not in SUPPORTED_DISTANCES:
+                logger.warning("Unsupported distance, collection stays remote", extra={"collection": name})
+                continue
+            matrix = _matrix(records, distance, self._dtype)
+            np.save(directory / f"{name}.npy", matrix)
+            points = [{"id": record.id, "payload": record.payload or {}} for record in records]
+            (directory / f"{name}.json").write_text(json.dumps(points, ensure_ascii=False), encoding="utf-8")
+            manifest["collections"][name] = {"distance": distance, "count": len(records), "dimension": matrix.shape[1]}
+        (directory / "manifest.json").write_text(json.dumps(manifest), encoding="utf-8")
+        tmp_current = self._directory / "CURRENT.tmp"
+        tmp_current.write_text(generation, encoding="utf-8")
+        tmp_current.replace(self._directory / "CURRENT")
+        # Mapped files stay readable after unlink, so older generations can go right away.
+        generations = sorted(path for path in self._directory.iterdir() if path.is_dir())
+        for stale in generations[:-_KEEP_GENERATIONS]:
+            shutil.rmtree(stale, ignore_errors=True)
+        return generation
+
+
+def _matrix(records: List[Record], distance: str, dtype: np.dtype) -> np.ndarray:
+    matrix = np.asarray([record.vector for record in records], dtype=np.float32)
+    if matrix.ndim != 2:
+        matrix = matrix.reshape(len(records), -1)
+    if distance == "Cosine":
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms > 0, norms, 1.0)
+    return np.ascontiguousarray(matrix, dtype=dtype)
+
+
+def _top_k(index: _Collection, vector: Sequence[float], limit: int, payload_fields: Sequence[str]) -> List[ScoredPoint]:
+    count = len(index.ids)
+    if count == 0 or limit <= 0:
+        return []
+    query = np.asarray(vector, dtype=np.float32)
+    if index.distance == "Cosine":
+        norm = float(np.linalg.norm(query))
+        query = query / norm if norm > 0 else query
+    dots = np.matmul(index.vectors, query, dtype=np.float32)
+    if index.distance == "Euclid":
+        # Qdrant reports the distance itself and ranks ascending.
+        scores = np.sqrt(np.maximum(index.squared_norms - 2.0 * dots + float(query @ query), 0.0))
+        ranking = scores
+    else:
+        scores = dots
+        ranking = -scores
+    k = min(limit, count)
+    top = np.argpartition(ranking, k - 1)[:k] if k < count else np.arange(count)
+    top = top[np.argsort(ranking[top])]
+    return [
+        ScoredPoint(
+            id=index.ids[slot],
+            version=0,
+            score=float(scores[slot]),
+            payload=_select(index.payloads[slot], payload_fields),
+        )
+        for slot in top
+    ]
+
+
+def _select(payload: Dict[str, Any], fields: Sequence[str]) -> Dict[str, Any]:
+    if not fields:
+        return dict(payload)
+    return {field: payload[field] for field in fields if field in payload}
@@ -3,64 +3,243 @@ from __future__ import annotations
 import asyncio
 import json
 import logging
-from pathlib import Path
-from typing import Any, Dict, List
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 
 from backend.models.job import JobStage, JobState
-from backend.services.ds_client import DSClient
-from backend.services.embedding import EmbeddingService
-from backend.services.qdrant_client import QdrantService
+from backend.services.artifacts import ArtifactWriter
+from backend.services.context import ContextAssembler, estimate_tokens
+from backend.services.ds_client import DSClient, choice_deltas
+from backend.services.embedding_batcher import EmbeddingBatcher
+from backend.services.llm_scheduler import LLMScheduler
+from backend.services.metrics import LLM_PROMPT_TOKENS, PIPELINE_STAGE_SECONDS, RETRIEVAL_SECONDS
+from backend.services.qdrant_client import QdrantService, RetrievalResult
+from backend.services.request_cache import request_key
+from backend.services.semantic_cache import SemanticCache
 
 logger = logging.getLogger(__name__)
 
+PIPELINE_MODES = ("staged", "fused")
+MAX_VARIANTS = 8
+# Bump whenever a stage prompt changes so cached results from older prompts are not reused.
+PROMPT_VERSION = 2
+# Batch items whose embedding and retrieval were computed up front, waiting for their job.
+# Entries a job of ours will not consume (it ran on another worker) expire after the TTL;
+# a job still queued by then embeds and retrieves on its own.
+MAX_PREFETCHED = 500
+PREFETCH_TTL_SECONDS = 300.0
+
+_Prefetched = Tuple[float, List[float], Dict[str, RetrievalResult]]
+
 
 class PipelineRunner:
     def __init__(
         self,
         ds_client: DSClient,
-        embedding_service: EmbeddingService,
+        embedder: EmbeddingBatcher,
         qdrant_service: QdrantService,
+        max_choices: int = 4,
+        semantic_cache: Optional[SemanticCache] = None,
+        scheduler: Optional[LLMScheduler] = None,
+        context: Optional[ContextAssembler] = None,
+        max_prefetched: int = MAX_PREFETCHED,
     ) -> None:
         self._ds_client = ds_client
-        self._embedding = embedding_service
+        self._embedder = embedder
         self._qdrant = qdrant_service
+        self._max_choices = max(1, max_choices)
+        self._semantic_cache = semantic_cache
+        self._scheduler = scheduler or LLMScheduler()
+        self._context = context or ContextAssembler()
+        # Per-job timing breakdown while the job runs, keyed by job_id.
+        self._timings: Dict[str, Dict[str, Any]] = {}
+        self._prefetched: "OrderedDict[Tuple[str, int], _Prefetched]" = OrderedDict()
+        self._max_prefetched = max(0, max_prefetched)
+
+    def request_key(self, payload: Dict[str, Any]) -> str:
+        """Key identifying requests that would produce interchangeable results.
+
+        Priority, deadline and author are part of it: a coalesced request runs with the
+        first request's settings, its LLM calls are charged to the first request's
+        author (the scheduler's tenant), and cancelling either cancels the shared job.
+        """
+        deadline = payload.get("deadline_seconds")
+        return request_key(
+            "pipeline",
+            PROMPT_VERSION,
+            self._ds_client.model,
+            payload["title"],
+            payload.get("description") or "",
+            payload.get("mode") or "staged",
+            int(payload.get("variants") or 2),
+            self._context.budgets,
+            payload.get("priority") or "normal",
+            float(deadline) if deadline else None,
+            payload.get("author") or "",
+        )
+
+    async def prefetch_batch(self, batch_id: str, payloads: List[Dict[str, Any]]) -> None:
+        """Embed and retrieve every item of a batch in one batched pass each.
+
+        Jobs pick their share up by ``(batch_id, batch_index)``; a job that runs on
+        another worker, or whose entry was evicted, embeds and retrieves on its own.
+        """
+        vectors = await self._embedder.embed(
+            [_embedding_text(payload["title"], payload.get("description") or "") for payload in payloads]
+        )
+        with PIPELINE_STAGE_SECONDS.time(stage="batch_retrieval"):
+            retrievals = await self._qdrant.retrieve_batch(vectors)
+        now = time.monotonic()
+        for index, (vector, retrieval) in enumerate(zip(vectors, retrievals)):
+            self._prefetched[(batch_id, index)] = (now, vector, retrieval)
+        self._expire_prefetched(now)
+
+    def discard_prefetched(self, batch_id: str, indices: Optional[Sequence[int]] = None) -> None:
+        """Drop prefetched items no job of ours will consume (all of the batch by default)."""
+        for key in [key for key in self._prefetched if key[0] == batch_id and (indices is None or key[1] in indices)]:
+            del self._prefetched[key]
+
+    def release(self, payload: Dict[str, Any]) -> None:
+        """Drop what was prefetched for a job that has finished, whether or not it ran."""
+        self._prefetched.pop((payload.get("batch_id"), payload.get("batch_index")), None)
+
+    def _take_prefetched(self, payload: Dict[str, Any]) -> Optional[Tuple[List[float], Dict[str, RetrievalResult]]]:
+        self._expire_prefetched(time.monotonic())
+        entry = self._prefetched.pop((payload.get("batch_id"), payload.get("batch_index")), None)
+        return (entry[1], entry[2]) if entry is not None else None
+
+    def _expire_prefetched(self, now: float) -> None:
+        expire_before = now - PREFETCH_TTL_SECONDS
+        while self._prefetched:
+            prefetched_at = next(iter(self._prefetched.values()))[0]
+            if len(self._prefetched) <= self._max_prefetched and prefetched_at >= expire_before:
+                break
+            self._prefetched.popitem(last=False)
 
     async def __call__(
         self,
         job_id: str,
         state: JobState,
         payload: Dict[str, Any],
-        output_dir: Path,
+        artifacts: ArtifactWriter,
+    ) -> Dict[str, Any]:
+        started = time.perf_counter()
+        timings: Dict[str, Any] = {
+            "queue_wait_seconds": round(max(0.0, (datetime.utcnow() - state.created_at).total_seconds()), 4),
+            "steps": {},
+            "llm_calls": [],
+        }
+        self._timings[job_id] = timings
+        try:
+            result = await self._run(job_id, state, payload, artifacts, timings)
+        finally:
+            self._timings.pop(job_id, None)
+            timings["run_seconds"] = round(time.perf_counter() - started, 4)
+            state.payload["timings"] = timings
+        return result
+
+    async def _run(
+        self,
+        job_id: str,
+        state: JobState,
+        payload: Dict[str, Any],
+        artifacts: ArtifactWriter,
+        timings: Dict[str, Any],
     ) -> Dict[str, Any]:
         title: str = payload["title"]
-        description: str = payload.get("description", "")
-        texts_for_embedding = [title, description]
+        description: str = payload.get("description") or ""
+        mode: str = payload.get("mode") or "staged"
+        if mode not in PIPELINE_MODES:
+            raise ValueError(f"Unknown pipeline mode: {mode}")
+        variants = int(payload.get("variants") or 2)
+        if not 1 <= variants <= MAX_VARIANTS:
+            raise ValueError(f"variants must be between 1 and {MAX_VARIANTS}")
         state.update(JobStage.RETRIEVING, payload={"title": title})
-        embedding_vector = self._embedding.embed(["\n".join(texts_for_embedding)])[0]
+        retrievals: Optional[Dict[str, RetrievalResult]] = None
+        prefetched = self._take_prefetched(payload)
+        if prefetched is not None:
+            embedding_vector, retrievals = prefetched
+            timings["prefetched"] = True
+        else:
+            with _step(timings, "embedding"):
+                embedding_vector = await self._embedder.embed_one(_embedding_text(title, description))
+        budgets = ",".join(f"{name}={tokens}" for name, tokens in sorted(self._context.budgets.items()))
+        cache_scope = f"{mode}:{variants}:{PROMPT_VERSION}:{self._ds_client.model}:{budgets}"
+        if self._semantic_cache is not None and not payload.get("no_cache"):
+            with _step(timings, "semantic_cache"):
+                cached = await self._reuse_similar(
+                    job_id, state, title, mode, embedding_vector, cache_scope, artifacts, timings
+                )
+            if cached is not None:
+                return cached
 
-        retrievals = await self._qdrant.retrieve_all(embedding_vector)
+        if retrievals is None:
+            with _step(timings, "retrieval"):
+                retrievals = await self._qdrant.retrieve_all(embedding_vector)
+            for collection, retrieval in retrievals.items():
+                RETRIEVAL_SECONDS.observe(retrieval.latency_ms / 1000.0, collection=collection)
         state.update(
             JobStage.TEMPLATE,
-            payload={"retrievals": {k: len(v.points) for k, v in retrievals.items()}},
+            payload={
+                "retrievals": {k: len(v.points) for k, v in retrievals.items()},
+                "retrieval_latency_ms": {k: round(v.latency_ms, 2) for k, v in retrievals.items()},
+            },
         )
-        template_payloads = _collect_payloads(retrievals, "muban")
-        tone_payloads = _collect_payloads(retrievals, "yuqi")
-        evidence_payloads = _collect_payloads(retrievals, "cross") + _collect_payloads(retrievals, "daojia")
+        with _step(timings, "context"):
+            templates = self._context.pick("template", _collect_payloads(retrievals, "muban"), variants)
+            tones = self._context.pick("tone", _collect_payloads(retrievals, "yuqi"), variants)
+            evidences = self._context.pick(
+                "evidence", _collect_payloads(retrievals, "cross") + _collect_payloads(retrievals, "daojia"), variants
+            )
 
-        drafts = await self._run_parallel_flows(title, template_payloads, tone_payloads, evidence_payloads, state)
+        with _step(timings, "llm"):
+            drafts = await self._run_parallel_flows(title, templates, tones, evidences, state, mode)
         state.update(JobStage.WRITING)
 
-        job_directory = output_dir / job_id
-        job_directory.mkdir(parents=True, exist_ok=True)
-        final_a = drafts["A"]["final"]
-        final_b = drafts["B"]["final"]
-        _write_text(job_directory / "final_A.md", final_a)
-        _write_text(job_directory / "final_B.md", final_b)
-        _write_text(
-            job_directory / "result.json",
-            json.dumps({"job_id": job_id, "title": title, "drafts": drafts}, ensure_ascii=False, indent=2),
-        )
-        return {"job_id": job_id, "title": title, "drafts": drafts}
+        result = {"job_id": job_id, "title": title, "mode": mode, "drafts": drafts, "timings": timings}
+        with _step(timings, "write_outputs"):
+            await artifacts.write_job(job_id, drafts, result)
+        if self._semantic_cache is not None:
+            self._semantic_cache.add(job_id, embedding_vector, cache_scope)
+        return result
+
+    async def _reuse_similar(
+        self,
+        job_id: str,
+        state: JobState,
+        title: str,
+        mode: str,
+        vector: List[float],
+        scope: str,
+        artifacts: ArtifactWriter,
+        timings: Dict[str, Any],
+    ) -> Optional[Dict[str, Any]]:
+        """Serve the drafts of a finished job whose request embedding is close enough."""
+        match = self._semantic_cache.lookup(vector, scope)
+        if match is None:
+            return None
+        source_job_id, similarity = match
+        source = await artifacts.read_result(source_job_id)
+        if source is None:
+            return None
+        drafts = source["drafts"]
+        semantic_cache = {"source_job_id": source_job_id, "similarity": round(similarity, 4)}
+        logger.info("Serving drafts from semantic cache", extra={"job_id": job_id, **semantic_cache})
+        state.update(JobStage.WRITING, message="Served from semantic cache", payload={"semantic_cache": semantic_cache})
+        result = {
+            "job_id": job_id,
+            "title": title,
+            "mode": mode,
+            "drafts": drafts,
+            "semantic_cache": semantic_cache,
+            "timings": timings,
+        }
+        await artifacts.write_job(job_id, drafts, result)
+        return result
 
     async def _run_parallel_flows(
         self,
@@ -69,78 +248,198 @@ class PipelineRunner:
         tones: List[Dict[str, Any]],
         evidences: List[Dict[str, Any]],
         state: JobState,
+        mode: str = "staged",
     ) -> Dict[str, Any]:
-        flows = []
-        for index in range(2):
-            template = templates[index % len(templates)] if templates else {"content": ""}
-            tone = tones[index % len(tones)] if tones else {"guideline": ""}
-            evidence = evidences[index % len(evidences)] if evidences else {"content": ""}
-            flows.append(
-                self._run_single_flow(
-                    flow_name="A" if index == 0 else "B",
-                    title=title,
-                    template=template,
-                    tone=tone,
-                    evidence=evidence,
-                    state=state,
-                )
-            )
-        flow_results = await asyncio.gather(*flows)
-        return {result["flow_name"]: result for result in flow_results}
+        """Run one flow per entry of the assembled ``templates``/``tones``/``evidences``."""
+        flows = [
+            FlowInputs(flow_name=chr(ord("A") + index), template=template, tone=tone, evidence=evidence)
+            for index, (template, tone, evidence) in enumerate(zip(templates, tones, evidences))
+        ]
+        # Flows whose next prompt is identical share one completion request with n choices.
+        if mode == "fused":
+            groups = _group_flows(flows, lambda flow: _build_fused_prompt(title, *flow.prompt_inputs()))
+            runs = [self._run_fused_group(title, group, state) for group in groups]
+        else:
+            groups = _group_flows(flows, lambda flow: _build_template_prompt(title, flow.template.get("content", "")))
+            runs = [self._run_staged_group(title, group, state) for group in groups]
+        group_results = await asyncio.gather(*runs)
+        by_name = {result["flow_name"]: result for results in group_results for result in results}
+        return {flow.flow_name: by_name[flow.flow_name] for flow in flows}
 
-    async def _run_single_flow(
-        self,
-        flow_name: str,
-        title: str,
-        template: Dict[str, Any],
-        tone: Dict[str, Any],
-        evidence: Dict[str, Any],
-        state: JobState,
-    ) -> Dict[str, Any]:
-        state.update(JobStage.TEMPLATE, payload={"flow": flow_name})
-        draft = await self._call_stage(
+    async def _run_staged_group(self, title: str, group: List[FlowInputs], state: JobState) -> List[Dict[str, Any]]:
+        names = [flow.flow_name for flow in group]
+        state.update(JobStage.TEMPLATE, payload={"flow": "+".join(names)})
+        drafts = await self._call_stage(
+            state=state,
+            flow_names=names,
             stage="P2",
             system_prompt="你是中文资深文案，依据模板句式快速产出段落。",
-            user_prompt=_build_template_prompt(title, template["content"]),
+            user_prompt=_build_template_prompt(title, group[0].template.get("content", "")),
+        )
+        return list(
+            await asyncio.gather(
+                *(self._finish_staged_flow(title, flow, draft, state) for flow, draft in zip(group, drafts))
+            )
         )
+
+    async def _finish_staged_flow(self, title: str, flow: FlowInputs, draft: str, state: JobState) -> Dict[str, Any]:
+        flow_name = flow.flow_name
         state.update(JobStage.TONE, payload={"flow": flow_name})
-        middle = await self._call_stage(
+        (middle,) = await self._call_stage(
+            state=state,
+            flow_names=[flow_name],
             stage="P3",
             system_prompt="你是文案风格调校器，严格套入给定语气要素。",
-            user_prompt=_build_tone_prompt(title, tone.get("guideline", ""), draft),
+            user_prompt=_build_tone_prompt(title, flow.tone.get("guideline", ""), draft),
         )
         state.update(JobStage.EVIDENCE, payload={"flow": flow_name})
-        final_text = await self._call_stage(
+        (final_text,) = await self._call_stage(
+            state=state,
+            flow_names=[flow_name],
             stage="P4",
             system_prompt="你是事实/论证增强器，请在不改变大意的情况下把证据融入文案，增强可信度。",
-            user_prompt=_build_evidence_prompt(title, evidence.get("content", ""), middle),
+            user_prompt=_build_evidence_prompt(title, flow.evidence.get("content", ""), middle),
         )
         return {
-            "flow_name": flow_name,
-            "template": template,
-            "tone": tone,
-            "evidence": evidence,
+            **flow.describe(),
             "draft": draft,
             "middle": middle,
             "final": final_text,
         }
 
-    async def _call_stage(self, stage: str, system_prompt: str, user_prompt: str) -> str:
-        response = await self._ds_client.chat_completion(
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
-            temperature=0.7,
-            max_tokens=1024,
+    async def _run_fused_group(self, title: str, group: List[FlowInputs], state: JobState) -> List[Dict[str, Any]]:
+        """Template, tone and evidence in one structured-JSON call instead of three."""
+        names = [flow.flow_name for flow in group]
+        state.update(JobStage.TEMPLATE, payload={"flow": "+".join(names), "mode": "fused"})
+        contents = await self._call_stage(
+            state=state,
+            flow_names=names,
+            stage="P2-P4",
+            system_prompt="你是中文资深文案，需依次完成模板成稿、语气调校与证据增强，只返回JSON，不要解释。",
+            user_prompt=_build_fused_prompt(title, *group[0].prompt_inputs()),
+            max_tokens=3072,
+            response_format={"type": "json_object"},
         )
-        return response["choices"][0]["message"]["content"].strip()
+        return [{**flow.describe(), **_parse_fused_output(content)} for flow, content in zip(group, contents)]
 
+    async def _call_stage(
+        self,
+        state: JobState,
+        flow_names: Sequence[str],
+        stage: str,
+        system_prompt: str,
+        user_prompt: str,
+        **params: Any,
+    ) -> List[str]:
+        """Return one completion per flow, sampling up to ``max_choices`` per request.
 
-def _write_text(path: Path, content: str) -> None:
-    tmp_path = path.with_suffix(path.suffix + ".tmp")
-    tmp_path.write_text(content, encoding="utf-8")
-    tmp_path.replace(path)
+        Gateways that ignore ``n`` return fewer choices; the remainder is requested again.
+        """
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ]
+        params = {"temperature": 0.7, "max_tokens": 1024, **params}
+        prompt_estimate = estimate_tokens(system_prompt) + estimate_tokens(user_prompt)
+        texts: List[str] = []
+        while len(texts) < len(flow_names):
+            pending = flow_names[len(texts) : len(texts) + self._max_choices]
+            slot = self._scheduler.slot(
+                stage,
+                state.created_at,
+                priority=state.priority,
+                tenant=str(state.payload.get("author") or ""),
+            )
+            async with slot as queued:
+                started = time.perf_counter()
+                choices, usage = await self._stream_choices(state, pending, stage, messages, params)
+                elapsed = time.perf_counter() - started
+            PIPELINE_STAGE_SECONDS.observe(elapsed, stage=stage)
+            LLM_PROMPT_TOKENS.observe(prompt_estimate, stage=stage)
+            timings = self._timings.get(state.job_id)
+            if timings is not None:
+                timings["llm_calls"].append(
+                    {
+                        "stage": stage,
+                        "flows": list(pending),
+                        "seconds": round(elapsed, 4),
+                        "queue_seconds": round(queued, 4),
+                        "prompt_tokens_estimate": prompt_estimate,
+                        "prompt_tokens": (usage or {}).get("prompt_tokens"),
+                        "completion_tokens": (usage or {}).get("completion_tokens"),
+                    }
+                )
+            texts.extend(choices or [""])
+        return texts
+
+    async def _stream_choices(
+        self,
+        state: JobState,
+        flow_names: Sequence[str],
+        stage: str,
+        messages: List[Dict[str, Any]],
+        params: Dict[str, Any],
+    ) -> Tuple[List[str], Optional[Dict[str, Any]]]:
+        if len(flow_names) > 1:
+            params = {**params, "n": len(flow_names)}
+        parts: Dict[int, List[str]] = {}
+        usage: Optional[Dict[str, Any]] = None
+        async for chunk in self._ds_client.stream_chat_completion(messages=messages, **params):
+            usage = chunk.get("usage") or usage
+            for index, delta in choice_deltas(chunk):
+                if index >= len(flow_names):
+                    continue
+                parts.setdefault(index, [])
+                if delta:
+                    parts[index].append(delta)
+                    state.publish("token", {"flow": flow_names[index], "stage": stage, "delta": delta})
+        return ["".join(parts[index]).strip() for index in sorted(parts)], usage
+
+
+@dataclass
+class FlowInputs:
+    flow_name: str
+    template: Dict[str, Any]
+    tone: Dict[str, Any]
+    evidence: Dict[str, Any]
+
+    def prompt_inputs(self) -> Tuple[str, str, str]:
+        return (
+            self.template.get("content", ""),
+            self.tone.get("guideline", ""),
+            self.evidence.get("content", ""),
+        )
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "flow_name": self.flow_name,
+            "template": self.template,
+            "tone": self.tone,
+            "evidence": self.evidence,
+        }
+
+
+def _group_flows(flows: List[FlowInputs], key: Callable[[FlowInputs], str]) -> List[List[FlowInputs]]:
+    groups: Dict[str, List[FlowInputs]] = {}
+    for flow in flows:
+        groups.setdefault(key(flow), []).append(flow)
+    return list(groups.values())
+
+
+def _embedding_text(title: str, description: str) -> str:
+    return "\n".join([title, description])
+
+
+@contextmanager
+def _step(timings: Dict[str, Any], name: str) -> Iterator[None]:
+    """Time one pipeline step into the job's breakdown and the stage histogram."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        timings["steps"][name] = round(elapsed, 4)
+        PIPELINE_STAGE_SECONDS.observe(elapsed, stage=name)
 
 
 def _collect_payloads(retrievals: Dict[str, Any], key: str) -> List[Dict[str, Any]]:
@@ -155,6 +454,17 @@ def _collect_payloads(retrievals: Dict[str, Any], key: str) -> List[Dict[str, An
     return result
 
 
+def _parse_fused_output(content: str) -> Dict[str, str]:
+    try:
+        data = json.loads(content)
+    except json.JSONDecodeError:
+        logger.warning("Fused output is not valid JSON, using it as the final draft")
+        return {"draft": "", "middle": "", "final": content}
+    if not isinstance(data, dict):
+        data = {}
+    return {key: str(data.get(key) or "").strip() for key in ("draft", "middle", "final")}
+
+
 def _build_template_prompt(title: str, template_text: str) -> str:
     return (
         f"题目：《{title}》\n"
@@ -181,3 +491,14 @@ def _build_evidence_prompt(title: str, evidence_text: str, middle: str) -> str:
         f"证据：{evidence_text}\n"
         f"《中级文案》：{middle}"
     )
+
+
+def _build_fused_prompt(title: str, template_text: str, tone_guideline: str, evidence_text: str) -> str:
+    return (
+        f"题目：《{title}》\n"
+        "请依次完成以下三步：\n"
+        f"1. 根据给定模板生成《初级文案》，中文输出，篇幅控制在 120-180 字之间，保持结构与模板一致。模板内容：{template_text}\n"
+        f"2. 严格依据语气指引，把《初级文案》改写为《中级文案》。语气指引：{tone_guideline}\n"
+        f"3. 在不改变大意的情况下把证据融入《中级文案》，输出叙事连贯的《最终文案》。证据：{evidence_text}\n"
+        "返回 JSON 结构：{\"draft\": \"初级文案\", \"middle\": \"中级文案\", \"final\": \"最终文案\"}"
+    )
@@ -1,58 +1,154 @@
 from __future__ import annotations
 
+import asyncio
 import logging
+import time
 from dataclasses import dataclass
-from typing import Dict, List
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 from qdrant_client import AsyncQdrantClient
-from qdrant_client.http.models import ScoredPoint
+from qdrant_client.http.models import PayloadSelectorInclude, QueryRequest, Record, ScoredPoint
 
 from backend.config import Settings
 
 logger = logging.getLogger(__name__)
 
 
-COLLECTION_RULES: Dict[str, int] = {
-    "muban": 2,
-    "yuqi": 1,
-    "cross": 1,
-    "daojia": 1,
+@dataclass(frozen=True)
+class CollectionRule:
+    limit: int
+    payload_fields: Tuple[str, ...] = ()
+
+
+COLLECTION_RULES: Dict[str, CollectionRule] = {
+    "muban": CollectionRule(limit=2, payload_fields=("id", "title", "content")),
+    "yuqi": CollectionRule(limit=1, payload_fields=("id", "name", "guideline")),
+    "cross": CollectionRule(limit=1, payload_fields=("id", "summary", "content")),
+    "daojia": CollectionRule(limit=1, payload_fields=("id", "summary", "content")),
 }
 
+# Queries per ``query_batch_points`` request in ``search_batch``.
+BATCH_QUERY_SIZE = 64
+
 
 @dataclass
 class RetrievalResult:
     collection: str
     points: List[ScoredPoint]
+    latency_ms: float = 0.0
 
 
 class QdrantService:
-    def __init__(self, settings: Settings) -> None:
+    def __init__(self, settings: Settings, client: Optional[AsyncQdrantClient] = None) -> None:
         self._settings = settings
-        self._client = AsyncQdrantClient(
+        self._client = client or AsyncQdrantClient(
             url=settings.qdrant_url,
             api_key=settings.qdrant_api_key,
         )
+        self._fanout = asyncio.Semaphore(settings.qdrant_max_fanout)
+
+    async def start(self) -> None:
+        """Nothing to warm up; the client connects lazily."""
 
     async def close(self) -> None:
-        await self._client.aclose()
+        await self._client.close()
 
-    async def search(self, collection: str, vector: List[float], limit: int) -> RetrievalResult:
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "qdrant", "max_fanout": self._settings.qdrant_max_fanout}
+
+    async def export_collection(self, collection: str, batch_size: int = 256) -> Tuple[str, List[Record]]:
+        """Return the collection's distance metric and every point with its vector and payload."""
+        info = await self._client.get_collection(collection)
+        vectors_config = info.config.params.vectors
+        if isinstance(vectors_config, dict):
+            raise RuntimeError(f"Collection {collection} uses named vectors, which cannot be exported")
+        records: List[Record] = []
+        offset = None
+        while True:
+            batch, offset = await self._client.scroll(
+                collection_name=collection,
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True,
+            )
+            records.extend(batch)
+            if offset is None:
+                return str(vectors_config.distance.value), records
+
+    async def search(
+        self,
+        collection: str,
+        vector: List[float],
+        limit: int,
+        payload_fields: Sequence[str] = (),
+    ) -> RetrievalResult:
         logger.info(
             "Searching Qdrant collection",
             extra={"collection": collection, "limit": limit},
         )
-        points = await self._client.search(
+        started = time.perf_counter()
+        response = await self._client.query_points(
             collection_name=collection,
-            query_vector=vector,
+            query=vector,
             limit=limit,
-            with_payload=True,
+            with_payload=_payload_selector(payload_fields),
             score_threshold=None,
         )
-        return RetrievalResult(collection=collection, points=points)
+        latency_ms = (time.perf_counter() - started) * 1000.0
+        return RetrievalResult(collection=collection, points=response.points, latency_ms=latency_ms)
 
     async def retrieve_all(self, vector: List[float]) -> Dict[str, RetrievalResult]:
-        results: Dict[str, RetrievalResult] = {}
-        for collection, limit in COLLECTION_RULES.items():
-            results[collection] = await self.search(collection, vector, limit)
+        async def _bounded(collection: str, rule: CollectionRule) -> RetrievalResult:
+            async with self._fanout:
+                return await self.search(collection, vector, rule.limit, rule.payload_fields)
+
+        results = await asyncio.gather(
+            *(_bounded(collection, rule) for collection, rule in COLLECTION_RULES.items())
+        )
+        return {result.collection: result for result in results}
+
+    async def search_batch(
+        self,
+        collection: str,
+        vectors: Sequence[List[float]],
+        limit: int,
+        payload_fields: Sequence[str] = (),
+    ) -> List[RetrievalResult]:
+        """One ``query_batch_points`` request per ``BATCH_QUERY_SIZE`` vectors.
+
+        ``latency_ms`` of each result is that of the request it was part of.
+        """
+        selector = _payload_selector(payload_fields)
+        results: List[RetrievalResult] = []
+        for offset in range(0, len(vectors), BATCH_QUERY_SIZE):
+            chunk = vectors[offset : offset + BATCH_QUERY_SIZE]
+            started = time.perf_counter()
+            responses = await self._client.query_batch_points(
+                collection_name=collection,
+                requests=[QueryRequest(query=vector, limit=limit, with_payload=selector) for vector in chunk],
+            )
+            latency_ms = (time.perf_counter() - started) * 1000.0
+            results.extend(
+                RetrievalResult(collection=collection, points=response.points, latency_ms=latency_ms)
+                for response in responses
+            )
         return results
+
+    async def retrieve_batch(self, vectors: Sequence[List[float]]) -> List[Dict[str, RetrievalResult]]:
+        """``retrieve_all`` for many vectors with one batched query per collection."""
+
+        async def _bounded(collection: str, rule: CollectionRule) -> List[RetrievalResult]:
+            async with self._fanout:
+                return await self.search_batch(collection, vectors, rule.limit, rule.payload_fields)
+
+        per_collection = await asyncio.gather(
+            *(_bounded(collection, rule) for collection, rule in COLLECTION_RULES.items())
+        )
+        return [{results[index].collection: results[index] for results in per_collection} for index in range(len(vectors))]
+
+
+def _payload_selector(fields: Sequence[str]) -> bool | PayloadSelectorInclude:
+    if not fields:
+        return True
+    return PayloadSelectorInclude(include=list(fields))
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from backend.services.embedding_cache import normalize_text
+
+
+def request_key(*parts: Any) -> str:
+    """Stable digest of a request; strings, including those inside lists and dicts, are
+    NFKC/whitespace-normalized first."""
+    encoded = json.dumps(_normalize(list(parts)), ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        return normalize_text(value)
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items()}
+    return value
+
+
+class RequestCache:
+    """Single-flight coalescing of identical in-flight calls plus a TTL-bounded LRU of results.
+
+    Concurrent callers with the same key share one task; a caller going away does not
+    cancel it for the others. Only successful results are cached, for ``ttl`` seconds.
+    """
+
+    def __init__(self, ttl: float = 600.0, max_entries: int = 1024) -> None:
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._inflight: Dict[str, asyncio.Task[Any]] = {}
+        self._results: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._hits = 0
+        self._coalesced = 0
+        self._misses = 0
+
+    async def get_or_compute(
+        self,
+        key: str,
+        factory: Callable[[], Awaitable[Any]],
+        bypass: bool = False,
+    ) -> Any:
+        if bypass:
+            return await factory()
+        cached = self._results.get(key)
+        if cached is not None:
+            if time.monotonic() < cached[0]:
+                self._results.move_to_end(key)
+                self._hits += 1
+                return cached[1]
+            del self._results[key]
+        task = self._inflight.get(key)
+        if task is None:
+            self._misses += 1
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._settle(key, done))
+        else:
+            self._coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._results),
+            "inflight": len(self._inflight),
+            "hits": self._hits,
+            "coalesced": self._coalesced,
+            "misses": self._misses,
+            "ttl_seconds": self._ttl,
+            "max_entries": self._max_entries,
+        }
+
+    def _settle(self, key: str, task: asyncio.Task[Any]) -> None:
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        if self._ttl <= 0 or self._max_entries <= 0:
+            return
+        self._results[key] = (time.monotonic() + self._ttl, task.result())
+        self._results.move_to_end(key)
+        while len(self._results) > self._max_entries:
+            self._results.popitem(last=False)
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import random
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import httpx
+
+RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504})
+
+
+class GatewayUnavailableError(RuntimeError):
+    """Raised without contacting the gateway while the circuit breaker is open."""
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    max_retries: int = 3
+    backoff_base: float = 0.5
+    backoff_max: float = 8.0
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Full-jitter exponential backoff; a server ``Retry-After`` takes precedence."""
+        if retry_after is not None:
+            return max(0.0, retry_after)
+        return random.uniform(0.0, min(self.backoff_max, self.backoff_base * (2**attempt)))
+
+
+class CircuitBreaker:
+    """Opens after ``threshold`` consecutive failures and lets one probe through after ``reset_after``."""
+
+    def __init__(self, threshold: int = 5, reset_after: float = 30.0) -> None:
+        self._threshold = threshold
+        self._reset_after = reset_after
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self._reset_after:
+            return "half_open"
+        return "open"
+
+    def check(self) -> None:
+        state = self.state
+        if state == "open" or (state == "half_open" and self._probing):
+            raise GatewayUnavailableError("LLM gateway circuit breaker is open")
+        if state == "half_open":
+            self._probing = True
+
+    def abandon(self) -> None:
+        """Release a half-open probe whose call ended without a verdict (e.g. cancelled)."""
+        self._probing = False
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self._probing or (self._threshold > 0 and self._failures >= self._threshold):
+            self._opened_at = time.monotonic()
+        self._probing = False
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in RETRYABLE_STATUS
+    return isinstance(exc, (httpx.TransportError, TimeoutError))
+
+
+def counts_as_outage(exc: BaseException) -> bool:
+    """Throttling (429) means the gateway is up; only errors and timeouts trip the breaker."""
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    return isinstance(exc, (httpx.TransportError, TimeoutError))
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    if not isinstance(exc, httpx.HTTPStatusError):
+        return None
+    value = exc.response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return parsedate_to_datetime(value).timestamp() - time.time()
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_FLUSH_EVERY = 16
+
+
+class SemanticCache:
+    """Nearest-neighbour lookup of finished jobs by their title+description embedding.
+
+    Vectors are L2-normalized rows of one preallocated float32 matrix, so a lookup is
+    a single matrix-vector product. Each row carries a ``scope`` string (mode, variant
+    count, prompt version, model, context budgets); only rows with the caller's scope
+    can match. When full, the least recently used row is replaced. With ``directory`` set the index is
+    saved there as ``vectors.npy`` + ``entries.json`` and reloaded on start; ``add``
+    hands periodic saves to a background thread so callers on the event loop never
+    wait for disk.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 5000,
+        threshold: float = 0.97,
+        directory: Optional[Path] = None,
+    ) -> None:
+        self._capacity = max_entries
+        self._threshold = threshold
+        self._directory = directory
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flush_pending = False
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._vectors: Optional[np.ndarray] = None
+        self._job_ids: List[Optional[str]] = [None] * max_entries
+        self._scopes = np.full(max_entries, -1, dtype=np.int32)
+        self._scope_ids: Dict[str, int] = {}
+        self._ticks = np.zeros(max_entries, dtype=np.int64)
+        self._tick = 0
+        self._size = 0
+        self._dirty = 0
+        self._hits = 0
+        self._misses = 0
+        if directory is not None:
+            self._load()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def lookup(self, vector: Sequence[float], scope: str) -> Optional[Tuple[str, float]]:
+        """Return ``(job_id, cosine_similarity)`` of the closest entry at or above the threshold."""
+        with self._lock:
+            if self._vectors is None or not self._size:
+                self._misses += 1
+                return None
+            query = _normalize(vector)
+            if query.shape[0] != self._vectors.shape[1]:
+                self._misses += 1
+                return None
+            scores = self._vectors[: self._size] @ query
+            scores[self._scopes[: self._size] != self._scope_ids.get(scope, -2)] = -np.inf
+            slot = int(np.argmax(scores))
+            score = float(scores[slot])
+            if score < self._threshold:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._touch(slot)
+            return self._job_ids[slot], score
+
+    def add(self, job_id: str, vector: Sequence[float], scope: str) -> None:
+        if self._capacity <= 0:
+            return
+        with self._lock:
+            row = _normalize(vector)
+            if self._vectors is None:
+                self._vectors = np.zeros((self._capacity, row.shape[0]), dtype=np.float32)
+            elif row.shape[0] != self._vectors.shape[1]:
+                return
+            if self._size < self._capacity:
+                slot = self._size
+                self._size += 1
+            else:
+                slot = int(np.argmin(self._ticks))
+            self._vectors[slot] = row
+            self._job_ids[slot] = job_id
+            self._scopes[slot] = self._scope_ids.setdefault(scope, len(self._scope_ids))
+            self._touch(slot)
+            self._dirty += 1
+            flush = self._dirty >= _FLUSH_EVERY and self._directory is not None and not self._flush_pending
+            if flush:
+                self._flush_pending = True
+        if flush:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="semantic-cache")
+            self._executor.submit(self._flush_in_background)
+
+    def flush(self) -> None:
+        """Save the index now; blocking, so call it from a thread when on the event loop."""
+        if self._directory is None:
+            return
+        with self._flush_lock:
+            with self._lock:
+                if self._vectors is None or not self._dirty:
+                    return
+                vectors = self._vectors[: self._size].copy()
+                names = {index: scope for scope, index in self._scope_ids.items()}
+                entries = {
+                    "job_ids": self._job_ids[: self._size],
+                    "scopes": [names[index] for index in self._scopes[: self._size]],
+                    "ticks": self._ticks[: self._size].tolist(),
+                }
+                self._dirty = 0
+            self._directory.mkdir(parents=True, exist_ok=True)
+            _atomic_write(self._directory / "vectors.npy", lambda handle: np.save(handle, vectors))
+            _atomic_write(
+                self._directory / "entries.json", lambda handle: handle.write(json.dumps(entries).encode("utf-8"))
+            )
+
+    def close(self) -> None:
+        """Wait for a background save, then save whatever is still unsaved."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        self.flush()
+
+    def _flush_in_background(self) -> None:
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Semantic cache flush failed")
+            with self._lock:
+                self._dirty = max(self._dirty, 1)
+        finally:
+            self._flush_pending = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": self._size,
+            "max_entries": self._capacity,
+            "threshold": self._threshold,
+            "hits": self._hits,
+            "misses": self._misses,
+        }
+
+    def _load(self) -> None:
+        vectors_path = self._directory / "vectors.npy"
+        entries_path = self._directory / "entries.json"
+        if not vectors_path.exists() or not entries_path.exists():
+            return
+        try:
+            vectors = np.load(vectors_path)
+            entries = json.loads(entries_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as exc:
+            logger.warning("Semantic cache unreadable, starting empty", extra={"error": str(exc)})
+            return
+        count = min(len(vectors), len(entries["job_ids"]), self._capacity)
+        if not count:
+            return
+        # Keep the most recently used rows when the configured capacity shrank.
+        keep = np.argsort(np.asarray(entries["ticks"][: len(vectors)]))[-count:]
+        self._vectors = np.zeros((self._capacity, vectors.shape[1]), dtype=np.float32)
+        self._vectors[:count] = vectors[keep]
+        for slot, index in enumerate(keep):
+            self._job_ids[slot] = entries["job_ids"][index]
+            self._scopes[slot] = self._scope_ids.setdefault(entries["scopes"][index], len(self._scope_ids))
+            self._ticks[slot] = entries["ticks"][index]
+        self._size = count
+        self._tick = int(self._ticks[:count].max())
+
+    def _touch(self, slot: int) -> None:
+        self._tick += 1
+        self._ticks[slot] = self._tick
+
+
+def _atomic_write(path: Path, write: Callable[[Any], Any]) -> None:
+    # Per-process temp name: several workers may share the cache directory.
+    tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp{path.suffix}")
+    with tmp_path.open("wb") as handle:
+        write(handle)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(tmp_path, path)
+
+
+def _normalize(vector: Sequence[float]) -> np.ndarray:
+    row = np.asarray(vector, dtype=np.float32).ravel()
+    norm = float(np.linalg.norm(row))
+    return row / norm if norm > 0 else row
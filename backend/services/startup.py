@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTracker:
+    """Durations of the startup phases plus the readiness state behind ``/readyz``."""
+
+    def __init__(self, started: Optional[float] = None) -> None:
+        self._started = started if started is not None else time.perf_counter()
+        self._phases: Dict[str, float] = {}
+        self._ready_at: Optional[float] = None
+        self._error: Optional[str] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._ready_at is not None
+
+    def record(self, phase: str, seconds: float) -> None:
+        self._phases[phase] = round(seconds, 4)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+            logger.info("Startup phase finished", extra={"phase": name, "seconds": self._phases[name]})
+
+    def mark_ready(self) -> None:
+        self._ready_at = time.perf_counter()
+        logger.info("Application ready", extra={"seconds": round(self._ready_at - self._started, 3)})
+
+    def fail(self, exc: BaseException) -> None:
+        self._error = f"{type(exc).__name__}: {exc}"
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.perf_counter()
+        return {
+            "ready": self.ready,
+            "error": self._error,
+            "uptime_seconds": round(now - self._started, 3),
+            "time_to_ready_seconds": round(self._ready_at - self._started, 3) if self._ready_at else None,
+            "phases": dict(self._phases),
+        }
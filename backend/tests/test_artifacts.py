@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+
+from backend.services import artifacts
+from backend.services.artifacts import ArtifactWriter
+
+
+@pytest.mark.parametrize("compression", ["none", "gzip"])
+def test_compaction_recodes_legacy_results_once(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, compression: str) -> None:
+    legacy = tmp_path / "legacy"
+    legacy.mkdir()
+    (legacy / "result.json").write_text(json.dumps({"job_id": "legacy", "drafts": {}}, indent=2), encoding="utf-8")
+    writer = ArtifactWriter(tmp_path, compression=compression)
+
+    async def scenario() -> None:
+        await writer.write_job("fresh", {}, {"job_id": "fresh", "drafts": {}})
+        assert await writer.compact() == {"removed": 0, "compacted": 1}
+
+        def fail(data: bytes, compression: str) -> bytes:
+            raise AssertionError("results in the current format must not be decompressed")
+
+        monkeypatch.setattr(artifacts, "_decompress", fail)
+        assert await writer.compact() == {"removed": 0, "compacted": 0}
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        writer.close()
+    monkeypatch.undo()
+    assert writer.load_result("legacy") == {"job_id": "legacy", "drafts": {}}
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import replace
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
+import pytest
+
+from backend.config import Settings
+from backend.services.ds_client import DSClient
+from backend.services.resilience import GatewayUnavailableError
+from backend.tools.stub_gateway import StubConfig, create_stub_app
+
+MESSAGES = [{"role": "user", "content": "你好"}]
+
+SETTINGS = Settings(
+    ds_base_url="http://stub/v1",
+    ds_api_key="test",
+    ds_model="stub",
+    models_path=Path("."),
+    qdrant_url="http://qdrant",
+    qdrant_api_key="",
+    project_root=Path("."),
+    port=0,
+    cors_allow_origins=(),
+    ds_http2=False,
+    ds_max_retries=2,
+    ds_backoff_base=0.0,
+    ds_request_deadline=5.0,
+)
+
+
+class _FaultyStream(httpx.AsyncByteStream):
+    """Response body that drops the connection, or stalls, after ``chunks`` SSE events."""
+
+    def __init__(self, inner: httpx.AsyncByteStream, chunks: int, fault: str) -> None:
+        self._inner = inner
+        self._chunks = chunks
+        self._fault = fault
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        body = b"".join([part async for part in self._inner])
+        for sent, event in enumerate(body.split(b"\n\n")):
+            if sent == self._chunks:
+                if self._fault == "stall":
+                    await asyncio.sleep(3600)
+                raise httpx.ReadError("connection dropped")
+            yield event + b"\n\n"
+
+
+class _FaultyTransport(httpx.AsyncBaseTransport):
+    """``ASGITransport`` buffers whole responses; this replays the stub's stream event by
+    event and cuts it short, as a gateway failing mid-stream would."""
+
+    def __init__(self, inner: httpx.AsyncBaseTransport, chunks: int, fault: str) -> None:
+        self._inner = inner
+        self._chunks = chunks
+        self._fault = fault
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await self._inner.handle_async_request(request)
+        assert isinstance(response.stream, httpx.AsyncByteStream)
+        stream = _FaultyStream(response.stream, self._chunks, self._fault)
+        return httpx.Response(response.status_code, headers=response.headers, stream=stream)
+
+
+def _client(config: StubConfig, fault: Optional[Tuple[int, str]] = None, **settings: Any) -> Tuple[DSClient, Any]:
+    stub = create_stub_app(config)
+    transport: httpx.AsyncBaseTransport = httpx.ASGITransport(app=stub)
+    if fault is not None:
+        transport = _FaultyTransport(transport, *fault)
+    return DSClient(replace(SETTINGS, **settings), transport=transport), stub
+
+
+async def _collect(client: DSClient, deadline: Optional[float] = None) -> List[Dict[str, Any]]:
+    return [chunk async for chunk in client.stream_chat_completion(MESSAGES, deadline=deadline)]
+
+
+def test_retry_after_sets_the_backoff() -> None:
+    async def scenario() -> None:
+        client, stub = _client(StubConfig(latency_ms=0, error_rate=1.0, retry_after=0.2), ds_max_retries=1)
+        started = time.monotonic()
+        with pytest.raises(httpx.HTTPStatusError):
+            await client.chat_completion(MESSAGES)
+        assert time.monotonic() - started >= 0.2
+        assert stub.state.counters["requests"] == 2
+        assert client.stats()["retries"] == 1
+        await client.close()
+
+    asyncio.run(scenario())
+
+
+def test_stream_retries_only_before_the_first_chunk() -> None:
+    async def scenario() -> None:
+        client, stub = _client(StubConfig(latency_ms=0, error_rate=1.0, error_status=502))
+        with pytest.raises(httpx.HTTPStatusError):
+            await _collect(client)
+        assert stub.state.counters["requests"] == 3  # first attempt and two retries
+        await client.close()
+
+        client, stub = _client(StubConfig(latency_ms=0), fault=(1, "drop"))
+        received: List[Dict[str, Any]] = []
+        with pytest.raises(httpx.ReadError):
+            async for chunk in client.stream_chat_completion(MESSAGES):
+                received.append(chunk)
+        assert len(received) == 1
+        assert stub.state.counters["requests"] == 1
+        assert client.stats()["retries"] == 0
+        await client.close()
+
+    asyncio.run(scenario())
+
+
+def test_stalled_stream_fails_at_the_deadline() -> None:
+    async def scenario() -> None:
+        client, stub = _client(StubConfig(latency_ms=0), fault=(1, "stall"))
+        started = time.monotonic()
+        with pytest.raises(TimeoutError):
+            await _collect(client, deadline=0.3)
+        assert time.monotonic() - started < 2.0
+        assert stub.state.counters["requests"] == 1
+        await client.close()
+
+    asyncio.run(scenario())
+
+
+def test_breaker_opens_and_recovers_through_a_half_open_probe() -> None:
+    async def scenario() -> None:
+        config = StubConfig(latency_ms=0, error_rate=1.0)
+        client, stub = _client(config, ds_max_retries=0, ds_breaker_threshold=2, ds_breaker_reset_seconds=0.2)
+        for _ in range(2):
+            with pytest.raises(httpx.HTTPStatusError):
+                await client.chat_completion(MESSAGES)
+        assert client.stats()["breaker_state"] == "open"
+        assert not client.available
+        with pytest.raises(GatewayUnavailableError):
+            await client.chat_completion(MESSAGES)
+        assert stub.state.counters["requests"] == 2  # failed fast, gateway not contacted
+
+        # A failed probe opens the breaker again at once.
+        await asyncio.sleep(0.25)
+        assert client.stats()["breaker_state"] == "half_open"
+        with pytest.raises(httpx.HTTPStatusError):
+            await client.chat_completion(MESSAGES)
+        assert client.stats()["breaker_state"] == "open"
+
+        # A successful probe closes it.
+        await asyncio.sleep(0.25)
+        config.error_rate = 0.0
+        body = await client.chat_completion(MESSAGES)
+        assert body["choices"][0]["message"]["content"]
+        assert client.stats()["breaker_state"] == "closed"
+        await client.close()
+
+    asyncio.run(scenario())
+
+
+def test_throttling_does_not_trip_the_breaker() -> None:
+    async def scenario() -> None:
+        client, _ = _client(
+            StubConfig(latency_ms=0, error_rate=1.0, error_status=429), ds_max_retries=0, ds_breaker_threshold=1
+        )
+        for _ in range(3):
+            with pytest.raises(httpx.HTTPStatusError):
+                await client.chat_completion(MESSAGES)
+        assert client.stats()["breaker_state"] == "closed"
+        await client.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List
+
+from backend.models.job import JobStage, JobState
+from backend.services.artifacts import ArtifactWriter
+from backend.services.job_manager import JobManager
+from backend.services.job_store import SQLiteJobStore
+
+
+async def _streaming_runner(job_id: str, state: JobState, payload: Dict[str, Any], artifacts: Any) -> Dict[str, Any]:
+    state.update(JobStage.WRITING)
+    await asyncio.sleep(0.2)
+    for index in range(5):
+        state.publish("token", {"flow": "a", "stage": "final", "delta": str(index)})
+        await asyncio.sleep(0.01)
+    return {"title": payload["title"]}
+
+
+def test_stream_opened_before_claim_receives_tokens(tmp_path: Path) -> None:
+    async def scenario() -> List[str]:
+        store = SQLiteJobStore(tmp_path / "jobs.sqlite3")
+        manager = JobManager(ArtifactWriter(tmp_path / "outputs"), _streaming_runner, store=store, poll_interval=0.05)
+        try:
+            state = await manager.start_job({"title": "t"})
+            assert state.status == JobStage.CREATED
+            kinds: List[str] = []
+            async for event in manager.events(state, keepalive=5.0):
+                if event is not None:
+                    kinds.append(event.event if event.event == "token" else event.data["status"])
+            return kinds
+        finally:
+            await manager.stop()
+
+    kinds = asyncio.run(scenario())
+    assert kinds.count("token") == 5
+    assert kinds[0] == "CREATED"
+    assert kinds[-1] == "DONE"
+    # Stage events are never repeated when the feed switches from polling to pushed events.
+    stages = [kind for kind in kinds if kind != "token"]
+    assert len(stages) == len(set(stages))
+
+
+def test_requeue_stale_skips_heartbeated_and_own_jobs(tmp_path: Path) -> None:
+    async def scenario() -> None:
+        store = SQLiteJobStore(tmp_path / "jobs.sqlite3")
+        try:
+            old = datetime.utcnow() - timedelta(hours=1)
+            for job_id in ("mine", "beating", "dead"):
+                await store.create(JobState(job_id=job_id, created_at=old, updated_at=old))
+            for worker in ("self", "other", "gone"):
+                assert await store.claim(worker) is not None
+            await store.heartbeat("other", ["beating"])
+
+            assert await store.requeue_stale(timedelta(minutes=10), "self") == 1
+            claimed = await store.claim("self")
+            assert claimed is not None and claimed.job_id == "dead"
+        finally:
+            await store.close()
+
+    asyncio.run(scenario())
+
+
+def test_finish_hook_runs_for_jobs_cancelled_while_queued(tmp_path: Path) -> None:
+    async def scenario() -> List[Dict[str, Any]]:
+        finished: List[Dict[str, Any]] = []
+        manager = JobManager(ArtifactWriter(tmp_path / "outputs"), _streaming_runner, on_finished=finished.append)
+        try:
+            state = await manager.start_job({"title": "t", "batch_id": "b", "batch_index": 0})
+            cancelled = await manager.cancel_job(state.job_id)
+            assert cancelled is not None and cancelled.status == JobStage.CANCELLED
+        finally:
+            await manager.stop()
+        return finished
+
+    assert [payload["batch_index"] for payload in asyncio.run(scenario())] == [0]
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from backend.services.llm_scheduler import LLMScheduler
+
+
+async def _hold(scheduler: LLMScheduler, tenant: str = "") -> None:
+    async with scheduler.slot("P2", datetime.utcnow(), tenant=tenant):
+        await asyncio.sleep(0)
+
+
+def test_cancelled_waiter_released_in_same_tick_does_not_leak_a_slot() -> None:
+    async def scenario() -> None:
+        scheduler = LLMScheduler(max_concurrency=1)
+        holder = scheduler.slot("P2", datetime.utcnow(), tenant="a")
+        await holder.__aenter__()
+        waiter = asyncio.create_task(_hold(scheduler, "b"))
+        await asyncio.sleep(0)
+        assert scheduler.stats()["waiting_by_priority"] == {"1": 1}
+
+        # The waiter's future is cancelled now, but its task only handles the
+        # CancelledError on its next step; the slot is released in between.
+        waiter.cancel()
+        await holder.__aexit__(None, None, None)
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        assert scheduler.stats()["in_flight"] == 0
+        await asyncio.wait_for(_hold(scheduler, "c"), timeout=1.0)
+        assert scheduler.stats()["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_idle_tenants_are_pruned() -> None:
+    async def scenario() -> None:
+        scheduler = LLMScheduler(max_concurrency=2)
+        await asyncio.gather(*(_hold(scheduler, f"tenant-{index}") for index in range(50)))
+        stats = scheduler.stats()
+        assert stats["in_flight"] == 0
+        assert stats["granted"] == 50
+        assert stats["tenants"] == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,12 @@
+from __future__ import annotations
+
+from backend.services.request_cache import request_key
+
+
+def test_list_items_are_normalized() -> None:
+    assert request_key("titles", 1, "m", ["ＡＩ 营销", " 增长"]) == request_key("titles", 1, "m", ["AI  营销", "增长"])
+    assert request_key("titles", 1, "m", ["AI", "增长"]) != request_key("titles", 1, "m", ["增长", "AI"])
+
+
+def test_nested_values_are_normalized() -> None:
+    assert request_key({"tone": " 正式 "}) == request_key({"tone": "正式"})
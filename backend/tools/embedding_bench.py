@@ -0,0 +1,164 @@
+"""Benchmark, parity-check and quantize the embedding backends.
+
+Quantize an exported BGE-M3 encoder (e.g. ``optimum-cli export onnx --model
+BAAI/bge-m3 <models_path>/onnx``) to int8 for ``EMBED_BACKEND=onnx``::
+
+    python -m backend.tools.embedding_bench quantize <models_path>/onnx/model.onnx \\
+        <models_path>/onnx/model_quantized.onnx
+
+Compare a backend against the FlagEmbedding reference (exit status 1 when any
+text falls below ``--min-cosine``)::
+
+    python -m backend.tools.embedding_bench parity --backend onnx --min-cosine 0.99
+
+Report texts/sec and peak RSS per backend; each backend runs in its own process
+so the RSS figures do not include the other model::
+
+    python -m backend.tools.embedding_bench bench --backends flag onnx --threads 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import dataclasses
+import json
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from backend.config import Settings, load_settings
+from backend.services.embedding import create_embedding_provider
+
+CHARTERS_DIR = Path(__file__).resolve().parents[1] / "charters"
+
+
+def sample_texts(path: Optional[Path], count: int) -> List[str]:
+    """Texts from ``path`` (one per line) or the bundled charters, cycled up to ``count``."""
+    if path is not None:
+        texts = [line.strip() for line in path.read_text(encoding="utf-8").splitlines() if line.strip()]
+    else:
+        texts = []
+        for charter in sorted(CHARTERS_DIR.glob("*.json")):
+            for record in json.loads(charter.read_text(encoding="utf-8")):
+                texts.extend(str(value) for key, value in record.items() if key != "id")
+    if not texts:
+        raise SystemExit("No texts to embed")
+    # Suffix the repeats so every text is distinct and no backend can short-cut duplicates.
+    return [texts[index % len(texts)] + ("" if index < len(texts) else f" #{index}") for index in range(count)]
+
+
+def with_backend(settings: Settings, backend: str, threads: Optional[int]) -> Settings:
+    changes: Dict[str, Any] = {"embed_backend": backend}
+    if threads is not None:
+        changes["embed_threads"] = threads
+    return dataclasses.replace(settings, **changes)
+
+
+def measure(settings: Settings, texts: List[str], batch_size: int) -> Dict[str, Any]:
+    started = time.perf_counter()
+    provider = create_embedding_provider(settings)
+    load_seconds = time.perf_counter() - started
+    provider.embed(texts[:batch_size])  # warm-up
+    started = time.perf_counter()
+    for offset in range(0, len(texts), batch_size):
+        provider.embed(texts[offset : offset + batch_size])
+    elapsed = time.perf_counter() - started
+    return {
+        "backend": settings.embed_backend,
+        "threads": settings.embed_threads,
+        "texts": len(texts),
+        "batch_size": batch_size,
+        "load_seconds": round(load_seconds, 2),
+        "texts_per_second": round(len(texts) / elapsed, 1) if elapsed else None,
+        # ru_maxrss is in KiB on Linux.
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def parity(reference: Settings, candidate: Settings, texts: List[str], batch_size: int) -> Dict[str, Any]:
+    vectors = []
+    for settings in (reference, candidate):
+        provider = create_embedding_provider(settings)
+        rows: List[List[float]] = []
+        for offset in range(0, len(texts), batch_size):
+            rows.extend(provider.embed(texts[offset : offset + batch_size]))
+        matrix = np.asarray(rows, dtype=np.float32)
+        vectors.append(matrix / np.linalg.norm(matrix, axis=1, keepdims=True))
+    cosine = np.einsum("ij,ij->i", vectors[0], vectors[1])
+    return {
+        "reference": reference.embed_backend,
+        "candidate": candidate.embed_backend,
+        "texts": len(texts),
+        "min_cosine": round(float(cosine.min()), 5),
+        "mean_cosine": round(float(cosine.mean()), 5),
+        "worst_text": texts[int(cosine.argmin())][:80],
+    }
+
+
+def quantize(source: Path, target: Path) -> None:
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    quantize_dynamic(str(source), str(target), weight_type=QuantType.QInt8)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    bench = commands.add_parser("bench", help="texts/sec and peak RSS per backend")
+    bench.add_argument("--backends", nargs="+", default=["flag", "onnx"], choices=["flag", "onnx"])
+    measure_one = commands.add_parser("measure", help=argparse.SUPPRESS)
+    measure_one.add_argument("--backend", required=True, choices=["flag", "onnx"])
+    check = commands.add_parser("parity", help="cosine similarity against the flag backend")
+    check.add_argument("--backend", default="onnx", choices=["flag", "onnx"])
+    check.add_argument("--min-cosine", type=float, default=0.99)
+    for command in (bench, measure_one, check):
+        command.add_argument("--texts", type=Path, default=None, help="file with one text per line")
+        command.add_argument("--count", type=int, default=512)
+        command.add_argument("--batch-size", type=int, default=32)
+        command.add_argument("--threads", type=int, default=None)
+    convert = commands.add_parser("quantize", help="dynamic int8 quantization of an ONNX model")
+    convert.add_argument("source", type=Path)
+    convert.add_argument("target", type=Path)
+    args = parser.parse_args()
+
+    if args.command == "quantize":
+        quantize(args.source, args.target)
+        print(json.dumps({"target": str(args.target), "bytes": args.target.stat().st_size}))
+        return
+    settings = load_settings()
+    texts = sample_texts(args.texts, args.count)
+    if args.command == "measure":
+        print(json.dumps(measure(with_backend(settings, args.backend, args.threads), texts, args.batch_size)))
+        return
+    if args.command == "parity":
+        report = parity(
+            with_backend(settings, "flag", args.threads),
+            with_backend(settings, args.backend, args.threads),
+            texts,
+            args.batch_size,
+        )
+        print(json.dumps(report, ensure_ascii=False))
+        raise SystemExit(0 if report["min_cosine"] >= args.min_cosine else 1)
+    for backend in args.backends:
+        command = [sys.executable, "-m", "backend.tools.embedding_bench", "measure", "--backend", backend]
+        command += ["--count", str(args.count), "--batch-size", str(args.batch_size)]
+        if args.texts is not None:
+            command += ["--texts", str(args.texts)]
+        if args.threads is not None:
+            command += ["--threads", str(args.threads)]
+        completed = subprocess.run(command, capture_output=True, text=True)
+        if completed.returncode != 0:
+            print(json.dumps({"backend": backend, "error": completed.stderr.strip().splitlines()[-1:]}))
+            continue
+        print(completed.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Run the shared embedding sidecar that API workers reach over a Unix socket.
+
+One process loads the model (and its cache) once for every uvicorn worker::
+
+    python -m backend.tools.embedding_sidecar --socket /run/copywriter/embed.sock
+    EMBED_SIDECAR_SOCKET=/run/copywriter/embed.sock uvicorn --factory backend.main:create_app --workers 8
+
+Without ``--socket`` the path comes from ``EMBED_SIDECAR_SOCKET``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import dataclasses
+import logging
+import signal
+from pathlib import Path
+from typing import Optional
+
+from backend.config import load_settings
+from backend.services.embedding import get_embedding_service
+from backend.services.embedding_batcher import EmbeddingBatcher
+from backend.services.embedding_sidecar import EmbeddingSidecarServer
+
+logger = logging.getLogger(__name__)
+
+
+async def serve(socket_path: Optional[Path], max_batch_size: Optional[int], max_wait_ms: Optional[float]) -> None:
+    settings = load_settings()
+    socket_path = socket_path or settings.embed_sidecar_socket
+    if socket_path is None:
+        raise SystemExit("Pass --socket or set EMBED_SIDECAR_SOCKET")
+    # This process is the model owner, so it must not connect to a sidecar itself.
+    settings = dataclasses.replace(settings, embed_sidecar_socket=None)
+    batcher = EmbeddingBatcher(
+        get_embedding_service(settings),
+        max_batch_size=max_batch_size or settings.embed_batch_size,
+        max_wait_ms=max_wait_ms if max_wait_ms is not None else settings.embed_batch_wait_ms,
+    )
+    server = EmbeddingSidecarServer(batcher, socket_path)
+    await server.start()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    await stop.wait()
+    logger.info("Embedding sidecar stopping")
+    await server.close()
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--socket", type=Path, default=None)
+    parser.add_argument("--max-batch-size", type=int, default=None, help="defaults to EMBED_BATCH_SIZE")
+    parser.add_argument("--max-wait-ms", type=float, default=None, help="defaults to EMBED_BATCH_WAIT_MS")
+    args = parser.parse_args()
+    asyncio.run(serve(args.socket, args.max_batch_size, args.max_wait_ms))
+
+
+if __name__ == "__main__":
+    main()
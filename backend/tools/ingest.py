@@ -0,0 +1,287 @@
+"""Embed charter corpora with BGE-M3 and upsert them into the Qdrant collections.
+
+Each source is ``<collection>=<path>``; a path may be a JSON array or JSONL file::
+
+    python -m backend.tools.ingest muban=backend/charters/templates.json \\
+        yuqi=backend/charters/tones.json cross=backend/charters/evidences.json
+
+With no sources the bundled charters are ingested (``templates``→muban,
+``tones``→yuqi, ``evidences``→cross). Point ids are uuid5 of ``collection:id``, so
+re-runs overwrite rather than duplicate. A per-collection state file records a
+content hash per point after each successful upsert; unchanged documents are
+skipped, which also makes an interrupted run resumable. ``--qdrant-url :memory:``
+runs against an in-process Qdrant and ignores the state files.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.http import models as qm
+
+from backend.config import load_settings
+from backend.services.embedding import EmbeddingProvider, create_embedding_provider, embedding_model_id
+from backend.services.qdrant_client import COLLECTION_RULES
+
+logger = logging.getLogger(__name__)
+
+POINT_NAMESPACE = uuid.UUID("6f1c2a7e-3b9d-5c4e-8a21-0d7f4b6e9c13")
+DEFAULT_SOURCES: Dict[str, str] = {
+    "muban": "templates.json",
+    "yuqi": "tones.json",
+    "cross": "evidences.json",
+}
+
+
+@dataclass
+class Document:
+    point_id: str
+    text: str
+    payload: Dict[str, Any]
+    content_hash: str
+
+
+@dataclass
+class IngestReport:
+    collection: str
+    seen: int = 0
+    skipped: int = 0
+    upserted: int = 0
+    embed_seconds: float = 0.0
+    elapsed: float = 0.0
+    errors: List[str] = field(default_factory=list)
+
+    def summary(self) -> Dict[str, Any]:
+        embedded = self.seen - self.skipped
+        return {
+            "collection": self.collection,
+            "seen": self.seen,
+            "skipped": self.skipped,
+            "upserted": self.upserted,
+            "elapsed_seconds": round(self.elapsed, 3),
+            "docs_per_second": round(self.seen / self.elapsed, 1) if self.elapsed else None,
+            "embed_docs_per_second": round(embedded / self.embed_seconds, 1) if self.embed_seconds else None,
+        }
+
+
+class IngestState:
+    """``point_id -> content hash`` of everything already upserted.
+
+    Backed by an append-only log of ``<point_id> <hash>`` lines, so recording a chunk
+    costs one small write and a torn last line after a crash is simply ignored.
+    """
+
+    def __init__(self, path: Optional[Path]) -> None:
+        self._path = path
+        self.hashes: Dict[str, str] = {}
+        if path is not None and path.exists():
+            for line in path.read_text(encoding="utf-8").splitlines():
+                parts = line.split()
+                if len(parts) == 2:
+                    self.hashes[parts[0]] = parts[1]
+
+    def unchanged(self, document: Document) -> bool:
+        return self.hashes.get(document.point_id) == document.content_hash
+
+    def reset(self) -> None:
+        self.hashes.clear()
+        if self._path is not None and self._path.exists():
+            self._path.unlink()
+
+    def record(self, documents: List[Document]) -> None:
+        for document in documents:
+            self.hashes[document.point_id] = document.content_hash
+        if self._path is None:
+            return
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        with self._path.open("a", encoding="utf-8") as handle:
+            handle.writelines(f"{document.point_id} {document.content_hash}\n" for document in documents)
+
+
+def read_documents(path: Path, collection: str, model_id: str) -> Iterator[Document]:
+    """Stream documents from a JSON array or JSONL file; text fields follow ``COLLECTION_RULES``."""
+    text_fields = [name for name in COLLECTION_RULES[collection].payload_fields if name != "id"]
+    for line_number, record in enumerate(_records(path), start=1):
+        doc_id = record.get("id")
+        if doc_id is None:
+            raise ValueError(f"{path}: record {line_number} has no id")
+        text = "\n".join(str(record[name]) for name in text_fields if record.get(name))
+        encoded = json.dumps([model_id, text, record], ensure_ascii=False, sort_keys=True)
+        yield Document(
+            point_id=str(uuid.uuid5(POINT_NAMESPACE, f"{collection}:{doc_id}")),
+            text=text,
+            payload=record,
+            content_hash=hashlib.sha256(encoded.encode("utf-8")).hexdigest(),
+        )
+
+
+async def ingest_collection(
+    client: AsyncQdrantClient,
+    embedder: EmbeddingProvider,
+    collection: str,
+    documents: Iterator[Document],
+    state: IngestState,
+    embed_batch: int = 64,
+    upsert_batch: int = 256,
+    parallel: int = 4,
+) -> IngestReport:
+    """Embed in batches off the event loop while earlier chunks are upserted concurrently.
+
+    Embedded documents accumulate across embed batches and go out in ``upsert_batch``
+    sized upserts, whichever of the two batch sizes is larger.
+    """
+    report = IngestReport(collection=collection)
+    started = time.perf_counter()
+    await _ensure_collection(client, collection, embedder.dimension)
+    slots = asyncio.Semaphore(max(1, parallel))
+    uploads: List[asyncio.Task[None]] = []
+
+    async def _upsert(chunk: List[Document], vectors: List[List[float]]) -> None:
+        try:
+            await client.upsert(
+                collection_name=collection,
+                points=[
+                    qm.PointStruct(id=document.point_id, vector=vector, payload=document.payload)
+                    for document, vector in zip(chunk, vectors)
+                ],
+                wait=True,
+            )
+        except Exception as exc:
+            logger.exception("Upsert failed", extra={"collection": collection, "points": len(chunk)})
+            report.errors.append(str(exc))
+        else:
+            state.record(chunk)
+            report.upserted += len(chunk)
+        finally:
+            slots.release()
+
+    ready: List[Document] = []
+    ready_vectors: List[List[float]] = []
+
+    async def _upload(final: bool = False) -> None:
+        size = max(1, upsert_batch)
+        while len(ready) >= size or (final and ready):
+            await slots.acquire()
+            uploads.append(asyncio.create_task(_upsert(ready[:size], ready_vectors[:size])))
+            del ready[:size], ready_vectors[:size]
+
+    async def _flush(batch: List[Document]) -> None:
+        embed_started = time.perf_counter()
+        vectors = await asyncio.to_thread(embedder.embed, [document.text for document in batch])
+        report.embed_seconds += time.perf_counter() - embed_started
+        ready.extend(batch)
+        ready_vectors.extend(vectors)
+        await _upload()
+
+    pending: List[Document] = []
+    for document in documents:
+        report.seen += 1
+        if state.unchanged(document):
+            report.skipped += 1
+            continue
+        pending.append(document)
+        if len(pending) >= embed_batch:
+            await _flush(pending)
+            pending = []
+    if pending:
+        await _flush(pending)
+    await _upload(final=True)
+    await asyncio.gather(*uploads)
+    report.elapsed = time.perf_counter() - started
+    return report
+
+
+async def _ensure_collection(client: AsyncQdrantClient, collection: str, dimension: int) -> None:
+    if await client.collection_exists(collection):
+        return
+    logger.info("Creating collection", extra={"collection": collection, "dimension": dimension})
+    await client.create_collection(
+        collection_name=collection,
+        vectors_config=qm.VectorParams(size=dimension, distance=qm.Distance.COSINE),
+    )
+
+
+def _records(path: Path) -> Iterator[Dict[str, Any]]:
+    if path.suffix == ".jsonl":
+        with path.open(encoding="utf-8") as handle:
+            for line in handle:
+                if line.strip():
+                    yield json.loads(line)
+        return
+    data = json.loads(path.read_text(encoding="utf-8"))
+    yield from data if isinstance(data, list) else [data]
+
+
+def _parse_sources(values: List[str], charters_dir: Path) -> List[Tuple[str, Path]]:
+    if not values:
+        return [(collection, charters_dir / name) for collection, name in DEFAULT_SOURCES.items()]
+    sources: List[Tuple[str, Path]] = []
+    for value in values:
+        collection, _, path = value.partition("=")
+        if not path or collection not in COLLECTION_RULES:
+            raise SystemExit(f"Expected <collection>=<path> with collection in {sorted(COLLECTION_RULES)}: {value}")
+        sources.append((collection, Path(path)))
+    return sources
+
+
+async def _run(args: argparse.Namespace) -> int:
+    settings = load_settings()
+    sources = _parse_sources(args.sources, Path(__file__).resolve().parents[1] / "charters")
+    in_memory = args.qdrant_url == ":memory:"
+    if in_memory:
+        client = AsyncQdrantClient(location=":memory:")
+    else:
+        client = AsyncQdrantClient(url=args.qdrant_url or settings.qdrant_url, api_key=settings.qdrant_api_key)
+    state_dir = args.state_dir or settings.project_root / "backend" / "data" / "ingest_state"
+    embedder = create_embedding_provider(settings)
+    failed = False
+    try:
+        for collection, path in sources:
+            if args.recreate and await client.collection_exists(collection):
+                await client.delete_collection(collection)
+            state = IngestState(None if in_memory else state_dir / f"{collection}.log")
+            if args.force or args.recreate:
+                state.reset()
+            report = await ingest_collection(
+                client,
+                embedder,
+                collection,
+                read_documents(path, collection, embedding_model_id(settings)),
+                state,
+                embed_batch=args.embed_batch,
+                upsert_batch=args.upsert_batch,
+                parallel=args.parallel,
+            )
+            print(json.dumps(report.summary(), ensure_ascii=False))
+            failed = failed or bool(report.errors)
+    finally:
+        await client.close()
+    return 1 if failed else 0
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("sources", nargs="*", help="<collection>=<path to .json or .jsonl>")
+    parser.add_argument("--qdrant-url", default=None, help="defaults to QDRANT_URL; :memory: for an in-process Qdrant")
+    parser.add_argument("--state-dir", type=Path, default=None)
+    parser.add_argument("--embed-batch", type=int, default=64)
+    parser.add_argument("--upsert-batch", type=int, default=256)
+    parser.add_argument("--parallel", type=int, default=4, help="concurrent upsert requests")
+    parser.add_argument("--force", action="store_true", help="re-embed documents even if unchanged")
+    parser.add_argument("--recreate", action="store_true", help="drop and recreate the target collections")
+    raise SystemExit(asyncio.run(_run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+"""Offline end-to-end load test of the backend against local stand-ins.
+
+Runs the real app from ``backend.main.create_app`` with the LLM gateway replaced by
+``stub_gateway`` (mounted in-process), Qdrant by an in-memory client seeded with the
+bundled charters, and the embedding model by a hash-based fake::
+
+    python -m backend.tools.loadtest --jobs 200 --concurrency 32 \\
+        --latency-ms 300 --latency-distribution lognormal --tokens-per-second 400
+
+Each job goes through ``/api/pipeline/start`` → long-polled status → result. The
+report has p50/p95/p99 per endpoint and per job, jobs/sec, event-loop lag and peak
+RSS, and is saved as JSON (default ``backend/data/bench/<time>-<commit>.json``);
+``--baseline`` prints the change against an earlier report. Everything shares one
+event loop and process, so loop lag and RSS include the stubs and the load generator.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import resource
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import httpx
+import numpy as np
+from qdrant_client import AsyncQdrantClient
+
+from backend.config import REQUIRED_VARS, Settings, load_settings
+from backend.main import create_app
+from backend.tools.ingest import DEFAULT_SOURCES, IngestState, ingest_collection, read_documents
+from backend.tools.stub_gateway import StubConfig, create_stub_app
+
+logger = logging.getLogger(__name__)
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+CHARTERS_DIR = REPO_ROOT / "backend" / "charters"
+# daojia has no bundled charter; it is seeded from the evidences like cross.
+SEED_SOURCES: Dict[str, str] = {**DEFAULT_SOURCES, "daojia": DEFAULT_SOURCES["cross"]}
+TERMINAL_STATUSES = {"DONE", "ERROR", "CANCELLED", "TIMEOUT"}
+PERCENTILES = (50, 95, 99)
+
+
+class HashEmbedding:
+    """Deterministic unit vectors derived from the text hash; no model to load."""
+
+    def __init__(self, dimension: int = 64) -> None:
+        self._dimension = dimension
+
+    @property
+    def dimension(self) -> int:
+        return self._dimension
+
+    def embed(self, texts: Iterable[str]) -> List[List[float]]:
+        vectors: List[List[float]] = []
+        for text in texts:
+            seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+            vector = np.random.default_rng(seed).standard_normal(self._dimension).astype(np.float32)
+            vectors.append((vector / np.linalg.norm(vector)).tolist())
+        return vectors
+
+
+class LatencyRecorder:
+    def __init__(self) -> None:
+        self.samples: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, Dict[str, int]] = {}
+
+    async def request(self, client: httpx.AsyncClient, name: str, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        self.samples.setdefault(name, []).append(time.perf_counter() - started)
+        counts = self.statuses.setdefault(name, {})
+        counts[str(response.status_code)] = counts.get(str(response.status_code), 0) + 1
+        return response
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            name: {**summarize(samples), "status_codes": self.statuses.get(name, {})}
+            for name, samples in sorted(self.samples.items())
+        }
+
+
+class LoopLagMonitor:
+    """Measures how late a periodic timer fires; lateness is time the loop spent blocked."""
+
+    def __init__(self, interval: float = 0.01) -> None:
+        self._interval = interval
+        self._lags: List[float] = []
+        self._task: Optional[asyncio.Task[None]] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> Dict[str, Any]:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        return summarize(self._lags)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self._interval
+            await asyncio.sleep(self._interval)
+            self._lags.append(max(0.0, loop.time() - expected))
+
+
+def summarize(samples: List[float]) -> Dict[str, Any]:
+    """Count plus p50/p95/p99/max in milliseconds."""
+    if not samples:
+        return {"count": 0}
+    values = np.asarray(samples, dtype=np.float64) * 1000.0
+    summary: Dict[str, Any] = {"count": len(samples)}
+    for percentile in PERCENTILES:
+        summary[f"p{percentile}_ms"] = round(float(np.percentile(values, percentile)), 2)
+    summary["max_ms"] = round(float(values.max()), 2)
+    return summary
+
+
+def bench_settings(workdir: Path, args: argparse.Namespace) -> Settings:
+    """Environment settings (tuning knobs included) pointed at the local stand-ins.
+
+    Every path the app writes to lives under ``workdir``; required variables that
+    are unset are filled in only while the settings are read.
+    """
+    defaults = {"CORS_ALLOW_ORIGINS": "*", "PORT": "7788", "PROJECT_ROOT": str(workdir), "MODELS_PATH": str(workdir)}
+    missing = [name for name in REQUIRED_VARS if name not in os.environ]
+    os.environ.update({name: defaults.get(name, "stub") for name in missing})
+    try:
+        settings = load_settings()
+    finally:
+        for name in missing:
+            os.environ.pop(name, None)
+    return dataclasses.replace(
+        settings,
+        ds_base_url="http://llm-stub/v1",
+        models_path=workdir,
+        project_root=workdir,
+        retrieval_backend="qdrant",
+        local_index_dir=workdir / "backend" / "data" / "local_index",
+        embed_cache_dir=workdir / "embedding_cache",
+        embed_sidecar_socket=None,
+        job_store="memory",
+        job_store_path=workdir / "backend" / "data" / "jobs.sqlite3",
+        semantic_cache_max_entries=settings.semantic_cache_max_entries if args.cache else 0,
+        semantic_cache_persist=False,
+    )
+
+
+async def seed_qdrant(client: AsyncQdrantClient, embedder: HashEmbedding) -> None:
+    for collection, name in SEED_SOURCES.items():
+        documents = read_documents(CHARTERS_DIR / name, collection, "loadtest")
+        await ingest_collection(client, embedder, collection, documents, IngestState(None))
+
+
+async def run_job(
+    client: httpx.AsyncClient, recorder: LatencyRecorder, index: int, titles: List[str], args: argparse.Namespace
+) -> Dict[str, Any]:
+    body = {
+        "title": f"{titles[index % len(titles)]} #{index}",
+        "description": "负载测试",
+        "mode": args.mode,
+        "variants": args.variants,
+        "no_cache": not args.cache,
+    }
+    started = time.perf_counter()
+    while True:
+        response = await recorder.request(client, "start", "POST", "/api/pipeline/start", json=body)
+        if response.status_code not in (429, 503):
+            break
+        await asyncio.sleep(min(float(response.headers.get("Retry-After", 1)), 5.0))
+    if response.status_code != 200:
+        return {"status": f"HTTP {response.status_code}", "seconds": time.perf_counter() - started}
+    status = response.json()
+    while status["status"] not in TERMINAL_STATUSES:
+        params = {"wait": args.poll_wait, "since": status["version"]}
+        response = await recorder.request(
+            client, "status", "GET", f"/api/pipeline/status/{status['job_id']}", params=params
+        )
+        status = response.json()
+    if status["status"] == "DONE":
+        await recorder.request(client, "result", "GET", f"/api/pipeline/result/{status['job_id']}")
+    return {"status": status["status"], "seconds": time.perf_counter() - started}
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory(prefix="loadtest-") as workdir:
+        return await _run(args, Path(workdir))
+
+
+async def _run(args: argparse.Namespace, workdir: Path) -> Dict[str, Any]:
+    settings = bench_settings(workdir, args)
+
+    logging.getLogger().setLevel(args.log_level)
+    embedder = HashEmbedding(args.dimension)
+    qdrant = AsyncQdrantClient(location=":memory:")
+    await seed_qdrant(qdrant, embedder)
+    stub = StubConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        latency_distribution=args.latency_distribution,
+        latency_sigma=args.latency_sigma,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    stub_app = create_stub_app(stub)
+    app = create_app(
+        settings,
+        embedding_provider=embedder,
+        llm_transport=httpx.ASGITransport(app=stub_app),
+        qdrant_client=qdrant,
+    )
+    titles = [record["title"] for record in json.loads((CHARTERS_DIR / "templates.json").read_text(encoding="utf-8"))]
+    recorder = LatencyRecorder()
+    monitor = LoopLagMonitor()
+    slots = asyncio.Semaphore(max(1, args.concurrency))
+
+    async def _bounded(index: int) -> Dict[str, Any]:
+        async with slots:
+            return await run_job(client, recorder, index, titles, args)
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://backend", timeout=None) as client:
+            while (await client.get("/readyz")).status_code != 200:
+                await asyncio.sleep(0.05)
+            monitor.start()
+            started = time.perf_counter()
+            jobs = await asyncio.gather(*(_bounded(index) for index in range(args.jobs)))
+            elapsed = time.perf_counter() - started
+            loop_lag = await monitor.stop()
+        server = {
+            "jobs": await app.state.job_manager.stats(),
+            "llm": app.state.ds_client.stats(),
+            "scheduler": app.state.llm_scheduler.stats(),
+        }
+
+    outcomes: Dict[str, int] = {}
+    for job in jobs:
+        outcomes[job["status"]] = outcomes.get(job["status"], 0) + 1
+    return {
+        "commit": _git_commit(),
+        "created_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "elapsed_seconds": round(elapsed, 3),
+        "jobs_per_second": round(outcomes.get("DONE", 0) / elapsed, 2) if elapsed else None,
+        "outcomes": outcomes,
+        "job_latency": summarize([job["seconds"] for job in jobs if job["status"] == "DONE"]),
+        "endpoints": recorder.summary(),
+        "event_loop_lag": loop_lag,
+        # ru_maxrss is in KiB on Linux.
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "stub_gateway": dict(stub_app.state.counters),
+        "server": server,
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Any]:
+    """Relative change of the headline numbers; positive means larger than the baseline."""
+
+    def _delta(current: Optional[float], previous: Optional[float]) -> Optional[float]:
+        if current is None or not previous:
+            return None
+        return round((current - previous) / previous, 4)
+
+    deltas: Dict[str, Any] = {
+        "baseline_commit": baseline.get("commit"),
+        "jobs_per_second": _delta(report.get("jobs_per_second"), baseline.get("jobs_per_second")),
+        "peak_rss_mb": _delta(report.get("peak_rss_mb"), baseline.get("peak_rss_mb")),
+    }
+    sections = {"job": ("job_latency", None), "event_loop_lag": ("event_loop_lag", None)}
+    for name in report.get("endpoints", {}):
+        sections[name] = ("endpoints", name)
+    for label, (section, key) in sections.items():
+        current = report.get(section, {})
+        previous = baseline.get(section, {})
+        if key is not None:
+            current, previous = current.get(key, {}), previous.get(key, {})
+        for percentile in PERCENTILES:
+            field = f"p{percentile}_ms"
+            deltas[f"{label}_{field}"] = _delta(current.get(field), previous.get(field))
+    return deltas
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        completed = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return completed.stdout.strip()
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.WARNING)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16, help="jobs in flight at once")
+    parser.add_argument("--mode", choices=["staged", "fused"], default="staged")
+    parser.add_argument("--variants", type=int, default=2)
+    parser.add_argument("--cache", action="store_true", help="allow request coalescing and the semantic cache")
+    parser.add_argument("--poll-wait", type=float, default=5.0, help="long-poll seconds per status request")
+    parser.add_argument("--dimension", type=int, default=64, help="fake embedding dimension")
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--latency-distribution", choices=["uniform", "exponential", "lognormal"], default="uniform")
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="0 streams without pacing")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--output", type=Path, default=None)
+    parser.add_argument("--baseline", type=Path, default=None, help="earlier report to compare against")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    output = args.output or REPO_ROOT / "backend" / "data" / "bench" / (
+        f"{datetime.utcnow():%Y%m%dT%H%M%S}-{report['commit'] or 'nocommit'}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    summary = {key: report[key] for key in ("jobs_per_second", "outcomes", "job_latency", "event_loop_lag", "peak_rss_mb")}
+    print(json.dumps({**summary, "report": str(output)}, ensure_ascii=False, indent=2))
+    if args.baseline is not None:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        print(json.dumps(compare(report, baseline), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Local OpenAI-compatible ``/chat/completions`` stub with injectable latency and errors.
+
+Run it and point ``DS_BASE_URL`` at it::
+
+    python -m backend.tools.stub_gateway --port 9100 --latency-ms 200 --error-rate 0.1
+    DS_BASE_URL=http://127.0.0.1:9100/v1
+
+Time to first byte is drawn from ``--latency-distribution``: ``uniform``
+(``latency ± jitter``), ``exponential`` (mean ``latency``) or ``lognormal``
+(median ``latency``, shape ``--latency-sigma``). ``--tokens-per-second`` paces
+streamed output, counting one character as one token.
+
+``create_stub_app`` can also be mounted in-process with ``httpx.ASGITransport`` and
+passed to ``DSClient(settings, transport=...)``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import random
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+@dataclass
+class StubConfig:
+    latency_ms: float = 50.0
+    jitter_ms: float = 0.0
+    latency_distribution: str = "uniform"
+    latency_sigma: float = 0.5
+    tokens_per_second: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 503
+    retry_after: Optional[float] = None
+    chunk_chars: int = 8
+    seed: Optional[int] = None
+
+
+def create_stub_app(config: Optional[StubConfig] = None) -> FastAPI:
+    config = config or StubConfig()
+    rng = random.Random(config.seed)
+    app = FastAPI(title="LLM gateway stub")
+    app.state.config = config
+    app.state.counters = {"requests": 0, "errors": 0}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request) -> Any:
+        body = await request.json()
+        app.state.counters["requests"] += 1
+        await asyncio.sleep(_latency_ms(config, rng) / 1000.0)
+        if rng.random() < config.error_rate:
+            app.state.counters["errors"] += 1
+            headers = {"Retry-After": str(config.retry_after)} if config.retry_after is not None else {}
+            return JSONResponse({"error": {"message": "injected failure"}}, status_code=config.error_status, headers=headers)
+        contents = [_reply(body, index) for index in range(int(body.get("n") or 1))]
+        usage = {
+            "prompt_tokens": sum(len(message.get("content", "")) for message in body.get("messages", [])),
+            "completion_tokens": sum(len(content) for content in contents),
+        }
+        if body.get("stream"):
+            return StreamingResponse(_stream(contents, usage, config.chunk_chars, config.tokens_per_second), media_type="text/event-stream")
+        return {
+            "object": "chat.completion",
+            "model": body.get("model"),
+            "choices": [
+                {"index": index, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}
+                for index, content in enumerate(contents)
+            ],
+            "usage": usage,
+        }
+
+    return app
+
+
+def _latency_ms(config: StubConfig, rng: random.Random) -> float:
+    if config.latency_ms <= 0:
+        return 0.0
+    if config.latency_distribution == "exponential":
+        return rng.expovariate(1.0 / config.latency_ms)
+    if config.latency_distribution == "lognormal":
+        return rng.lognormvariate(math.log(config.latency_ms), config.latency_sigma)
+    return max(0.0, config.latency_ms + rng.uniform(-1, 1) * config.jitter_ms)
+
+
+def _reply(body: Dict[str, Any], index: int) -> str:
+    if body.get("response_format", {}).get("type") == "json_object":
+        return json.dumps({"draft": f"初稿{index}", "middle": f"中稿{index}", "final": f"终稿{index}"}, ensure_ascii=False)
+    prompt = body.get("messages", [{}])[-1].get("content", "")
+    return f"【桩回复{index}】{prompt[:64]}"
+
+
+async def _stream(
+    contents: List[str], usage: Dict[str, int], chunk_chars: int, tokens_per_second: float
+) -> AsyncIterator[bytes]:
+    for index, content in enumerate(contents):
+        for start in range(0, len(content), max(1, chunk_chars)):
+            piece = content[start : start + chunk_chars]
+            chunk = {"choices": [{"index": index, "delta": {"content": piece}}]}
+            yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8")
+            await asyncio.sleep(len(piece) / tokens_per_second if tokens_per_second > 0 else 0)
+    yield f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n".encode("utf-8")
+    yield b"data: [DONE]\n\n"
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--latency-distribution", choices=["uniform", "exponential", "lognormal"], default="uniform")
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="0 streams without pacing")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--retry-after", type=float, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    config = StubConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        latency_distribution=args.latency_distribution,
+        latency_sigma=args.latency_sigma,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+    uvicorn.run(create_stub_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()